@@ -17,6 +17,8 @@ class Settings(BaseSettings):
     app_env: str = Field(default="testing", alias="APP_ENV")
     log_level: str = Field(default="DEBUG", alias="LOG_LEVEL")
     active_agent: str = Field(default="G02", alias="ACTIVE_AGENT")
+    # Agentes atendidos por este proceso (CSV, ej. "C25,G02,C74"); vacío = sólo ACTIVE_AGENT
+    served_agents: str = Field(default="", alias="SERVED_AGENTS")
 
     c25_cod_agente: str = Field(default="C25", alias="C25_COD_AGENTE")
     c25_cert_path: str = Field(default="/app/certs/C25.pfx", alias="C25_CERT_PATH")
@@ -48,13 +50,119 @@ class Settings(BaseSettings):
         alias="ADUANA_CONSULTA_DIN_URL",
     )
 
+    # Cliente HTTP compartido hacia Aduana
+    http_max_connections: int = Field(default=100, alias="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive_connections: int = Field(default=20, alias="HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    http_keepalive_expiry: float = Field(default=30.0, alias="HTTP_KEEPALIVE_EXPIRY")
+    http2: bool = Field(default=False, alias="HTTP2")
+    recibe_din_timeout: float = Field(default=30.0, alias="RECIBE_DIN_TIMEOUT")
+    recibe_din_connect_timeout: float = Field(default=10.0, alias="RECIBE_DIN_CONNECT_TIMEOUT")
+    consulta_din_timeout: float = Field(default=30.0, alias="CONSULTA_DIN_TIMEOUT")
+    consulta_din_connect_timeout: float = Field(default=10.0, alias="CONSULTA_DIN_CONNECT_TIMEOUT")
+
+    # Motor de construcción XML: "jinja" (plantilla) o "lxml" (árbol directo)
+    xml_builder_engine: str = Field(default="jinja", alias="XML_BUILDER_ENGINE")
+    # Caché de bytecode Jinja en disco; vacío = <raíz del proyecto>/.jinja_cache
+    jinja_cache_dir: str = Field(default="", alias="JINJA_CACHE_DIR")
+
+    # Validación XSD antes de firmar; directorio vacío = docs/EsquemasMensajeriaDin
+    xsd_validation: bool = Field(default=True, alias="XSD_VALIDATION")
+    xsd_schemas_dir: str = Field(default="", alias="XSD_SCHEMAS_DIR")
+
+    # Envío por lotes (/send-batch)
+    batch_max_items: int = Field(default=100, alias="BATCH_MAX_ITEMS")
+    batch_max_concurrency: int = Field(default=8, alias="BATCH_MAX_CONCURRENCY")
+
+    # Ejecutor para trabajo CPU (build/validación/firma): "thread" o "process"
+    cpu_executor: str = Field(default="thread", alias="CPU_EXECUTOR")
+    # 0 = os.cpu_count()
+    cpu_max_workers: int = Field(default=0, alias="CPU_MAX_WORKERS")
+
+    # Caché de XML firmado (LRU + TTL), en memoria por proceso
+    signed_cache_enabled: bool = Field(default=True, alias="SIGNED_CACHE_ENABLED")
+    signed_cache_max_bytes: int = Field(default=64 * 1024 * 1024, alias="SIGNED_CACHE_MAX_BYTES")
+    signed_cache_ttl: float = Field(default=300.0, alias="SIGNED_CACHE_TTL")
+
+    # Caché de /status: TTL para estados en trámite; los terminales no expiran
+    status_cache_ttl: float = Field(default=10.0, alias="STATUS_CACHE_TTL")
+    status_cache_max_entries: int = Field(default=10000, alias="STATUS_CACHE_MAX_ENTRIES")
+    status_terminal_states: str = Field(
+        default="ACEPTADO,ACEPTADA,RECHAZADO,RECHAZADA,ANULADO,ANULADA",
+        alias="STATUS_TERMINAL_STATES",
+    )
+
+    # Seguimiento de tickets por SSE (/status/{ticket_id}/events)
+    status_watch_min_interval: float = Field(default=5.0, alias="STATUS_WATCH_MIN_INTERVAL")
+    status_watch_max_interval: float = Field(default=60.0, alias="STATUS_WATCH_MAX_INTERVAL")
+    status_watch_backoff: float = Field(default=1.5, alias="STATUS_WATCH_BACKOFF")
+    status_watch_max_tickets: int = Field(default=1000, alias="STATUS_WATCH_MAX_TICKETS")
+    status_watch_keepalive: float = Field(default=15.0, alias="STATUS_WATCH_KEEPALIVE")
+
+    # Envíos asíncronos (/send-async): cola SQLite; ruta vacía = <raíz del proyecto>/data/jobs.sqlite3
+    jobs_db_path: str = Field(default="", alias="JOBS_DB_PATH")
+    jobs_workers: int = Field(default=4, alias="JOBS_WORKERS")
+    jobs_max_attempts: int = Field(default=3, alias="JOBS_MAX_ATTEMPTS")
+    jobs_poll_interval: float = Field(default=1.0, alias="JOBS_POLL_INTERVAL")
+    jobs_retention_hours: float = Field(default=72.0, alias="JOBS_RETENTION_HOURS")
+    # DIN ya validados que la cola entrega en memoria a sus workers (0 = siempre releer el payload)
+    jobs_inline_max: int = Field(default=64, alias="JOBS_INLINE_MAX")
+    # Lease de un trabajo en proceso (el worker lo renueva cada tercio); al vencer, otro proceso lo retoma
+    jobs_lease_seconds: float = Field(default=60.0, alias="JOBS_LEASE_SECONDS")
+    # Backoff exponencial entre reintentos de un trabajo que falló de forma inesperada
+    jobs_retry_base_delay: float = Field(default=5.0, alias="JOBS_RETRY_BASE_DELAY")
+    jobs_retry_max_delay: float = Field(default=300.0, alias="JOBS_RETRY_MAX_DELAY")
+
+    # Reintentos SOAP con backoff exponencial con jitter (intentos totales, incluido el primero)
+    consulta_din_max_attempts: int = Field(default=3, alias="CONSULTA_DIN_MAX_ATTEMPTS")
+    recibe_din_max_attempts: int = Field(default=3, alias="RECIBE_DIN_MAX_ATTEMPTS")
+    retry_base_delay: float = Field(default=0.2, alias="RETRY_BASE_DELAY")
+    retry_max_delay: float = Field(default=5.0, alias="RETRY_MAX_DELAY")
+
+    # Circuit breaker por URL: fallas consecutivas para abrir y segundos hasta la prueba
+    breaker_failure_threshold: int = Field(default=5, alias="BREAKER_FAILURE_THRESHOLD")
+    breaker_reset_timeout: float = Field(default=30.0, alias="BREAKER_RESET_TIMEOUT")
+
+    # Límite de tasa saliente por agente y endpoint (token bucket: peticiones/segundo y ráfaga)
+    rate_limit_enabled: bool = Field(default=True, alias="RATE_LIMIT_ENABLED")
+    recibe_din_rate: float = Field(default=5.0, gt=0, alias="RECIBE_DIN_RATE")
+    recibe_din_burst: int = Field(default=10, ge=1, alias="RECIBE_DIN_BURST")
+    consulta_din_rate: float = Field(default=20.0, gt=0, alias="CONSULTA_DIN_RATE")
+    consulta_din_burst: int = Field(default=40, ge=1, alias="CONSULTA_DIN_BURST")
+    # Espera máxima en cola por un token antes de fallar con RATE_LIMITED
+    rate_limit_max_wait: float = Field(default=10.0, alias="RATE_LIMIT_MAX_WAIT")
+
+    # Incluir la respuesta SOAP cruda (raw_response) en los resultados de envío y consulta
+    aduana_raw_response: bool = Field(default=True, alias="ADUANA_RAW_RESPONSE")
+
+    # Compresión de respuestas (gzip/deflate según Accept-Encoding); nivel zlib 0-9
+    response_compression: bool = Field(default=True, alias="RESPONSE_COMPRESSION")
+    compression_min_size: int = Field(default=1024, alias="COMPRESSION_MIN_SIZE")
+    compression_level: int = Field(default=6, alias="COMPRESSION_LEVEL")
+
+    # Sobre firmado escrito en streaming (envelope_writer) desde esta cantidad de ítems; 0 = siempre por árbol
+    envelope_stream_min_items: int = Field(default=0, alias="ENVELOPE_STREAM_MIN_ITEMS")
+
+    # Firma en streaming NDJSON (/generate-signed-xml/stream)
+    stream_max_in_flight: int = Field(default=8, alias="STREAM_MAX_IN_FLIGHT")
+    stream_max_line_bytes: int = Field(default=10 * 1024 * 1024, alias="STREAM_MAX_LINE_BYTES")
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
         extra = "ignore"
 
+    def get_served_agents(self) -> list[str]:
+        agents = [agent.strip().upper() for agent in self.served_agents.split(",") if agent.strip()]
+        active = self.active_agent.upper()
+        if active not in agents:
+            agents.insert(0, active)
+        return agents
+
     def get_active_agent_config(self) -> AgentConfig:
-        agent = self.active_agent.upper()
+        return self.get_agent_config(self.active_agent)
+
+    def get_agent_config(self, agent: Optional[str] = None) -> AgentConfig:
+        agent = (agent or self.active_agent).upper()
         if agent == "C25":
             return AgentConfig(
                 cod_agente=self.c25_cod_agente,
@@ -85,8 +193,8 @@ class Settings(BaseSettings):
         else:
             raise ValueError(f"Agente no válido: {agent}")
 
-    def get_ws_password(self) -> str:
-        agent_config = self.get_active_agent_config()
+    def get_ws_password(self, agent: Optional[str] = None) -> str:
+        agent_config = self.get_agent_config(agent)
         if self.app_env == "production":
             return agent_config.ws_password_prod
         return agent_config.ws_password_qa
@@ -1,18 +1,60 @@
+import json
 import logging
-from litestar import Controller, get, post
-from litestar.response import Response
-from litestar.status_codes import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+from litestar import Controller, MediaType, Request, asgi, get, post
+from litestar.exceptions import ValidationException
+from litestar.response import Response, ServerSentEvent, ServerSentEventMessage
+from litestar.types import Receive, Scope, Send
+from litestar.status_codes import (
+    HTTP_200_OK,
+    HTTP_202_ACCEPTED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
 from pydantic import BaseModel
-from typing import Optional
-
-from app.models.din import DINRequest, DINResponse, StatusResponse
-from app.services.xml_builder import XMLBuilderService
-from app.services.signer import SignerService
-from app.services.soap_client import SoapClientService
+from typing import Literal, Optional
+
+from app.models.din import (
+    DINRequest,
+    DINResponse,
+    DINBatchRequest,
+    DINBatchResponse,
+    JobResponse,
+    StatusResponse,
+)
+from app.services.agents import AGENT_HEADER, AgentContext, UnknownAgentError, get_agent_registry
+from app.services.batch import BatchSender
+from app.services.stream_signer import NDJSONStreamSigner
+from app.services.executor import get_cpu_executor
+from app.services.ingest import DINIngestDTO, IngestDTO
+from app.services.xml_builder import BUILDER_ENGINES
+from app.services.pipeline import build_unsigned
+from app.services.job_queue import Job, get_job_pool
+from app.services.status_cache import get_status_cache
+from app.services.ticket_watcher import TooManyTicketsError, get_ticket_watcher
+from app.services.signed_cache import build_signed_cached, build_signed_envelope_cached
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+BuilderEngine = Literal["jinja", "lxml"]
+
+# Variantes que responden el documento XML tal cual en vez de un DINResponse
+XML_MEDIA_TYPE = "application/xml"
+RAW_SUFFIX = "/raw"
+TICKET_HEADER = "X-Ticket"
+ESTADO_HEADER = "X-Aduana-Estado"
+
+# Cuerpo DINRequest validado desde los bytes, o DIN en XML (ver app.services.ingest)
+DINRequestDTO = DINIngestDTO
+DINBatchRequestDTO = IngestDTO[DINBatchRequest]
+
 
 class CertTestRequest(BaseModel):
     cert_path: str
@@ -98,30 +140,39 @@ class DINController(Controller):
         certs = list(certs_dir.glob("*.pfx")) + list(certs_dir.glob("*.p12"))
         return {"certs": [str(c) for c in certs]}
 
-    @post("/generate-xml-unsigned")
-    async def generate_xml_unsigned(self, data: DINRequest) -> Response[DINResponse]:
-        """Genera XML sin firma digital (para testing/validación)."""
+    @post(["/generate-xml-unsigned", "/generate-xml-unsigned" + RAW_SUFFIX], dto=DINRequestDTO, return_dto=None)
+    async def generate_xml_unsigned(
+        self, request: Request, data: DINRequest, engine: Optional[BuilderEngine] = None
+    ) -> Response[DINResponse]:
+        """
+        Genera XML sin firma digital (para testing/validación).
+
+        Con Accept: application/xml o en .../raw responde el XML directamente.
+        """
         try:
             logger.info("Generando XML sin firma")
 
-            xml_builder = XMLBuilderService()
-            xml_unsigned = xml_builder.build_xml(data.din)
-
-            valid, msg = xml_builder.validate_xml_structure(xml_unsigned)
-            if not valid:
+            start = time.perf_counter()
+            result = await get_cpu_executor().run(build_unsigned, data.din, engine)
+            build_ms = (time.perf_counter() - start) * 1000
+            if not result.valid:
                 return Response(
                     content=DINResponse(
                         success=False,
-                        message=f"Error en estructura XML: {msg}",
+                        message=f"Error en estructura XML: {result.message}",
+                        schema_errors=result.schema_errors,
                     ),
                     status_code=HTTP_400_BAD_REQUEST,
                 )
 
+            if _wants_xml(request):
+                return _xml_response(result.content(), {"build": build_ms})
+
             return Response(
                 content=DINResponse(
                     success=True,
                     message="XML generado correctamente (sin firma)",
-                    xml=xml_unsigned,
+                    xml=result.xml,
                 ),
                 status_code=HTTP_200_OK,
             )
@@ -136,30 +187,44 @@ class DINController(Controller):
                 status_code=HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-    @post("/generate-signed-xml")
-    async def generate_signed_xml(self, data: DINRequest) -> Response[DINResponse]:
+    @post(["/generate-signed-xml", "/generate-signed-xml" + RAW_SUFFIX], dto=DINRequestDTO, return_dto=None)
+    async def generate_signed_xml(
+        self,
+        request: Request,
+        data: DINRequest,
+        agent_header: Optional[str],
+        engine: Optional[BuilderEngine] = None,
+    ) -> Response[DINResponse]:
+        """
+        Genera el XML firmado con el certificado del agente.
+
+        Con Accept: application/xml o en .../raw responde el XML directamente.
+        """
+        agent = _select_agent(agent_header, data.agente)
         try:
-            logger.info("Iniciando generación de XML firmado")
-
-            xml_builder = XMLBuilderService()
-            xml_unsigned = xml_builder.build_xml(data.din)
+            logger.info(f"Iniciando generación de XML firmado (agente {agent.code})")
 
-            valid, msg = xml_builder.validate_xml_structure(xml_unsigned)
-            if not valid:
-                logger.error(f"XML generado inválido: {msg}")
+            start = time.perf_counter()
+            result = await build_signed_cached(data.din, engine, agent.code)
+            build_ms = (time.perf_counter() - start) * 1000
+            if not result.valid:
+                logger.error(f"XML generado inválido: {result.message}")
                 return Response(
                     content=DINResponse(
                         success=False,
-                        message=f"Error en estructura XML: {msg}",
+                        message=f"Error en estructura XML: {result.message}",
+                        schema_errors=result.schema_errors,
                     ),
                     status_code=HTTP_400_BAD_REQUEST,
                 )
 
-            signer = SignerService()
-            signed_xml = signer.sign_xml_string(xml_unsigned)
-
             logger.info("XML firmado generado exitosamente")
 
+            if _wants_xml(request):
+                return _xml_response(result.content(), {"build": build_ms})
+
+            signed_xml = result.xml
+
             return Response(
                 content=DINResponse(
                     success=True,
@@ -188,33 +253,88 @@ class DINController(Controller):
                 status_code=HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-    @post("/send")
-    async def send_din(self, data: DINRequest) -> Response[DINResponse]:
+    @asgi("/generate-signed-xml/stream")
+    async def generate_signed_xml_stream(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Firma DIN recibidos como NDJSON (un DINRequest por línea).
+
+        Cada resultado se emite como una línea NDJSON apenas termina; el campo
+        `index` indica la línea de entrada a la que corresponde. Acepta
+        `?engine=jinja|lxml` igual que /generate-signed-xml, y el header
+        X-Agent como agente por defecto de las líneas sin AGENTE.
+        """
+        if scope["method"] != "POST":
+            await _send_json(send, 405, {"success": False, "message": "Método no permitido"})
+            return
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        engine = query.get("engine", [None])[-1]
+        if engine is not None and engine not in BUILDER_ENGINES:
+            await _send_json(send, 400, {
+                "success": False,
+                "message": f"Motor no válido: {engine}. Opciones: {', '.join(BUILDER_ENGINES)}",
+            })
+            return
+
+        header = AGENT_HEADER.lower().encode("latin-1")
+        agent = next((value.decode("latin-1") for name, value in scope["headers"] if name == header), None)
         try:
-            logger.info("Iniciando envío de DIN a Aduana")
-
-            xml_builder = XMLBuilderService()
-            xml_unsigned = xml_builder.build_xml(data.din)
+            agent = get_agent_registry().resolve(agent)
+        except UnknownAgentError as e:
+            await _send_json(send, 400, {"success": False, "message": str(e)})
+            return
+
+        logger.info(f"Iniciando firma en streaming NDJSON (agente {agent})")
+        await NDJSONStreamSigner(engine=engine, agent=agent).respond(receive, send)
+
+    @post(["/send", "/send" + RAW_SUFFIX], dto=DINRequestDTO, return_dto=None)
+    async def send_din(
+        self,
+        request: Request,
+        data: DINRequest,
+        agent_header: Optional[str],
+        engine: Optional[BuilderEngine] = None,
+    ) -> Response[DINResponse]:
+        """
+        Construye, firma y envía el DIN a Aduana.
+
+        El cuerpo es un DINRequest en JSON o el DIN en XML (Content-Type:
+        text/xml o application/xml); en XML el agente sale del header X-Agent.
+
+        Con Accept: application/xml o en .../raw responde la respuesta SOAP
+        de Aduana directamente, con el ticket en el header X-Ticket.
+        """
+        agent = _select_agent(agent_header, data.agente)
+        try:
+            logger.info(f"Iniciando envío de DIN a Aduana (agente {agent.code})")
 
-            valid, msg = xml_builder.validate_xml_structure(xml_unsigned)
-            if not valid:
-                logger.error(f"XML generado inválido: {msg}")
+            start = time.perf_counter()
+            result = await build_signed_envelope_cached(data.din, engine, agent.code)
+            build_ms = (time.perf_counter() - start) * 1000
+            if not result.valid:
+                logger.error(f"XML generado inválido: {result.message}")
                 return Response(
                     content=DINResponse(
                         success=False,
-                        message=f"Error en estructura XML: {msg}",
+                        message=f"Error en estructura XML: {result.message}",
+                        schema_errors=result.schema_errors,
                     ),
                     status_code=HTTP_400_BAD_REQUEST,
                 )
 
-            signer = SignerService()
-            signed_xml = signer.sign_xml_string(xml_unsigned)
-
-            soap_client = SoapClientService()
-            result = await soap_client.send_din(signed_xml)
+            start = time.perf_counter()
+            result = await agent.soap_client.send_envelope(result.xml_bytes)
+            send_ms = (time.perf_counter() - start) * 1000
 
             if result["success"]:
                 logger.info(f"DIN enviado exitosamente. Ticket: {result.get('ticket')}")
+                if _wants_xml(request):
+                    headers = {TICKET_HEADER: result.get("ticket"), ESTADO_HEADER: result.get("estado")}
+                    return _xml_response(
+                        result["raw_bytes"],
+                        {"build": build_ms, "send": send_ms},
+                        {name: value for name, value in headers.items() if value},
+                    )
                 return Response(
                     content=DINResponse(
                         success=True,
@@ -231,6 +351,7 @@ class DINController(Controller):
                         success=False,
                         message=result.get("message", "Error en envío"),
                         raw_response=result.get("raw_response"),
+                        errors=result.get("errores"),
                     ),
                     status_code=HTTP_400_BAD_REQUEST,
                 )
@@ -254,13 +375,94 @@ class DINController(Controller):
                 status_code=HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @post("/send-batch", dto=DINBatchRequestDTO, return_dto=None)
+    async def send_batch(
+        self,
+        data: DINBatchRequest,
+        agent_header: Optional[str],
+        engine: Optional[BuilderEngine] = None,
+    ) -> Response[DINBatchResponse]:
+        """
+        Construye, firma y envía varios DIN; retorna resultados por ítem.
+
+        El agente de cada ítem es su AGENTE, o el AGENTE del lote, o el
+        header X-Agent.
+        """
+        agent = _select_agent(agent_header, data.agente)
+        settings = get_settings()
+        total = len(data.dins)
+        if total == 0 or total > settings.batch_max_items:
+            return Response(
+                content=DINBatchResponse(
+                    success=False,
+                    message=f"El lote debe tener entre 1 y {settings.batch_max_items} DIN",
+                    total=total,
+                    succeeded=0,
+                    failed=total,
+                    results=[],
+                ),
+                status_code=HTTP_400_BAD_REQUEST,
+            )
+
+        logger.info(f"Iniciando envío por lote de {total} DIN")
+        sender = BatchSender(engine=engine, soap_client=agent.soap_client, agent=agent.code)
+        results = await sender.send_all(
+            [item.din for item in data.dins],
+            agents=[item.agente for item in data.dins],
+        )
+
+        succeeded = sum(1 for r in results if r.success)
+        logger.info(f"Lote finalizado: {succeeded}/{total} enviados")
+        return Response(
+            content=DINBatchResponse(
+                success=succeeded == total,
+                message=f"{succeeded} de {total} DIN enviados correctamente",
+                total=total,
+                succeeded=succeeded,
+                failed=total - succeeded,
+                results=results,
+            ),
+            status_code=HTTP_200_OK,
+        )
+
+    @post("/send-async", status_code=HTTP_202_ACCEPTED, dto=DINRequestDTO, return_dto=None)
+    async def send_din_async(
+        self, data: DINRequest, agent_header: Optional[str], engine: Optional[BuilderEngine] = None
+    ) -> Response[JobResponse]:
+        """
+        Encola el DIN para construcción, firma y envío en segundo plano.
+
+        Retorna 202 con el id del trabajo; el resultado se consulta en
+        GET /jobs/{job_id}. La cola es durable: sobrevive reinicios.
+        """
+        agent = _select_agent(agent_header, data.agente)
+        job = await get_job_pool().submit(data.din, engine, agent.code)
+        logger.info(f"DIN encolado para envío asíncrono: {job.id}")
+        return Response(
+            content=_job_response(job, message="Trabajo encolado"),
+            status_code=HTTP_202_ACCEPTED,
+            headers={"Location": f"{self.path}/jobs/{job.id}"},
+        )
+
+    @get("/jobs/{job_id:str}")
+    async def get_job(self, job_id: str) -> Response[JobResponse]:
+        job = await get_job_pool().get(job_id)
+        if job is None:
+            return Response(
+                content=JobResponse(job_id=job_id, status="not_found", message="Trabajo no encontrado"),
+                status_code=HTTP_404_NOT_FOUND,
+            )
+        return Response(content=_job_response(job), status_code=HTTP_200_OK)
+
     @get("/status/{ticket_id:str}")
-    async def get_status(self, ticket_id: str) -> Response[StatusResponse]:
+    async def get_status(self, ticket_id: str, agent: AgentContext) -> Response[StatusResponse]:
         try:
-            logger.info(f"Consultando estado de ticket: {ticket_id}")
+            logger.info(f"Consultando estado de ticket: {ticket_id} (agente {agent.code})")
 
-            soap_client = SoapClientService()
-            result = await soap_client.consulta_din(ticket_id)
+            lookup = await get_status_cache().lookup(
+                ticket_id, agent.soap_client.consulta_din, scope=agent.code
+            )
+            result = lookup.result
 
             if result["success"]:
                 return Response(
@@ -269,8 +471,10 @@ class DINController(Controller):
                         status=result.get("estado"),
                         message="Consulta exitosa",
                         details=result.get("detalles"),
+                        errors=result.get("errores"),
                     ),
                     status_code=HTTP_200_OK,
+                    headers=lookup.headers(),
                 )
             else:
                 return Response(
@@ -279,6 +483,7 @@ class DINController(Controller):
                         message=result.get("message", "Error en consulta"),
                     ),
                     status_code=HTTP_400_BAD_REQUEST,
+                    headers=lookup.headers(),
                 )
 
         except Exception as e:
@@ -290,3 +495,94 @@ class DINController(Controller):
                 ),
                 status_code=HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+    @get("/status/{ticket_id:str}/events")
+    async def status_events(self, ticket_id: str, agent: AgentContext) -> Response:
+        """
+        Suscribe al ticket por Server-Sent Events.
+
+        Eventos: "status" (cambio de ESTADO/TIPOSELECCION/NUMEROACEPTACION),
+        "error" (falla transitoria de la consulta) y "end" (estado terminal,
+        el stream se cierra).
+        """
+        watcher = get_ticket_watcher()
+        if not watcher.accepts(ticket_id, agent.code):
+            return Response(
+                content=StatusResponse(
+                    success=False,
+                    message=f"Máximo de {watcher.max_tickets} tickets observados alcanzado",
+                ),
+                status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        keepalive = get_settings().status_watch_keepalive
+
+        async def messages():
+            try:
+                async with aclosing(watcher.subscribe(ticket_id, keepalive=keepalive, agent=agent.code)) as events:
+                    async for event in events:
+                        if event is None:
+                            yield ServerSentEventMessage(comment="keepalive", data=None)
+                            continue
+                        yield ServerSentEventMessage(
+                            data=json.dumps(event.data, ensure_ascii=False),
+                            event=event.event,
+                            id=event.id,
+                        )
+            except TooManyTicketsError as e:
+                yield ServerSentEventMessage(
+                    data=json.dumps({"ticket": ticket_id, "message": str(e)}, ensure_ascii=False),
+                    event="end",
+                )
+
+        return ServerSentEvent(messages())
+
+
+def _select_agent(header_agent: Optional[str], body_agent: Optional[str]) -> AgentContext:
+    """
+    El campo AGENTE del cuerpo prevalece sobre el header X-Agent; el header
+    sólo se resuelve (y un valor desconocido rechaza la petición) si el
+    cuerpo no trae AGENTE.
+    """
+    try:
+        return get_agent_registry().get(body_agent or header_agent)
+    except UnknownAgentError as e:
+        raise ValidationException(str(e))
+
+
+def _wants_xml(request: Request) -> bool:
+    """Variante XML: ruta terminada en /raw o Accept que prefiere application/xml."""
+    if request.scope["path"].endswith(RAW_SUFFIX):
+        return True
+    return request.accept.best_match([MediaType.JSON, XML_MEDIA_TYPE], default=MediaType.JSON) == XML_MEDIA_TYPE
+
+
+def _xml_response(content: bytes, timings: dict[str, float], headers: Optional[dict] = None) -> Response:
+    """Documento XML sin envolver en JSON; los tiempos van en Server-Timing (ms)."""
+    server_timing = ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+    return Response(
+        content=content,
+        media_type=XML_MEDIA_TYPE,
+        status_code=HTTP_200_OK,
+        headers={"Server-Timing": server_timing, **(headers or {})},
+    )
+
+
+def _job_response(job: Job, message: Optional[str] = None) -> JobResponse:
+    return JobResponse(
+        job_id=job.id,
+        status=job.status,
+        attempts=job.attempts,
+        created_at=datetime.fromtimestamp(job.created_at, tz=timezone.utc).isoformat(),
+        updated_at=datetime.fromtimestamp(job.updated_at, tz=timezone.utc).isoformat(),
+        message=message,
+        result=DINResponse.model_validate(job.result) if job.result else None,
+    )
+
+
+async def _send_json(send: Send, status: int, payload: dict) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode("utf-8")})
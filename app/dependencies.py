@@ -0,0 +1,36 @@
+"""
+Dependencias de aplicación inyectadas por Litestar.
+
+- agent: el AgentContext (signer, cliente SOAP y pool HTTP del agente) del
+  header X-Agent, por defecto ACTIVE_AGENT; para handlers sin cuerpo.
+- agent_header: el valor crudo del header. Los handlers cuyo cuerpo puede
+  traer AGENTE lo resuelven sólo si el cuerpo no nombra un agente: un
+  header desconocido no debe rechazar una petición que no lo usa.
+
+El builder no se inyecta: la construcción corre en el ejecutor CPU
+(app.services.pipeline), que usa get_builder() en su propio proceso.
+"""
+from typing import Optional
+
+from litestar import Request
+from litestar.di import Provide
+from litestar.exceptions import ValidationException
+
+from app.services.agents import AGENT_HEADER, AgentContext, UnknownAgentError, get_agent_registry
+
+
+def provide_agent_header(request: Request) -> Optional[str]:
+    return request.headers.get(AGENT_HEADER)
+
+
+def provide_agent(request: Request) -> AgentContext:
+    try:
+        return get_agent_registry().get(request.headers.get(AGENT_HEADER))
+    except UnknownAgentError as e:
+        raise ValidationException(str(e))
+
+
+dependencies = {
+    "agent": Provide(provide_agent, sync_to_thread=False),
+    "agent_header": Provide(provide_agent_header, sync_to_thread=False),
+}
@@ -1,10 +1,22 @@
 import logging
-from litestar import Litestar, get
+from litestar import Litestar, Response, get
 from litestar.openapi import OpenAPIConfig
 from litestar.logging import LoggingConfig
 
 from app.controllers import DINController
+from app.dependencies import dependencies
 from app.config import get_settings
+from app.services.key_registry import get_key_registry
+from app.services.executor import get_cpu_executor
+from app.services.agents import get_agent_registry
+from app.services.signed_cache import get_signed_cache
+from app.services.status_cache import get_status_cache
+from app.services.ticket_watcher import get_ticket_watcher
+from app.services.job_queue import get_job_pool
+from app.services.resilience import get_breakers
+from app.services.rate_limiter import get_rate_limiter
+from app.services.metrics import METRICS_MEDIA_TYPE, register_pool_collector, render_metrics
+from app.services.compression import get_compression_middleware
 
 settings = get_settings()
 
@@ -28,9 +40,57 @@ logging_config = LoggingConfig(
 )
 
 
+def start_cpu_executor():
+    get_cpu_executor().start()
+
+
+def stop_cpu_executor():
+    get_cpu_executor().shutdown()
+
+
+async def start_http_pool():
+    # Un pool HTTP por agente atendido
+    registry = get_agent_registry()
+    await registry.start()
+    register_pool_collector(registry.pool_stats)
+
+
+async def stop_http_pool():
+    await get_agent_registry().close()
+
+
+async def start_job_pool():
+    await get_job_pool().start()
+
+
+async def stop_job_pool():
+    await get_job_pool().close()
+
+
+async def stop_ticket_watcher():
+    await get_ticket_watcher().close()
+
+
 @get("/health")
 async def health_check() -> dict:
-    return {"status": "healthy", "environment": settings.app_env}
+    return {
+        "status": "healthy",
+        "environment": settings.app_env,
+        "agents": get_agent_registry().stats(),
+        "signer_keys": get_key_registry().stats(),
+        "signed_cache": get_signed_cache().stats(),
+        "status_cache": get_status_cache().stats(),
+        "ticket_watcher": get_ticket_watcher().stats(),
+        "jobs": get_job_pool().stats(),
+        "circuit_breakers": get_breakers().stats(),
+        "rate_limiter": get_rate_limiter().stats(),
+    }
+
+
+@get("/metrics", include_in_schema=False)
+async def metrics() -> Response[bytes]:
+    """Métricas en formato de exposición de Prometheus."""
+    return Response(content=render_metrics(), media_type=METRICS_MEDIA_TYPE)
 
 
 @get("/")
@@ -40,16 +100,21 @@ async def root() -> dict:
         "version": "1.0.0",
         "environment": settings.app_env,
         "active_agent": settings.active_agent,
+        "served_agents": settings.get_served_agents(),
     }
 
 
 app = Litestar(
-    route_handlers=[root, health_check, DINController],
+    route_handlers=[root, health_check, metrics, DINController],
+    dependencies=dependencies,
     openapi_config=OpenAPIConfig(
         title="DIN API - Aduana Chile",
         version="1.0.0",
         description="API para tramitación de Declaraciones de Ingreso (DIN) ante Aduana Chile",
     ),
     logging_config=logging_config,
+    middleware=get_compression_middleware(),
+    on_startup=[start_cpu_executor, start_http_pool, start_job_pool],
+    on_shutdown=[stop_job_pool, stop_ticket_watcher, stop_http_pool, stop_cpu_executor],
     debug=settings.app_env != "production",
 )
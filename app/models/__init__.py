@@ -2,7 +2,14 @@ from .din import (
     DINModel,
     DINRequest,
     DINResponse,
+    DINBatchRequest,
+    DINBatchItemResult,
+    DINBatchResponse,
+    DINStreamResult,
+    JobResponse,
     StatusResponse,
+    SchemaErrorDetail,
+    ErrorModel,
     LogModel,
     CabezaModel,
     ItemModel,
@@ -14,7 +21,14 @@ __all__ = [
     "DINModel",
     "DINRequest",
     "DINResponse",
+    "DINBatchRequest",
+    "DINBatchItemResult",
+    "DINBatchResponse",
+    "DINStreamResult",
+    "JobResponse",
     "StatusResponse",
+    "SchemaErrorDetail",
+    "ErrorModel",
     "LogModel",
     "CabezaModel",
     "ItemModel",
@@ -464,17 +464,29 @@ class DINModel(BaseModel):
 
 class DINRequest(BaseModel):
     din: DINModel = Field(..., alias="DIN")
+    # Código de agente que firma y envía (prevalece sobre el header X-Agent)
+    agente: Optional[str] = Field(default=None, alias="AGENTE")
 
     class Config:
         populate_by_name = True
 
 
+class SchemaErrorDetail(BaseModel):
+    line: Optional[int] = None
+    path: Optional[str] = None
+    element: Optional[str] = None
+    message: str
+
+
 class DINResponse(BaseModel):
     success: bool
     ticket: Optional[str] = None
     message: str
     xml: Optional[str] = None
     raw_response: Optional[str] = None
+    schema_errors: Optional[list[SchemaErrorDetail]] = None
+    # Bloque ERRORES informado por Aduana
+    errors: Optional[list[ErrorModel]] = None
 
 
 class StatusResponse(BaseModel):
@@ -482,3 +494,53 @@ class StatusResponse(BaseModel):
     status: Optional[str] = None
     message: str
     details: Optional[dict] = None
+    errors: Optional[list[ErrorModel]] = None
+
+
+class DINBatchRequest(BaseModel):
+    dins: list[DINRequest] = Field(..., alias="DINS")
+    # Agente por defecto del lote; cada ítem puede indicar el suyo
+    agente: Optional[str] = Field(default=None, alias="AGENTE")
+
+    class Config:
+        populate_by_name = True
+
+
+class DINBatchItemResult(BaseModel):
+    index: int
+    success: bool
+    ticket: Optional[str] = None
+    message: str
+    error: Optional[str] = None
+    build_ms: Optional[float] = None
+    send_ms: Optional[float] = None
+    schema_errors: Optional[list[SchemaErrorDetail]] = None
+    errors: Optional[list[ErrorModel]] = None
+
+
+class DINBatchResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    total: int
+    succeeded: int
+    failed: int
+    results: list[DINBatchItemResult]
+
+
+class DINStreamResult(BaseModel):
+    index: int
+    success: bool
+    message: str
+    xml: Optional[str] = None
+    error: Optional[str] = None
+    schema_errors: Optional[list[SchemaErrorDetail]] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    attempts: int = 0
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    message: Optional[str] = None
+    result: Optional[DINResponse] = None
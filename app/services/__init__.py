@@ -1,6 +1,34 @@
 from .xml_builder import XMLBuilderService
-from .signer import SignerService
-from .soap_client import SoapClientService
+from .signer import SignerService, get_signer
+from .rate_limiter import OutboundRateLimiter, RateLimitExceeded, get_rate_limiter
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, get_breakers
+from .din_xml_reader import DINXMLError, parse_din_xml
+from .ingest import DINIngestDTO, IngestDTO, paused_gc, validate_json_bytes
+from .soap_response import AduanaResponse, SoapFault, parse_soap_response
+from .soap_client import SoapClientService, get_soap_client
+from .agents import AgentContext, AgentRegistry, UnknownAgentError, get_agent_registry
 from .validators import DINValidator, validate_din
+from .key_registry import SigningKeyRegistry, get_key_registry
+from .executor import CPUExecutor, get_cpu_executor
+from .http_client import HttpClientPool, get_http_pool
+from .xsd_validator import DINSchemaValidator, get_schema_validator
+from .envelope_writer import write_signed_envelope
+from .pipeline import DINPipeline, get_builder
+from .signed_cache import SignedXMLCache, get_signed_cache
+from .status_cache import StatusCache, get_status_cache
+from .ticket_watcher import TicketWatcher, get_ticket_watcher
+from .job_queue import JobStore, JobWorkerPool, get_job_pool
 
-__all__ = ["XMLBuilderService", "SignerService", "SoapClientService", "DINValidator", "validate_din"]
+__all__ = ["XMLBuilderService", "SignerService", "get_signer", "SoapClientService", "get_soap_client",
+           "DINValidator", "validate_din",
+           "SigningKeyRegistry", "get_key_registry", "CPUExecutor", "get_cpu_executor",
+           "HttpClientPool", "get_http_pool", "DINSchemaValidator", "get_schema_validator",
+           "DINPipeline", "get_builder", "SignedXMLCache", "get_signed_cache",
+           "StatusCache", "get_status_cache", "TicketWatcher", "get_ticket_watcher",
+           "JobStore", "JobWorkerPool", "get_job_pool",
+           "CircuitBreaker", "CircuitOpenError", "RetryPolicy", "get_breakers",
+           "OutboundRateLimiter", "RateLimitExceeded", "get_rate_limiter",
+           "AgentContext", "AgentRegistry", "UnknownAgentError", "get_agent_registry",
+           "AduanaResponse", "SoapFault", "parse_soap_response",
+           "IngestDTO", "DINIngestDTO", "paused_gc", "validate_json_bytes",
+           "DINXMLError", "parse_din_xml", "write_signed_envelope"]
@@ -0,0 +1,103 @@
+"""
+Registro de agentes atendidos por el proceso (SERVED_AGENTS).
+
+Cada agente tiene su propio signer (certificado), credenciales WS-Security,
+pool HTTP y cliente SOAP. La petición elige el agente con el header
+X-Agent o el campo AGENTE del cuerpo; sin indicarlo se usa ACTIVE_AGENT.
+
+El agente por defecto reutiliza los singletons get_signer(),
+get_http_pool() y get_soap_client(), de modo que el comportamiento con un
+solo agente no cambia.
+"""
+import logging
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from app.config import get_settings, AgentConfig
+from app.services.http_client import HttpClientPool, get_http_pool
+from app.services.signer import SignerService, get_signer
+from app.services.soap_client import SoapClientService, get_soap_client
+
+logger = logging.getLogger(__name__)
+
+# Header HTTP para elegir el agente de la petición
+AGENT_HEADER = "X-Agent"
+
+
+class UnknownAgentError(ValueError):
+    """El agente pedido no está entre los atendidos por este proceso."""
+
+
+class AgentContext:
+    def __init__(self, code: str, default: bool):
+        settings = get_settings()
+        self.code = code
+        self.default = default
+        self.config: AgentConfig = settings.get_agent_config(code)
+        self.ws_password = settings.get_ws_password(code)
+        if default:
+            self.http = get_http_pool()
+            self.soap_client = get_soap_client()
+        else:
+            self.http = HttpClientPool(name=code)
+            self.soap_client = SoapClientService(self.config, self.ws_password, self.http)
+        self._signer: Optional[SignerService] = None
+        self._lock = threading.Lock()
+
+    @property
+    def signer(self) -> SignerService:
+        # El certificado se carga al primer uso: un agente sin firmar no requiere PFX
+        if self._signer is None:
+            with self._lock:
+                if self._signer is None:
+                    self._signer = get_signer() if self.default else SignerService(self.config)
+        return self._signer
+
+
+class AgentRegistry:
+    def __init__(self, served: list[str], default: str):
+        self.served = served
+        self.default = default
+        self._contexts: dict[str, AgentContext] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, agent: Optional[str]) -> str:
+        code = agent.strip().upper() if agent and agent.strip() else self.default
+        if code not in self.served:
+            raise UnknownAgentError(f"Agente no atendido: {code}. Opciones: {', '.join(self.served)}")
+        return code
+
+    def get(self, agent: Optional[str] = None) -> AgentContext:
+        code = self.resolve(agent)
+        context = self._contexts.get(code)
+        if context is None:
+            with self._lock:
+                context = self._contexts.get(code)
+                if context is None:
+                    context = self._contexts[code] = AgentContext(code, default=code == self.default)
+        return context
+
+    async def start(self):
+        for code in self.served:
+            await self.get(code).http.start()
+
+    async def close(self):
+        for context in list(self._contexts.values()):
+            await context.http.close()
+
+    def pool_stats(self) -> dict[str, dict]:
+        return {code: context.http.stats() for code, context in list(self._contexts.items())}
+
+    def stats(self) -> dict:
+        return {
+            "default": self.default,
+            "served": self.served,
+            "loaded": sorted(self._contexts),
+        }
+
+
+@lru_cache
+def get_agent_registry() -> AgentRegistry:
+    settings = get_settings()
+    return AgentRegistry(settings.get_served_agents(), settings.active_agent.upper())
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.config import get_settings
+from app.models.din import DINModel, DINBatchItemResult
+from app.services.agents import UnknownAgentError, get_agent_registry
+from app.services.signed_cache import build_signed_envelope_cached
+from app.services.soap_client import SoapClientService
+
+logger = logging.getLogger(__name__)
+
+
+class BatchSender:
+    """
+    Construye, firma y envía un lote de DIN en paralelo.
+
+    La construcción/firma se reparte en el ejecutor CPU; los envíos a
+    RecibeDin se limitan a `max_concurrency` simultáneos. El fallo de un
+    ítem no aborta el resto del lote.
+
+    Cada ítem puede indicar su propio agente; sin indicarlo se usa `agent`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        engine: Optional[str] = None,
+        soap_client: SoapClientService = None,
+        agent: Optional[str] = None,
+    ):
+        self.settings = get_settings()
+        self.max_concurrency = max_concurrency or self.settings.batch_max_concurrency
+        self.engine = engine
+        self.agent = get_agent_registry().resolve(agent)
+        self.soap_client = soap_client or get_agent_registry().get(self.agent).soap_client
+
+    async def send_all(
+        self, dins: list[DINModel], agents: Optional[list[Optional[str]]] = None
+    ) -> list[DINBatchItemResult]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        agents = agents or [None] * len(dins)
+        tasks = [
+            self._send_one(index, din, agent, semaphore)
+            for index, (din, agent) in enumerate(zip(dins, agents))
+        ]
+        return list(await asyncio.gather(*tasks))
+
+    async def _send_one(
+        self, index: int, din: DINModel, agent: Optional[str], semaphore: asyncio.Semaphore
+    ) -> DINBatchItemResult:
+        if agent is None:
+            agent, soap_client = self.agent, self.soap_client
+        else:
+            try:
+                context = get_agent_registry().get(agent)
+            except UnknownAgentError as e:
+                return DINBatchItemResult(index=index, success=False, message=str(e), error="UNKNOWN_AGENT")
+            agent, soap_client = context.code, context.soap_client
+
+        build_start = time.perf_counter()
+        try:
+            built = await build_signed_envelope_cached(din, self.engine, agent)
+        except Exception as e:
+            logger.error(f"Lote ítem {index}: error generando XML: {e}")
+            return DINBatchItemResult(
+                index=index,
+                success=False,
+                message=f"Error interno: {str(e)}",
+                error=type(e).__name__,
+                build_ms=_elapsed_ms(build_start),
+            )
+        build_ms = _elapsed_ms(build_start)
+
+        if not built.valid:
+            return DINBatchItemResult(
+                index=index,
+                success=False,
+                message=f"Error en estructura XML: {built.message}",
+                error="XSD_INVALID" if built.schema_errors else "XML_INVALID",
+                build_ms=build_ms,
+                schema_errors=built.schema_errors,
+            )
+
+        async with semaphore:
+            send_start = time.perf_counter()
+            result = await soap_client.send_envelope(built.xml_bytes)
+            send_ms = _elapsed_ms(send_start)
+
+        if result["success"]:
+            logger.info(f"Lote ítem {index} enviado. Ticket: {result.get('ticket')}")
+        else:
+            logger.warning(f"Lote ítem {index} con error: {result.get('message')}")
+
+        return DINBatchItemResult(
+            index=index,
+            success=result["success"],
+            ticket=result.get("ticket"),
+            message=result.get("message", "Envío exitoso" if result["success"] else "Error en envío"),
+            error=result.get("error"),
+            build_ms=build_ms,
+            send_ms=send_ms,
+            errors=result.get("errores"),
+        )
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
@@ -0,0 +1,101 @@
+"""
+Compresión de respuestas HTTP negociada con Accept-Encoding.
+
+Litestar trae gzip y brotli; aquí se agrega deflate (formato zlib, RFC
+9110) y una negociación que respeta los q-values del cliente. A igual
+calidad se prefiere gzip. Las respuestas en streaming (NDJSON, SSE) se
+comprimen por bloque con flush, sin retener eventos.
+"""
+import zlib
+from io import BytesIO
+from typing import Optional
+
+from litestar.config.compression import CompressionConfig
+from litestar.datastructures import Headers
+from litestar.middleware import DefineMiddleware
+from litestar.middleware.compression import CompressionMiddleware
+from litestar.middleware.compression.facade import CompressionFacade
+from litestar.types import Receive, Scope, Send
+
+from app.config import get_settings
+
+ENCODING_GZIP = "gzip"
+ENCODING_DEFLATE = "deflate"
+# Orden de preferencia del servidor ante q-values iguales
+SUPPORTED_ENCODINGS = (ENCODING_GZIP, ENCODING_DEFLATE)
+
+
+class DeflateCompression(CompressionFacade):
+    __slots__ = ("compressor", "buffer", "compression_encoding")
+    encoding = ENCODING_DEFLATE
+
+    def __init__(self, buffer: BytesIO, compression_encoding: str, config: CompressionConfig) -> None:
+        self.buffer = buffer
+        self.compression_encoding = compression_encoding
+        self.compressor = zlib.compressobj(config.gzip_compress_level)
+
+    def write(self, body: bytes) -> None:
+        self.buffer.write(self.compressor.compress(body))
+        self.buffer.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def close(self) -> None:
+        self.buffer.write(self.compressor.flush())
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Codificación a usar según Accept-Encoding, o None para no comprimir."""
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[token] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class NegotiatedCompressionMiddleware(CompressionMiddleware):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = negotiate_encoding(Headers.from_scope(scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        # gzip usa el facade propio de Litestar; el resto, compression_facade (deflate)
+        await self.app(
+            scope,
+            receive,
+            self.create_compression_send_wrapper(send=send, compression_encoding=encoding, scope=scope),
+        )
+
+
+def get_compression_middleware() -> list[DefineMiddleware]:
+    """
+    Middleware de compresión para Litestar(middleware=...).
+
+    Se registra como middleware de la app y no vía compression_config:
+    Litestar 2.13 ignora CompressionConfig.middleware_class.
+    """
+    settings = get_settings()
+    if not settings.response_compression:
+        return []
+    config = CompressionConfig(
+        backend=ENCODING_DEFLATE,
+        compression_facade=DeflateCompression,
+        minimum_size=settings.compression_min_size,
+        gzip_compress_level=settings.compression_level,
+    )
+    return [DefineMiddleware(NegotiatedCompressionMiddleware, config=config)]
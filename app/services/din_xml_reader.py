@@ -0,0 +1,155 @@
+"""
+Lectura de DIN en XML (formato ENVIODIN, ver docs/formato_xml_correcto.xml).
+
+Acepta el elemento DIN como raíz o dentro de un sobre SOAP y reconoce los
+elementos por nombre local, con o sin namespace. El documento se recorre
+con iterparse: cada ITEM se convierte y valida como ItemModel apenas se
+cierra, y se libera del árbol junto con los ya procesados. El árbol lxml
+no crece con la cantidad de ítems, y el resultado es el mismo DINModel
+que produce el JSON, para el mismo pipeline de validación, construcción
+y firma.
+"""
+from io import BytesIO
+
+from lxml import etree
+from pydantic import ValidationError
+
+from app.models.din import DINModel, ItemModel
+
+ROOT_ELEMENT = "DIN"
+ITEM_ELEMENT = "ITEM"
+
+# Contenedores cuyo contenido es una lista del elemento indicado
+LIST_CONTAINERS = {
+    "ITEMS": "ITEM",
+    "OBSERVACIONESITEM": "OBSERVACIONITEM",
+    "CUENTASITEM": "CUENTAITEM",
+    "INSUMOS": "INSUMO",
+    "ANEXAS": "ANEXA",
+    "VISTOSBUENOS": "VISTOBUENO",
+    "CUENTASGIRO": "CUENTAGIRO",
+    "CUOTAS": "CUOTA",
+    "ANEXASDIN": "ANEXA",
+}
+# Elementos que se repiten dentro de un bloque con otros campos (siempre lista)
+REPEATED = {"BULTO", "ERROR", "FECHAVENCCUOTA", "MONTOCUOTA"}
+# Bloques que son un modelo aunque vengan vacíos
+BLOCKS = {
+    "LOG",
+    "CABEZA",
+    "IDENTIFICACION",
+    "REGIMENSUSPENSIVO",
+    "ORIGENTRANSPALMACENAJE",
+    "ANTECEDENTESFINANCIEROS",
+    "TOTALES",
+    "RESPUESTA",
+    "BULTOS",
+    "CUENTASYVALORES",
+    "PAGODIFERIDO",
+    "ERRORES",
+}
+STRUCTURED = BLOCKS | REPEATED | set(LIST_CONTAINERS)
+
+
+class DINXMLError(ValueError):
+    """XML mal formado o DIN inválido; errors usa el formato {message, key}."""
+
+    def __init__(self, message: str, errors: list[dict]):
+        super().__init__(message)
+        self.errors = errors
+
+
+def _validation_errors(e: ValidationError, prefix: tuple) -> list[dict]:
+    return [
+        {"message": error["msg"], "key": ".".join(str(loc) for loc in prefix + error["loc"])}
+        for error in e.errors(include_url=False)
+    ]
+
+
+class _Converter:
+    """Convierte un subárbol a la estructura dict/list que esperan los modelos."""
+
+    def __init__(self):
+        # Los tags se repiten miles de veces: nombre local por tag calificado
+        self._names: dict[str, str] = {}
+
+    def name(self, tag: str) -> str:
+        name = self._names.get(tag)
+        if name is None:
+            name = self._names[tag] = tag.rsplit("}", 1)[-1]
+        return name
+
+    def value(self, elem: etree._Element, name: str, items: list):
+        if name == "ITEMS":
+            # Los ITEM ya se validaron y retiraron del árbol al cerrarse
+            return items
+        if name in LIST_CONTAINERS:
+            return [self.value(child, self.name(child.tag), items) for child in elem]
+        if not len(elem) and name not in STRUCTURED:
+            return elem.text or ""
+        values = {}
+        for child in elem:
+            child_name = self.name(child.tag)
+            if len(child) or child_name in STRUCTURED:
+                child_value = self.value(child, child_name, items)
+            else:
+                # Hoja: el texto tal cual, los espacios son significativos (CODESTUM, NUMMANIF1, ...)
+                child_value = child.text or ""
+            if child_name in REPEATED:
+                values.setdefault(child_name, []).append(child_value)
+            else:
+                values[child_name] = child_value
+        return values
+
+
+def parse_din_xml(content: bytes) -> DINModel:
+    """
+    Convierte un DIN en XML a DINModel; lanza DINXMLError con todos los
+    errores de validación (los de cada ITEM con su índice).
+    """
+    converter = _Converter()
+    items: list[ItemModel] = []
+    item_index = 0
+    din = None
+    errors: list[dict] = []
+
+    # Solo ITEM y DIN llegan a Python; el resto del recorrido queda en libxml2
+    events = etree.iterparse(
+        BytesIO(content),
+        events=("end",),
+        tag=("{*}" + ITEM_ELEMENT, "{*}" + ROOT_ELEMENT),
+        resolve_entities=False,
+        no_network=True,
+        remove_comments=True,
+        remove_pis=True,
+    )
+    try:
+        for _, elem in events:
+            name = converter.name(elem.tag)
+            if name == ROOT_ELEMENT:
+                din = converter.value(elem, name, items)
+                elem.clear()
+                break
+            try:
+                items.append(ItemModel.model_validate(converter.value(elem, name, items)))
+            except ValidationError as e:
+                errors.extend(_validation_errors(e, (ROOT_ELEMENT, "ITEMS", item_index)))
+            item_index += 1
+            # Liberar el ITEM y los ya procesados
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        raise DINXMLError(f"XML mal formado: {e}", [{"message": str(e), "key": ""}]) from e
+
+    if not isinstance(din, dict):
+        message = f"El documento no contiene el elemento {ROOT_ELEMENT}"
+        raise DINXMLError(message, [{"message": message, "key": ROOT_ELEMENT}])
+
+    try:
+        model = DINModel.model_validate(din)
+    except ValidationError as e:
+        errors.extend(_validation_errors(e, (ROOT_ELEMENT,)))
+    if errors:
+        raise DINXMLError(f"DIN inválido: {len(errors)} errores de validación", errors)
+    return model
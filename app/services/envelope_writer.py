@@ -0,0 +1,266 @@
+"""
+Escritura en streaming del sobre DIN firmado, para DIN con muchos ítems.
+
+El camino por árbol (DINPipeline) construye el documento completo, signxml
+vuelve a canonicalizar el DIN entero en memoria para el digest y tostring
+lo serializa de una vez. Aquí el sobre se escribe sección por sección: cada
+sección, y cada ITEM, se construye con los helpers de xml_tree_builder
+dentro de un DIN de trabajo, se agrega al digest SHA-1 en forma canónica
+(C14N 1.0 inclusiva, la misma transformación de la firma), se escribe en
+output y se descarta. Al cerrar el DIN se firma SignedInfo y se escribe la
+Signature como su último hijo. El árbol vivo nunca supera un bloque de
+ítems (XSD_CHUNK_ITEMS).
+
+No se usa etree.xmlfile: su write() repite en cada elemento todos los
+namespaces en alcance (los 36 del DIN). Cada sección se serializa con
+tostring y se le quitan esas declaraciones, que el DIN ya hace.
+
+La validación XSD se hace por bloques: el DIN de trabajo con todas las
+secciones salvo los ítems, más un bloque de ítems. Los esquemas no tienen
+restricciones de identidad y ITEM no tiene máximo, así que el DIN completo
+es válido si y solo si lo es cada bloque.
+
+La salida es idéntica byte a byte a build_signed_envelope con el motor lxml,
+que firma con signxml (SHA1XMLSigner, ver app.services.signer); lo verifica
+scripts/check_envelope_writer.py. Incluye la forma de SignedInfo que firma
+signxml: con prefijo ds, mientras el documento lo escribe con el prefijo
+ns35 que el DIN ya declara para xmldsig.
+"""
+import base64
+import hashlib
+import re
+from typing import BinaryIO, Optional
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
+from cryptography.hazmat.primitives.serialization import Encoding
+from lxml import etree
+
+from app.models.din import DINModel, SchemaErrorDetail
+from app.services.metrics import STAGE_SIGN, STAGE_XSD, observe_stage
+from app.services.signer import XMLDSIG_NS, SignerService
+from app.services.ws_security import apply_ws_security
+from app.services.xml_tree_builder import (
+    DIN_NSMAP,
+    NS_ANEXA,
+    NS_ANEXAS,
+    NS_CUENTAITEM,
+    NS_CUENTASITEM,
+    NS_INSUMO,
+    NS_INSUMOS,
+    NS_ITEM,
+    NS_ITEMS,
+    NS_OBSERVACIONESITEM,
+    NS_OBSERVACIONITEM,
+    SOAP_NS,
+    TAG_ITEMS,
+    build_din_head,
+    build_din_tail,
+    build_item,
+)
+from app.services.xsd_validator import DINSchemaValidator
+
+# Ítems vivos a la vez: cada bloque se valida contra el XSD antes de escribirse
+XSD_CHUNK_ITEMS = 50
+
+# Namespaces de build_item. libxml2 recorre en C14N todos los namespaces en
+# alcance por elemento: un ITEM se canonicaliza unas cinco veces más rápido
+# bajo un DIN que declara solo estos que bajo los 36 del DIN real, con la
+# misma forma canónica una vez quitadas las declaraciones del ápice.
+ITEM_NAMESPACES = (
+    NS_ITEMS, NS_ITEM, NS_OBSERVACIONESITEM, NS_OBSERVACIONITEM, NS_CUENTASITEM,
+    NS_CUENTAITEM, NS_INSUMOS, NS_INSUMO, NS_ANEXAS, NS_ANEXA,
+)
+ITEM_NSMAP = {prefix: ns for prefix, ns in DIN_NSMAP.items() if ns in ITEM_NAMESPACES}
+
+C14N_ALGORITHM = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+ENVELOPED_TRANSFORM = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+RSA_SHA1 = "http://www.w3.org/2000/09/xmldsig#rsa-sha1"
+SHA1 = "http://www.w3.org/2000/09/xmldsig#sha1"
+
+_ITEM_PATH_RE = re.compile(r"(:ITEMS/[^/\[]+:ITEM)(?:\[(\d+)\])?")
+
+
+def _ds(name: str) -> str:
+    return f"{{{XMLDSIG_NS}}}{name}"
+
+
+def _without_declarations(data: bytes) -> bytes:
+    # Las secciones del DIN no tienen atributos: en la etiqueta de apertura,
+    # lo que sigue al nombre son los namespaces en alcance (tostring y c14n)
+    end = data.index(b">")
+    cut = data.find(b" xmlns:", 0, end)
+    if cut < 0:
+        return data
+    closing = b"/>" if data[end - 1:end] == b"/" else b">"
+    return data[:cut] + closing + data[end + 1:]
+
+
+class _CanonicalDigest:
+    """
+    SHA-1 incremental del DIN canónico (sin la Signature).
+
+    En C14N inclusiva el DIN declara todos los namespaces en alcance y sus
+    descendientes ninguno. Canonicalizar un hijo por separado lo vuelve
+    ápice y le agrega las declaraciones en alcance, que se quitan.
+    """
+
+    def __init__(self, din_elem: etree._Element):
+        canonical = etree.tostring(din_elem, method="c14n")
+        self.end_tag = b"</DIN>"
+        self._sha1 = hashlib.sha1(canonical[: canonical.index(b">") + 1])
+
+    def canonical(self, elem: etree._Element) -> bytes:
+        return _without_declarations(etree.tostring(elem, method="c14n"))
+
+    def update(self, data: bytes):
+        self._sha1.update(data)
+
+    def value(self) -> str:
+        self._sha1.update(self.end_tag)
+        return base64.b64encode(self._sha1.digest()).decode()
+
+
+def _signed_info(parent: etree._Element, digest_value: str) -> etree._Element:
+    # Mismo contenido y orden que SHA1XMLSigner(method=enveloped, rsa-sha1, sha1, c14n 1.0)
+    signed_info = etree.SubElement(parent, _ds("SignedInfo"))
+    etree.SubElement(signed_info, _ds("CanonicalizationMethod"), Algorithm=C14N_ALGORITHM)
+    etree.SubElement(signed_info, _ds("SignatureMethod"), Algorithm=RSA_SHA1)
+    reference = etree.SubElement(signed_info, _ds("Reference"), URI="")
+    transforms = etree.SubElement(reference, _ds("Transforms"))
+    etree.SubElement(transforms, _ds("Transform"), Algorithm=ENVELOPED_TRANSFORM)
+    etree.SubElement(transforms, _ds("Transform"), Algorithm=C14N_ALGORITHM)
+    etree.SubElement(reference, _ds("DigestMethod"), Algorithm=SHA1)
+    etree.SubElement(reference, _ds("DigestValue")).text = digest_value
+    return signed_info
+
+
+def _build_signature(din_elem: etree._Element, digest_value: str, signer: SignerService) -> etree._Element:
+    private_key, certificate = signer.signing_material()
+
+    # signxml canonicaliza SignedInfo bajo una Signature que declara el prefijo ds
+    holder = etree.SubElement(din_elem, _ds("Signature"), nsmap={"ds": XMLDSIG_NS})
+    signed_info_c14n = etree.tostring(_signed_info(holder, digest_value), method="c14n")
+    din_elem.remove(holder)
+    signature_value = private_key.sign(signed_info_c14n, PKCS1v15(), hashes.SHA1())
+
+    # En el documento la Signature toma el prefijo ns35 declarado en el DIN
+    signature = etree.SubElement(din_elem, _ds("Signature"))
+    _signed_info(signature, digest_value)
+    etree.SubElement(signature, _ds("SignatureValue")).text = base64.b64encode(signature_value).decode()
+    x509_data = etree.SubElement(etree.SubElement(signature, _ds("KeyInfo")), _ds("X509Data"))
+    pem_lines = certificate.public_bytes(Encoding.PEM).decode("ascii").splitlines(keepends=True)
+    etree.SubElement(x509_data, _ds("X509Certificate")).text = "".join(pem_lines[1:-1])
+    return signature
+
+
+def _validate_chunk(
+    validator: DINSchemaValidator, din_elem: etree._Element, offset: int, total: int
+) -> list[SchemaErrorDetail]:
+    with observe_stage(STAGE_XSD):
+        errors = validator.validate(din_elem)
+
+    def absolute(match: re.Match) -> str:
+        index = offset + int(match.group(2) or 1)
+        return f"{match.group(1)}[{index}]" if total > 1 else match.group(1)
+
+    for error in errors:
+        if error.path:
+            error.path = _ITEM_PATH_RE.sub(absolute, error.path, count=1)
+        # Las líneas del DIN de trabajo no corresponden al documento final
+        error.line = None
+    return errors
+
+
+def _split_tags(elem: etree._Element, document: bool = False) -> tuple[bytes, bytes]:
+    """
+    Lo serializado antes y después del contenido de elem (sin hijos); con
+    document, desde la declaración XML hasta el cierre del elemento raíz.
+    """
+    placeholder = etree.Comment("contenido")
+    elem.append(placeholder)
+    if document:
+        data = etree.tostring(elem.getroottree(), encoding="UTF-8", xml_declaration=True)
+    else:
+        data = etree.tostring(elem, encoding="UTF-8")
+    elem.remove(placeholder)
+    before, after = data.split(b"<!--contenido-->")
+    return before, after
+
+
+def write_signed_envelope(
+    din: DINModel,
+    output: BinaryIO,
+    signer: SignerService,
+    ws_user: str,
+    ws_password: str,
+    validator: Optional[DINSchemaValidator] = None,
+) -> list[SchemaErrorDetail]:
+    """
+    Escribe en output el sobre SOAP firmado y con WS-Security del DIN (ya
+    preparado, ver XMLBuilderService.prepare).
+
+    Con validator, cada bloque de ítems se valida contra el XSD antes de
+    escribirse; ante el primer bloque inválido retorna sus errores y output
+    queda incompleto.
+    """
+    # Documento de trabajo: Header con WS-Security y Body/DIN
+    envelope = etree.Element(f"{{{SOAP_NS}}}Envelope", nsmap={"soapenv": SOAP_NS})
+    etree.SubElement(envelope, f"{{{SOAP_NS}}}Header")
+    body = etree.SubElement(envelope, f"{{{SOAP_NS}}}Body")
+    din_elem = etree.SubElement(body, "DIN", nsmap=DIN_NSMAP)
+    apply_ws_security(envelope, ws_user, ws_password)
+    digest = _CanonicalDigest(din_elem)
+    # Declaración, Envelope, Header, Body y apertura del DIN; y sus cierres
+    document_start, document_end = _split_tags(din_elem, document=True)
+
+    build_din_head(din_elem, din)
+    head = list(din_elem)
+    items_elem = etree.SubElement(din_elem, TAG_ITEMS)
+    build_din_tail(din_elem, din)
+    tail = list(din_elem)[len(head) + 1:]
+
+    def write(elem: etree._Element):
+        digest.update(digest.canonical(elem))
+        output.write(_without_declarations(etree.tostring(elem, encoding="UTF-8")))
+
+    output.write(document_start)
+    for elem in head:
+        write(elem)
+
+    total = len(din.items)
+    if not total:
+        if validator is not None:
+            errors = _validate_chunk(validator, din_elem, 0, total)
+            if errors:
+                return errors
+        write(items_elem)
+    else:
+        items_open, items_close = _split_tags(items_elem)
+        canonical_open, canonical_close = digest.canonical(items_elem).split(b"><", 1)
+        item_holder = etree.Element("DIN", nsmap=ITEM_NSMAP)
+        output.write(_without_declarations(items_open))
+        digest.update(canonical_open + b">")
+        for offset in range(0, total, XSD_CHUNK_ITEMS):
+            for item in din.items[offset:offset + XSD_CHUNK_ITEMS]:
+                build_item(items_elem, item)
+            if validator is not None:
+                errors = _validate_chunk(validator, din_elem, offset, total)
+                if errors:
+                    return errors
+            for item_elem in list(items_elem):
+                # Al DIN liviano para canonicalizar y serializar (ver ITEM_NSMAP)
+                item_holder.append(item_elem)
+                write(item_elem)
+                item_holder.remove(item_elem)
+        output.write(items_close)
+        digest.update(b"<" + canonical_close)
+
+    for elem in tail:
+        write(elem)
+
+    with observe_stage(STAGE_SIGN):
+        signature = _build_signature(din_elem, digest.value(), signer)
+    output.write(_without_declarations(etree.tostring(signature, encoding="UTF-8")))
+    output.write(document_end)
+    return []
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Callable
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("thread", "process")
+
+
+def _warm_up_worker():
+    from app.services.pipeline import warm_up
+
+    warm_up()
+
+
+class CPUExecutor:
+    """
+    Ejecuta trabajo CPU (build/validación/firma) fuera del event loop.
+
+    Modo "thread": pool de hilos acotado; lxml y la firma RSA liberan el GIL
+    en gran parte del trabajo. Modo "process": pool de procesos, cada worker
+    precarga plantilla y llave al iniciar para no reinicializar por trabajo.
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: int = 0):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Modo de ejecutor no válido: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Executor = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up_worker,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="din-cpu",
+            )
+            # Los hilos comparten builder y llaves: basta precargarlos una vez
+            self._executor.submit(_warm_up_worker)
+        logger.info(f"Ejecutor CPU iniciado: {self.mode} ({self.max_workers} workers)")
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        logger.info("Ejecutor CPU detenido")
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self._executor is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+
+@lru_cache
+def get_cpu_executor() -> CPUExecutor:
+    settings = get_settings()
+    return CPUExecutor(
+        mode=settings.cpu_executor.lower(),
+        max_workers=settings.cpu_max_workers,
+    )
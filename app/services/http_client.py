@@ -0,0 +1,94 @@
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientPool:
+    """
+    Cliente httpx.AsyncClient de alcance de aplicación.
+
+    Se crea en on_startup y se cierra en on_shutdown, de modo que las
+    conexiones (y handshakes TLS) hacia los endpoints de Aduana se reutilizan
+    entre solicitudes.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.settings = get_settings()
+        self.name = name
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> Optional[httpx.AsyncClient]:
+        return self._client
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.settings.http_max_connections,
+            max_keepalive_connections=self.settings.http_max_keepalive_connections,
+            keepalive_expiry=self.settings.http_keepalive_expiry,
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=self.settings.http2,
+            timeout=self.recibe_din_timeout,
+        )
+
+    @property
+    def recibe_din_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            self.settings.recibe_din_timeout,
+            connect=self.settings.recibe_din_connect_timeout,
+        )
+
+    @property
+    def consulta_din_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            self.settings.consulta_din_timeout,
+            connect=self.settings.consulta_din_connect_timeout,
+        )
+
+    async def start(self):
+        if self._client is not None:
+            return
+        self._client = self._build_client()
+        logger.info(
+            f"Cliente HTTP {self.name} iniciado (max_connections={self.settings.http_max_connections}, "
+            f"http2={self.settings.http2})"
+        )
+
+    async def close(self):
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+        logger.info(f"Cliente HTTP {self.name} cerrado")
+
+    async def post(self, url: str, content: bytes, headers: dict, timeout: httpx.Timeout) -> httpx.Response:
+        if self._client is not None:
+            return await self._client.post(url, content=content, headers=headers, timeout=timeout)
+
+        # Fuera del ciclo de vida de la app (scripts, consola): cliente efímero
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            return await client.post(url, content=content, headers=headers)
+
+    def stats(self) -> dict:
+        """Uso del pool de conexiones (lee el pool interno de httpcore)."""
+        stats = {"active": 0, "idle": 0, "pending": 0, "max_connections": self.settings.http_max_connections}
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        if pool is None:
+            return stats
+        for connection in list(pool.connections):
+            stats["idle" if connection.is_idle() else "active"] += 1
+        stats["pending"] = sum(1 for request in list(getattr(pool, "_requests", ())) if request.is_queued())
+        return stats
+
+
+@lru_cache
+def get_http_pool() -> HttpClientPool:
+    return HttpClientPool()
@@ -0,0 +1,133 @@
+"""
+Ingesta rápida de DIN desde los bytes JSON del cuerpo.
+
+Un DINRequest de 999 ítems crea decenas de miles de objetos al validarse,
+y el recolector cíclico de Python se dispara varias veces a mitad de la
+validación (cerca de un tercio del costo, y picos de latencia en p95).
+Aquí los bytes se decodifican con msgspec y se validan con pydantic con
+el recolector pausado; los modelos resultantes no forman ciclos.
+
+Se evaluó model_validate_json sobre los bytes, pero los validadores
+"before" de los modelos (extract_list) obligan a pydantic a materializar
+los valores en Python y resulta más lento que decodificar y validar.
+
+- IngestDTO: DTO de Litestar que usa este camino para el cuerpo de la
+  request, manteniendo `data: DINRequest` en la firma y en OpenAPI.
+- DINIngestDTO: IngestDTO[DINRequest] que además acepta el DIN en XML
+  (text/xml o application/xml, ver app.services.din_xml_reader).
+- validate_json_bytes: el mismo camino para otros llamadores (NDJSON,
+  cola de trabajos).
+
+No hay un modo "confiable" que omita la validación de bytes ya validados:
+model_construct no construye los submodelos anidados (quedarían dicts) y
+los validadores "before" normalizan la forma de las listas. El llamador
+interno que sí puede confiar, la cola de trabajos, entrega a sus workers
+el DIN ya validado en memoria y solo revalida el payload leído de SQLite.
+"""
+import gc
+import threading
+from contextlib import contextmanager
+from typing import Any, Generic, Iterator, TypeVar, Union
+
+from litestar.dto import DTOConfig
+from litestar.enums import RequestEncodingType
+from litestar.exceptions import SerializationException, ValidationException
+from litestar.plugins.pydantic import PydanticDTO
+from litestar.serialization import decode_json
+from pydantic import BaseModel, ValidationError
+
+from app.models.din import DINRequest
+from app.services.din_xml_reader import DINXMLError, parse_din_xml
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+XML_MEDIA_TYPES = ("text/xml", "application/xml")
+
+
+# El recolector es global al proceso: las pausas concurrentes (hilos del
+# ejecutor, event loop) se cuentan y solo la última lo reactiva
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """Pausa el recolector cíclico; al salir la última pausa, lo reactiva si estaba activo."""
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+def validate_json_bytes(model_type: type[ModelT], raw: Union[bytes, str]) -> ModelT:
+    """
+    Valida bytes JSON contra model_type con el recolector pausado.
+
+    Lanza pydantic.ValidationError, también si el JSON está mal formado,
+    igual que model_validate_json.
+    """
+    try:
+        value = decode_json(raw)
+    except SerializationException:
+        # model_validate_json produce el ValidationError json_invalid
+        return model_type.model_validate_json(raw)
+    with paused_gc():
+        return model_type.model_validate(value)
+
+
+class IngestDTO(PydanticDTO[ModelT], Generic[ModelT]):
+    """
+    DTO de entrada para modelos grandes: IngestDTO[DINRequest].
+
+    Usar con return_dto=None; la respuesta se serializa como siempre.
+    """
+
+    config = DTOConfig()
+
+    def decode_bytes(self, value: bytes) -> Any:
+        if self.asgi_connection.content_type[0] != RequestEncodingType.JSON:
+            return super().decode_bytes(value)
+        try:
+            return validate_json_bytes(self.model_type, value)
+        except ValidationError as e:
+            request = self.asgi_connection
+            raise ValidationException(
+                detail=f"Validation failed for {request.method} {request.url.path}",
+                extra=[
+                    {"message": error["msg"], "key": ".".join(str(loc) for loc in error["loc"])}
+                    for error in e.errors(include_url=False)
+                ],
+            ) from e
+
+    @classmethod
+    def create_openapi_schema(cls, field_definition, handler_id, schema_creator):
+        # El esquema del modelo pydantic (con alias), no el del DTO
+        return schema_creator.for_field_definition(field_definition)
+
+
+class DINIngestDTO(IngestDTO[DINRequest]):
+    """Cuerpo DINRequest en JSON, o el DIN en XML con el agente del header X-Agent."""
+
+    def decode_bytes(self, value: bytes) -> Any:
+        if self.asgi_connection.content_type[0] not in XML_MEDIA_TYPES:
+            return super().decode_bytes(value)
+        try:
+            with paused_gc():
+                din = parse_din_xml(value)
+        except DINXMLError as e:
+            request = self.asgi_connection
+            raise ValidationException(
+                detail=f"Validation failed for {request.method} {request.url.path}: {e}",
+                extra=e.errors,
+            ) from e
+        return DINRequest.model_construct(din=din)
@@ -0,0 +1,414 @@
+"""
+Cola durable de envíos asíncronos (POST /send-async, GET /jobs/{id}).
+
+Los trabajos se guardan en SQLite antes de responder 202, y un pool de
+workers asyncio los procesa (construcción, firma y envío). Cada trabajo
+"running" tiene un lease (owner, lease_until) que su worker renueva mientras
+lo procesa; si el proceso muere, el lease vence y cualquier proceso que
+comparta la base lo vuelve a tomar. Un trabajo que falla de forma inesperada
+vuelve a la cola con backoff exponencial (not_before).
+
+Los DIN encolados en este proceso pasan a los workers ya validados, en
+memoria: el payload de SQLite lo serializó la propia cola y volver a
+validarlo es redundante. Solo tras un reinicio, un reintento o si el
+trabajo lo toma otro proceso se valida el payload (app.services.ingest).
+
+Los envíos que no alcanzaron a Aduana (circuito abierto, límite de tasa,
+error de conexión) también vuelven a la cola con backoff, hasta
+JOBS_MAX_ATTEMPTS; un DIN inválido, ERRORES o un SOAP Fault son finales.
+
+La entrega es al-menos-una-vez: si el proceso muere después de que Aduana
+recibió el DIN pero antes de guardar el resultado, el trabajo se reintenta.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from app.config import get_settings
+from app.models.din import DINModel
+from app.services.agents import get_agent_registry
+from app.services.ingest import validate_json_bytes
+from app.services.signed_cache import build_signed_envelope_cached
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "jobs.sqlite3"
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Resultados de send_envelope en que el DIN no llegó a Aduana: se reintentan
+RETRYABLE_SEND_ERRORS = {"CIRCUIT_OPEN", "RATE_LIMITED", "CONNECTION_ERROR"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    engine TEXT,
+    agent TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL,
+    not_before REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+@dataclass
+class Job:
+    id: str
+    status: str
+    payload: str
+    engine: Optional[str]
+    attempts: int
+    result: Optional[dict]
+    created_at: float
+    updated_at: float
+    agent: Optional[str] = None
+    owner: Optional[str] = None
+    lease_until: Optional[float] = None
+    not_before: Optional[float] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            status=row["status"],
+            payload=row["payload"],
+            engine=row["engine"],
+            attempts=row["attempts"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            agent=row["agent"],
+            owner=row["owner"],
+            lease_until=row["lease_until"],
+            not_before=row["not_before"],
+        )
+
+
+class JobStore:
+    """Acceso síncrono a la tabla de trabajos; una conexión protegida por lock."""
+
+    def __init__(self, db_path: str, lease_seconds: float = 60.0):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        # Dueño de los leases que toma esta instancia
+        self.owner = uuid.uuid4().hex
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Bases creadas antes de la selección de agente por petición
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "agent" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN agent TEXT")
+        # Y antes de los leases y el backoff
+        for column in ("owner TEXT", "lease_until REAL", "not_before REAL"):
+            if column.split()[0] not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+        self._lock = threading.Lock()
+
+    def enqueue(self, payload: str, engine: Optional[str], agent: Optional[str] = None) -> Job:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, engine, agent, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, payload, engine, agent, now, now),
+            )
+        return Job(job_id, JOB_QUEUED, payload, engine, 0, None, now, now, agent)
+
+    def claim(self) -> Optional[Job]:
+        """
+        Toma el trabajo más antiguo disponible (en cola y sin backoff
+        pendiente, o running con el lease vencido) y lo marca como running
+        con un lease de esta instancia.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE (status = ? AND COALESCE(not_before, 0) <= ?) "
+                    "OR (status = ? AND COALESCE(lease_until, 0) < ?) ORDER BY created_at LIMIT 1",
+                    (JOB_QUEUED, now, JOB_RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                lease_until = now + self.lease_seconds
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, owner = ?, lease_until = ?, "
+                    "not_before = NULL, updated_at = ? WHERE id = ?",
+                    (JOB_RUNNING, self.owner, lease_until, now, row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = Job.from_row(row)
+        job.status = JOB_RUNNING
+        job.attempts += 1
+        job.owner = self.owner
+        job.lease_until = lease_until
+        job.not_before = None
+        job.updated_at = now
+        return job
+
+    def renew(self, job_id: str) -> bool:
+        """Extiende el lease de un trabajo propio; False si ya no es de esta instancia."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND owner = ?",
+                (now + self.lease_seconds, now, job_id, JOB_RUNNING, self.owner),
+            )
+            return cursor.rowcount > 0
+
+    def finish(self, job_id: str, status: str, result: dict):
+        # Sólo si el lease sigue siendo propio: si venció, el trabajo ya es de otro
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (status, json.dumps(result, ensure_ascii=False), time.time(), job_id, JOB_RUNNING, self.owner),
+            )
+
+    def requeue(self, job_id: str, delay: float = 0.0):
+        """Devuelve un trabajo propio a la cola; no se vuelve a tomar antes de `delay` segundos."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, not_before = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (JOB_QUEUED, now + delay if delay > 0 else None, now, job_id, JOB_RUNNING, self.owner),
+            )
+
+    def recover(self) -> int:
+        """Devuelve a la cola los trabajos running cuyo lease venció (su proceso murió)."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND COALESCE(lease_until, 0) < ?",
+                (JOB_QUEUED, now, JOB_RUNNING, now),
+            )
+            return cursor.rowcount
+
+    def purge(self, older_than: float) -> int:
+        """Elimina trabajos terminados antes de `older_than` (epoch)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JOB_SUCCEEDED, JOB_FAILED, older_than),
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorkerPool:
+    def __init__(
+        self,
+        workers: int,
+        max_attempts: int,
+        poll_interval: float,
+        retention_hours: float,
+        db_path: str,
+        inline_max: int = 0,
+        lease_seconds: float = 60.0,
+        retry_base_delay: float = 5.0,
+        retry_max_delay: float = 300.0,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.poll_interval = poll_interval
+        self.retention_hours = retention_hours
+        self.db_path = db_path
+        self.store: Optional[JobStore] = None
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running: dict[str, Job] = {}
+        self.inline_max = inline_max
+        # job_id -> DIN validado en submit, entregado al worker sin releer el payload
+        self._inline: OrderedDict[str, DINModel] = OrderedDict()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self.store = await asyncio.to_thread(JobStore, self.db_path, self.lease_seconds)
+        recovered = await asyncio.to_thread(self.store.recover)
+        purged = await asyncio.to_thread(self.store.purge, time.time() - self.retention_hours * 3600)
+        if recovered or purged:
+            logger.info(f"Cola de trabajos: {recovered} reanudados, {purged} eliminados por antigüedad")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Workers de trabajos iniciados: {self.workers} ({self.store.db_path})")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            await asyncio.to_thread(self.store.close)
+            self.store = None
+        logger.info("Workers de trabajos detenidos")
+
+    async def submit(self, din: DINModel, engine: Optional[str] = None, agent: Optional[str] = None) -> Job:
+        if self.store is None:
+            await self.start()
+        job = await asyncio.to_thread(self.store.enqueue, din.model_dump_json(by_alias=True), engine, agent)
+        if self.inline_max > 0:
+            self._inline[job.id] = din
+            # Trabajos tomados por otro proceso nunca se retiran: se descarta el más antiguo
+            while len(self._inline) > self.inline_max:
+                self._inline.popitem(last=False)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        if self.store is None:
+            await self.start()
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self):
+        while True:
+            # Limpiar antes de buscar: un submit concurrente vuelve a activarlo
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self.store.claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._running[job.id] = job
+            keep_lease = asyncio.create_task(self._keep_lease(job))
+            try:
+                status, result = await self._process(job)
+            except asyncio.CancelledError:
+                # Apagado: el trabajo vuelve a la cola para el próximo arranque
+                await asyncio.to_thread(self.store.requeue, job.id)
+                raise
+            except Exception as e:
+                logger.error(f"Trabajo {job.id}: error inesperado: {e}", exc_info=True)
+                if job.attempts < self.max_attempts:
+                    delay = self.retry_delay(job.attempts)
+                    logger.warning(f"Trabajo {job.id}: reintento {job.attempts} en {delay:.0f}s")
+                    await asyncio.to_thread(self.store.requeue, job.id, delay)
+                    continue
+                status, result = JOB_FAILED, {
+                    "success": False,
+                    "message": f"Error interno: {str(e)}",
+                    "error": type(e).__name__,
+                }
+            finally:
+                keep_lease.cancel()
+                self._running.pop(job.id, None)
+            if result.get("error") in RETRYABLE_SEND_ERRORS and job.attempts < self.max_attempts:
+                # Aduana no disponible: esperar en la cola en vez de fallar en definitiva
+                delay = self.retry_delay(job.attempts)
+                logger.warning(f"Trabajo {job.id}: {result['error']}, reintento {job.attempts} en {delay:.0f}s")
+                await asyncio.to_thread(self.store.requeue, job.id, delay)
+                continue
+            await asyncio.to_thread(self.store.finish, job.id, status, result)
+            logger.info(f"Trabajo {job.id} finalizado: {status}")
+
+    def retry_delay(self, attempts: int) -> float:
+        """Backoff exponencial tras el intento `attempts` (1, 2, ...), acotado."""
+        return min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempts - 1)))
+
+    async def _keep_lease(self, job: Job):
+        # Renovar con margen: un tercio del lease entre renovaciones
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.store.renew, job.id):
+                logger.warning(f"Trabajo {job.id}: el lease ya no es de este proceso")
+                return
+
+    async def _process(self, job: Job) -> tuple[str, dict]:
+        # La construcción modifica el DIN en el lugar: solo el primer intento lo recibe en memoria
+        din = self._inline.pop(job.id, None)
+        if din is None:
+            # Un DIN de muchos ítems tarda: fuera del event loop
+            din = await asyncio.to_thread(validate_json_bytes, DINModel, job.payload)
+        context = get_agent_registry().get(job.agent)
+        built = await build_signed_envelope_cached(din, job.engine, context.code)
+        if not built.valid:
+            return JOB_FAILED, {
+                "success": False,
+                "message": f"Error en estructura XML: {built.message}",
+                "error": "XSD_INVALID" if built.schema_errors else "XML_INVALID",
+                "schema_errors": [e.model_dump() for e in built.schema_errors or []] or None,
+            }
+
+        result = await context.soap_client.send_envelope(built.xml_bytes)
+        return (JOB_SUCCEEDED if result["success"] else JOB_FAILED), {
+            "success": result["success"],
+            "ticket": result.get("ticket"),
+            "message": result.get("message", "Envío exitoso" if result["success"] else "Error en envío"),
+            "error": result.get("error"),
+            "raw_response": result.get("raw_response"),
+            "errors": [e.model_dump() for e in result.get("errores") or []] or None,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "running": len(self._running),
+            "inline": len(self._inline),
+            "jobs": self.store.counts() if self.store is not None else {},
+        }
+
+
+@lru_cache
+def get_job_pool() -> JobWorkerPool:
+    settings = get_settings()
+    return JobWorkerPool(
+        workers=settings.jobs_workers,
+        max_attempts=settings.jobs_max_attempts,
+        poll_interval=settings.jobs_poll_interval,
+        retention_hours=settings.jobs_retention_hours,
+        db_path=settings.jobs_db_path or str(DEFAULT_DB_PATH),
+        inline_max=settings.jobs_inline_max,
+        lease_seconds=settings.jobs_lease_seconds,
+        retry_base_delay=settings.jobs_retry_base_delay,
+        retry_max_delay=settings.jobs_retry_max_delay,
+    )
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509 import Certificate
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+
+from app.config import AgentConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LoadedKey:
+    """Llave y certificado decodificados desde el PFX de un agente."""
+
+    cod_agente: str
+    cert_path: str
+    mtime_ns: int
+    size: int
+    # SHA-256 de la contraseña del PFX: una contraseña nueva también recarga
+    password_hash: str
+    private_key: RSAPrivateKey
+    certificate: Certificate
+    # SHA-256 del certificado (DER), en hex
+    fingerprint: str
+
+
+class SigningKeyRegistry:
+    """
+    Registro compartido (thread-safe) de llaves de firma por agente.
+
+    El PFX se decodifica una sola vez por agente y se reutiliza mientras el
+    archivo (mtime/tamaño) y su contraseña no cambien. Si el archivo se
+    reemplaza en disco, la siguiente solicitud recarga el certificado
+    automáticamente.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, LoadedKey] = {}
+        self._lock = threading.Lock()
+        self._agent_locks: dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _agent_lock(self, cod_agente: str) -> threading.Lock:
+        with self._lock:
+            lock = self._agent_locks.get(cod_agente)
+            if lock is None:
+                lock = threading.Lock()
+                self._agent_locks[cod_agente] = lock
+            return lock
+
+    def get(self, agent_config: AgentConfig) -> LoadedKey:
+        """Retorna la llave del agente, cargándola o recargándola si es necesario."""
+        cert_path = Path(agent_config.cert_path)
+        try:
+            stat = os.stat(cert_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Certificado no encontrado: {cert_path}")
+
+        key = agent_config.cod_agente
+        entry = self._entries.get(key)
+        if entry is not None and self._is_fresh(entry, agent_config, stat):
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        # Un lock por agente evita decodificar el mismo PFX en paralelo
+        with self._agent_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry, agent_config, stat):
+                with self._lock:
+                    self.hits += 1
+                return entry
+
+            loaded = self._load(agent_config, cert_path, stat)
+            with self._lock:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.reloads += 1
+                    logger.info(f"Certificado o contraseña modificados, recargado: {key}")
+                self._entries[key] = loaded
+            return loaded
+
+    def invalidate(self, cod_agente: str = None):
+        """Descarta la llave de un agente (o de todos si no se indica)."""
+        with self._lock:
+            if cod_agente is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(cod_agente, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "agents": sorted(self._entries.keys()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+            }
+
+    @staticmethod
+    def _is_fresh(entry: LoadedKey, agent_config: AgentConfig, stat: os.stat_result) -> bool:
+        return (
+            entry.cert_path == agent_config.cert_path
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.size == stat.st_size
+            and entry.password_hash == _password_hash(agent_config)
+        )
+
+    @staticmethod
+    def _load(agent_config: AgentConfig, cert_path: Path, stat: os.stat_result) -> LoadedKey:
+        with open(cert_path, "rb") as f:
+            pfx_data = f.read()
+
+        password = agent_config.cert_password.encode("utf-8") if agent_config.cert_password else None
+
+        try:
+            # cryptography >= 43 no requiere backend
+            private_key, certificate, _ = pkcs12.load_key_and_certificates(
+                pfx_data, password
+            )
+        except Exception as e:
+            logger.error(f"Error cargando certificado: {e}")
+            raise
+
+        logger.info(f"Certificado cargado: {agent_config.cod_agente}")
+        return LoadedKey(
+            cod_agente=agent_config.cod_agente,
+            cert_path=agent_config.cert_path,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            password_hash=_password_hash(agent_config),
+            private_key=private_key,
+            certificate=certificate,
+            fingerprint=certificate.fingerprint(hashes.SHA256()).hex(),
+        )
+
+
+def _password_hash(agent_config: AgentConfig) -> str:
+    return hashlib.sha256((agent_config.cert_password or "").encode("utf-8")).hexdigest()
+
+
+@lru_cache
+def get_key_registry() -> SigningKeyRegistry:
+    return SigningKeyRegistry()
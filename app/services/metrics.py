@@ -0,0 +1,143 @@
+"""
+Métricas Prometheus expuestas en /metrics.
+
+- din_stage_duration_seconds{stage}: validate, render, parse, xsd, sign,
+  ws_security y serialize del pipeline de generación; stream es la
+  escritura completa del sobre firmado en streaming (envelope_writer).
+- aduana_request_duration_seconds{endpoint,status}: cada intento HTTP hacia
+  Aduana; status es el código HTTP o la clase de error de transporte.
+- aduana_faults_total{endpoint,faultcode}: SOAP Faults recibidos.
+- aduana_rate_limit_wait_seconds{agent,endpoint}: espera por un token del
+  límite de tasa saliente antes de cada intento (0 si había tokens).
+- din_payload_bytes{endpoint,direction}: tamaño de sobres enviados y
+  respuestas recibidas.
+- din_items: cantidad de ítems por DIN construido.
+- aduana_http_connections{agent,state}: uso de los pools HTTP por agente.
+
+Con CPU_EXECUTOR=process las etapas se miden en los workers: para
+agregarlas hay que definir PROMETHEUS_MULTIPROC_DIR (modo multiproceso de
+prometheus_client) antes de arrancar la aplicación.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Litestar agrega "; charset=utf-8" a los tipos text/*
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+STAGE_VALIDATE = "validate"
+STAGE_RENDER = "render"
+STAGE_PARSE = "parse"
+STAGE_XSD = "xsd"
+STAGE_SIGN = "sign"
+STAGE_WS_SECURITY = "ws_security"
+STAGE_SERIALIZE = "serialize"
+STAGE_STREAM = "stream"
+
+STAGE_SECONDS = Histogram(
+    "din_stage_duration_seconds",
+    "Duración de cada etapa del pipeline de generación de DIN",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+UPSTREAM_SECONDS = Histogram(
+    "aduana_request_duration_seconds",
+    "Duración de cada intento HTTP hacia Aduana",
+    ["endpoint", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "aduana_rate_limit_wait_seconds",
+    "Espera por un token del límite de tasa saliente hacia Aduana",
+    ["agent", "endpoint"],
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+ADUANA_FAULTS = Counter(
+    "aduana_faults_total",
+    "SOAP Faults recibidos desde Aduana",
+    ["endpoint", "faultcode"],
+)
+PAYLOAD_BYTES = Histogram(
+    "din_payload_bytes",
+    "Tamaño de los mensajes SOAP intercambiados con Aduana",
+    ["endpoint", "direction"],
+    buckets=(1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000),
+)
+DIN_ITEMS = Histogram(
+    "din_items",
+    "Cantidad de ítems por DIN construido",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 999),
+)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+class HttpPoolCollector:
+    """Lee el estado de los pools HTTP al momento del scrape."""
+
+    def __init__(self, source: Callable[[], dict[str, dict]]):
+        self.source = source
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "aduana_http_connections",
+            "Conexiones HTTP hacia Aduana por agente y estado",
+            labels=["agent", "state"],
+        )
+        pending = GaugeMetricFamily(
+            "aduana_http_pending_requests",
+            "Peticiones esperando una conexión libre del pool",
+            labels=["agent"],
+        )
+        limit = GaugeMetricFamily(
+            "aduana_http_max_connections",
+            "Máximo de conexiones del pool HTTP",
+            labels=["agent"],
+        )
+        for agent, stats in self.source().items():
+            connections.add_metric([agent, "active"], stats["active"])
+            connections.add_metric([agent, "idle"], stats["idle"])
+            pending.add_metric([agent], stats["pending"])
+            limit.add_metric([agent], stats["max_connections"])
+        yield connections
+        yield pending
+        yield limit
+
+
+_pool_collector: HttpPoolCollector = None
+
+
+def register_pool_collector(source: Callable[[], dict[str, dict]]):
+    global _pool_collector
+    if _pool_collector is None:
+        _pool_collector = HttpPoolCollector(source)
+        REGISTRY.register(_pool_collector)
+
+
+def render_metrics() -> bytes:
+    """Serializa las métricas en formato de exposición de Prometheus."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        if _pool_collector is not None:
+            registry.register(_pool_collector)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,173 @@
+"""
+Pipeline CPU de generación de DIN (validación, construcción y firma).
+
+Las funciones de este módulo son de nivel de módulo y reciben/retornan
+objetos serializables para poder ejecutarse tanto en un pool de hilos como
+en un pool de procesos (ver app.services.executor).
+"""
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+from typing import Optional
+
+from lxml import etree
+
+from app.config import get_settings
+from app.models.din import DINModel, SchemaErrorDetail
+from app.services.xml_builder import XMLBuilderService
+from app.services.signer import SignerService, get_signer
+from app.services.agents import get_agent_registry
+from app.services.key_registry import get_key_registry
+from app.services.envelope_writer import write_signed_envelope
+from app.services.metrics import DIN_ITEMS, STAGE_SERIALIZE, STAGE_STREAM, STAGE_XSD, observe_stage
+from app.services.ws_security import apply_ws_security
+from app.services.xsd_validator import get_schema_validator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BuildResult:
+    valid: bool
+    message: str
+    xml: Optional[str] = None
+    xml_bytes: Optional[bytes] = None
+    schema_errors: Optional[list[SchemaErrorDetail]] = None
+
+    def content(self) -> bytes:
+        """Documento serializado, sin pasar por str si ya está en bytes."""
+        return self.xml_bytes if self.xml_bytes is not None else self.xml.encode("utf-8")
+
+
+@lru_cache
+def get_builder(engine: Optional[str] = None) -> XMLBuilderService:
+    """Builder compartido por motor; la plantilla se compila una vez por proceso."""
+    return XMLBuilderService(engine=engine)
+
+
+def warm_up():
+    """Precarga plantilla, esquema XSD y llaves de los agentes atendidos (inicializador de workers)."""
+    settings = get_settings()
+    get_builder()
+    if settings.xsd_validation:
+        try:
+            get_schema_validator().schema
+        except Exception as e:
+            logger.error(f"No se pudo compilar el esquema XSD: {e}")
+    for agent in settings.get_served_agents():
+        try:
+            get_key_registry().get(settings.get_agent_config(agent))
+        except Exception as e:
+            # Sin certificado aún se puede generar XML sin firma
+            logger.warning(f"No se pudo precargar certificado de {agent}: {e}")
+
+
+class DINPipeline:
+    """
+    Lleva un único árbol lxml desde el builder, pasando por la firma y el
+    header WS-Security, hasta los bytes del cuerpo HTTP.
+
+    El documento se parsea a lo más una vez (motor jinja) y se serializa
+    exactamente una vez en to_bytes().
+    """
+
+    def __init__(self, din: DINModel, engine: Optional[str] = None):
+        self.din = din
+        self.builder = get_builder(engine)
+        self.tree: Optional[etree._Element] = None
+
+    def build(self) -> "DINPipeline":
+        # Con el motor jinja el parseo del render valida la estructura
+        self.tree = self.builder.build_xml_for_signing(self.din)
+        return self
+
+    def validate_schema(self) -> list[SchemaErrorDetail]:
+        with observe_stage(STAGE_XSD):
+            return get_schema_validator().validate(self.tree)
+
+    def sign(self, signer: SignerService = None) -> "DINPipeline":
+        (signer or get_signer()).sign_xml(self.tree)
+        return self
+
+    def add_ws_security(self, agent: Optional[str] = None) -> "DINPipeline":
+        context = get_agent_registry().get(agent)
+        apply_ws_security(self.tree, context.config.ws_user, context.ws_password)
+        return self
+
+    def to_bytes(self) -> bytes:
+        with observe_stage(STAGE_SERIALIZE):
+            return etree.tostring(self.tree, encoding="UTF-8", xml_declaration=True)
+
+
+def _build(din: DINModel, engine: Optional[str]) -> tuple[Optional[DINPipeline], Optional[BuildResult]]:
+    DIN_ITEMS.observe(len(din.items))
+    try:
+        pipeline = DINPipeline(din, engine).build()
+    except etree.XMLSyntaxError as e:
+        logger.error(f"Error de sintaxis XML: {e}")
+        return None, BuildResult(valid=False, message=str(e))
+
+    if get_settings().xsd_validation:
+        schema_errors = pipeline.validate_schema()
+        if schema_errors:
+            logger.error(f"XML no cumple esquema EnvioDin: {schema_errors[0].message}")
+            return None, BuildResult(
+                valid=False,
+                message=f"XML no cumple esquema EnvioDin ({len(schema_errors)} errores)",
+                schema_errors=schema_errors,
+            )
+    return pipeline, None
+
+
+def build_unsigned(din: DINModel, engine: Optional[str] = None) -> BuildResult:
+    pipeline, error = _build(din, engine)
+    if error:
+        return error
+    return BuildResult(valid=True, message="XML válido", xml=pipeline.to_bytes().decode("utf-8"))
+
+
+def build_signed(din: DINModel, engine: Optional[str] = None, agent: Optional[str] = None) -> BuildResult:
+    pipeline, error = _build(din, engine)
+    if error:
+        return error
+    pipeline.sign(get_agent_registry().get(agent).signer)
+    return BuildResult(valid=True, message="XML válido", xml=pipeline.to_bytes().decode("utf-8"))
+
+
+def build_signed_envelope(din: DINModel, engine: Optional[str] = None, agent: Optional[str] = None) -> BuildResult:
+    """Firma y agrega WS-Security con las credenciales del agente; retorna el cuerpo HTTP listo para enviar."""
+    min_items = get_settings().envelope_stream_min_items
+    if min_items and len(din.items) >= min_items:
+        return build_signed_envelope_streaming(din, engine, agent)
+    pipeline, error = _build(din, engine)
+    if error:
+        return error
+    pipeline.sign(get_agent_registry().get(agent).signer).add_ws_security(agent)
+    return BuildResult(valid=True, message="XML válido", xml_bytes=pipeline.to_bytes())
+
+
+def build_signed_envelope_streaming(
+    din: DINModel, engine: Optional[str] = None, agent: Optional[str] = None
+) -> BuildResult:
+    """
+    Mismo resultado que build_signed_envelope sin construir el árbol
+    completo: el sobre se escribe y se firma en streaming (envelope_writer).
+    """
+    DIN_ITEMS.observe(len(din.items))
+    din = get_builder(engine).prepare(din)
+    context = get_agent_registry().get(agent)
+    validator = get_schema_validator() if get_settings().xsd_validation else None
+    output = BytesIO()
+    with observe_stage(STAGE_STREAM):
+        schema_errors = write_signed_envelope(
+            din, output, context.signer, context.config.ws_user, context.ws_password, validator
+        )
+    if schema_errors:
+        logger.error(f"XML no cumple esquema EnvioDin: {schema_errors[0].message}")
+        return BuildResult(
+            valid=False,
+            message=f"XML no cumple esquema EnvioDin ({len(schema_errors)} errores)",
+            schema_errors=schema_errors,
+        )
+    return BuildResult(valid=True, message="XML válido", xml_bytes=output.getvalue())
@@ -0,0 +1,147 @@
+"""
+Limitador de tasa saliente hacia Aduana (token bucket).
+
+Aduana limita por credencial: si un agente descarga un lote grande, los
+rechazos afectan a todo el tráfico de ese ws_user. Cada par (agente,
+endpoint) tiene su propio balde con tasa y ráfaga configurables.
+
+Una llamada sin tokens disponibles reserva el siguiente y espera su turno
+(orden FIFO), siempre que la espera no supere `max_wait`; si la supera,
+falla de inmediato con RateLimitExceeded sin consumir tokens. Cada intento
+HTTP paga su token, también los reintentos de call_with_retry; la espera se
+exporta en el histograma aduana_rate_limit_wait_seconds.
+
+Vive en el event loop y no requiere locks.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from app.config import get_settings
+from app.services.metrics import RATE_LIMIT_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_RECIBE = "RecibeDin"
+ENDPOINT_CONSULTA = "ConsultaDIN"
+
+
+class RateLimitExceeded(Exception):
+    """La espera por un token superaría el máximo permitido."""
+
+    def __init__(self, key: str, wait: float):
+        super().__init__(f"Límite de tasa para {key}: espera estimada {wait:.1f}s")
+        self.key = key
+        self.wait = wait
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float   # tokens por segundo
+    burst: int    # capacidad del balde
+
+
+class TokenBucket:
+    def __init__(self, key: str, limit: RateLimit):
+        self.key = key
+        self.rate = limit.rate
+        self.burst = limit.burst
+        # Puede quedar negativo: cada unidad bajo cero es una llamada esperando turno
+        self.tokens = float(limit.burst)
+        self.updated_at = time.monotonic()
+        self.acquired = 0
+        self.rejected = 0
+        self.delayed = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, max_wait: float) -> float:
+        """Reserva un token y devuelve los segundos a esperar por él."""
+        self._refill(time.monotonic())
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            self.rejected += 1
+            raise RateLimitExceeded(self.key, wait)
+        self.tokens -= 1
+        self.acquired += 1
+        if wait > 0:
+            self.delayed += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return wait
+
+    async def acquire(self, max_wait: float) -> float:
+        """Espera el token reservado; devuelve los segundos esperados."""
+        wait = self.reserve(max_wait)
+        if wait <= 0:
+            return 0.0
+        self.waiting += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Devolver el turno reservado a las llamadas siguientes
+            self.tokens = min(self.burst, self.tokens + 1)
+            raise
+        finally:
+            self.waiting -= 1
+        return wait
+
+    def stats(self) -> dict:
+        self._refill(time.monotonic())
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_total, 3),
+            "wait_seconds_max": round(self.wait_max, 3),
+        }
+
+
+class OutboundRateLimiter:
+    def __init__(self, limits: dict[str, RateLimit], max_wait: float, enabled: bool = True):
+        self.limits = limits
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+
+    def bucket(self, cod_agente: str, endpoint: str) -> TokenBucket:
+        bucket = self._buckets.get((cod_agente, endpoint))
+        if bucket is None:
+            bucket = TokenBucket(f"{cod_agente}/{endpoint}", self.limits[endpoint])
+            self._buckets[(cod_agente, endpoint)] = bucket
+        return bucket
+
+    async def acquire(self, cod_agente: str, endpoint: str):
+        """Espera un token para (agente, endpoint) o lanza RateLimitExceeded."""
+        if not self.enabled:
+            return
+        try:
+            wait = await self.bucket(cod_agente, endpoint).acquire(self.max_wait)
+        except RateLimitExceeded as e:
+            logger.warning(str(e))
+            raise
+        RATE_LIMIT_WAIT_SECONDS.labels(cod_agente, endpoint).observe(wait)
+
+    def stats(self) -> dict:
+        return {bucket.key: bucket.stats() for bucket in self._buckets.values()}
+
+
+@lru_cache
+def get_rate_limiter() -> OutboundRateLimiter:
+    settings = get_settings()
+    limits = {
+        ENDPOINT_RECIBE: RateLimit(settings.recibe_din_rate, settings.recibe_din_burst),
+        ENDPOINT_CONSULTA: RateLimit(settings.consulta_din_rate, settings.consulta_din_burst),
+    }
+    return OutboundRateLimiter(limits, settings.rate_limit_max_wait, settings.rate_limit_enabled)
@@ -0,0 +1,231 @@
+"""
+Reintentos con backoff exponencial con jitter y circuit breaker por URL
+para las llamadas SOAP a Aduana.
+
+- ConsultaDIN es idempotente: se reintenta ante cualquier error de
+  transporte y ante 502/503/504.
+- RecibeDin no es idempotente: sólo se reintenta si la falla ocurrió antes
+  de enviar la petición (conexión rechazada, timeout de conexión o de pool).
+
+El breaker cuenta como falla los errores de transporte y los 502/503/504.
+Un 500 puede ser un SOAP Fault de negocio y no abre el circuito, y un
+RateLimitExceeded (límite local, la llamada no salió) tampoco.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.config import get_settings
+from app.services.rate_limiter import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {502, 503, 504}
+
+# Errores en que la petición no alcanzó a enviarse
+CONNECT_PHASE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El circuito hacia la URL está abierto; la llamada no se intentó."""
+
+    def __init__(self, url: str, retry_after: float):
+        super().__init__(f"Circuito abierto para {url}, reintentar en {retry_after:.0f}s")
+        self.url = url
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    # Reintentar también errores de transporte posteriores al envío y 502/503/504
+    idempotent: bool
+
+    def should_retry_error(self, error: Exception) -> bool:
+        if isinstance(error, CONNECT_PHASE_ERRORS):
+            return True
+        return self.idempotent and isinstance(error, httpx.TransportError)
+
+    def should_retry_status(self, status_code: int) -> bool:
+        return self.idempotent and status_code in RETRYABLE_STATUS
+
+    def delay(self, attempt: int) -> float:
+        """Full jitter: uniforme entre 0 y base * 2^intento (acotado)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    def __init__(self, url: str, failure_threshold: int, reset_timeout: float):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Lanza CircuitOpenError si la llamada no debe intentarse."""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == STATE_OPEN:
+                retry_after = self.opened_at + self.reset_timeout - now
+                if retry_after > 0:
+                    raise CircuitOpenError(self.url, retry_after)
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            # Half-open: sólo una llamada de prueba a la vez
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.url, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def release_probe(self):
+        """Libera la llamada de prueba sin resultado (p.ej. cancelada)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logger.info(f"Circuito cerrado para {self.url}")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    self.times_opened += 1
+                    logger.warning(
+                        f"Circuito abierto para {self.url} tras {self.consecutive_failures} fallas consecutivas"
+                    )
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+            }
+            if self.state == STATE_OPEN:
+                stats["retry_after"] = round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 1)
+            return stats
+
+
+class BreakerRegistry:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(url)
+            if breaker is None:
+                breaker = self._breakers[url] = CircuitBreaker(url, self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def stats(self) -> dict:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.url: breaker.stats() for breaker in breakers}
+
+
+@lru_cache
+def get_breakers() -> BreakerRegistry:
+    settings = get_settings()
+    return BreakerRegistry(settings.breaker_failure_threshold, settings.breaker_reset_timeout)
+
+
+def consulta_policy() -> RetryPolicy:
+    settings = get_settings()
+    return RetryPolicy(
+        max_attempts=settings.consulta_din_max_attempts,
+        base_delay=settings.retry_base_delay,
+        max_delay=settings.retry_max_delay,
+        idempotent=True,
+    )
+
+
+def recibe_policy() -> RetryPolicy:
+    settings = get_settings()
+    return RetryPolicy(
+        max_attempts=settings.recibe_din_max_attempts,
+        base_delay=settings.retry_base_delay,
+        max_delay=settings.retry_max_delay,
+        idempotent=False,
+    )
+
+
+async def call_with_retry(
+    url: str,
+    send: Callable[[], Awaitable[httpx.Response]],
+    policy: RetryPolicy,
+) -> httpx.Response:
+    """
+    Ejecuta `send` respetando el circuit breaker de `url` y la política de
+    reintentos. Propaga el último error de transporte o CircuitOpenError.
+    """
+    breaker = get_breakers().get(url)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            attempt += 1
+            if attempt >= policy.max_attempts or not policy.should_retry_error(e):
+                raise
+            delay = policy.delay(attempt)
+            logger.warning(f"{type(e).__name__} hacia {url}, reintento {attempt} en {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        except RateLimitExceeded:
+            # Límite local: la llamada no llegó a Aduana
+            breaker.release_probe()
+            raise
+        except Exception:
+            # Cualquier otro error también libera la prueba half-open
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelada: no dice nada de Aduana, sólo liberar la prueba
+            breaker.release_probe()
+            raise
+
+        if response.status_code in RETRYABLE_STATUS:
+            breaker.record_failure()
+            attempt += 1
+            if attempt < policy.max_attempts and policy.should_retry_status(response.status_code):
+                delay = policy.delay(attempt)
+                logger.warning(f"HTTP {response.status_code} desde {url}, reintento {attempt} en {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            return response
+
+        breaker.record_success()
+        return response
@@ -0,0 +1,207 @@
+"""
+Caché direccionado por contenido de XML firmado.
+
+La clave es un SHA-256 sobre el DINModel normalizado (su JSON canónico),
+el motor de construcción, el código de agente y la huella del certificado.
+Como la firma RSA-SHA1 es determinista, el mismo DIN firmado con el mismo
+certificado produce siempre el mismo XML, y un reintento o un /send
+posterior a /generate-signed-xml puede reutilizarlo.
+
+El caché vive en el proceso del event loop (antes de despachar al ejecutor
+CPU), por lo que se comparte aunque el ejecutor sea un pool de procesos. La
+clave (huella del certificado y hash del DIN) se calcula en un hilo con
+asyncio.to_thread: no en el ejecutor CPU, cuyos workers pueden ser otros
+procesos con su propio registro de llaves.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Union
+
+from app.config import get_settings, AgentConfig
+from app.models.din import DINModel
+from app.services.agents import AgentContext, get_agent_registry
+from app.services.executor import get_cpu_executor
+from app.services.key_registry import get_key_registry
+from app.services.pipeline import BuildResult, build_signed, build_signed_envelope
+
+logger = logging.getLogger(__name__)
+
+# Tipos de artefacto cacheados
+KIND_SIGNED = "signed"
+KIND_ENVELOPE = "envelope"
+
+
+@dataclass
+class _Entry:
+    value: Union[str, bytes]
+    size: int
+    cod_agente: str
+    expires_at: float
+
+
+class SignedXMLCache:
+    """
+    LRU acotado en bytes con expiración por TTL.
+
+    Si cambia la huella del certificado de un agente, todas sus entradas se
+    descartan en la siguiente consulta.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._fingerprints: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def make_key(
+        self,
+        kind: str,
+        din: DINModel,
+        engine: str,
+        agent_config: AgentConfig,
+        fingerprint: str,
+        extra: str = "",
+    ) -> str:
+        digest = hashlib.sha256()
+        for part in (kind, engine, agent_config.cod_agente, fingerprint, extra):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(din.model_dump_json().encode("utf-8"))
+        return digest.hexdigest()
+
+    def check_fingerprint(self, cod_agente: str, fingerprint: str):
+        """Descarta las entradas del agente si su certificado cambió."""
+        with self._lock:
+            previous = self._fingerprints.get(cod_agente)
+            if previous == fingerprint:
+                return
+            self._fingerprints[cod_agente] = fingerprint
+            if previous is None:
+                return
+            stale = [key for key, entry in self._entries.items() if entry.cod_agente == cod_agente]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+        logger.info(f"Certificado de {cod_agente} cambió: {len(stale)} XML firmados descartados del caché")
+
+    def get(self, key: str) -> Optional[Union[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: str, value: Union[str, bytes], cod_agente: str):
+        # Tamaño en bytes UTF-8: nombres y glosas traen ñ y tildes
+        size = len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, cod_agente, time.monotonic() + self.ttl)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+
+
+@lru_cache
+def get_signed_cache() -> SignedXMLCache:
+    settings = get_settings()
+    return SignedXMLCache(settings.signed_cache_max_bytes, settings.signed_cache_ttl)
+
+
+async def build_signed_cached(
+    din: DINModel, engine: Optional[str] = None, agent: Optional[str] = None
+) -> BuildResult:
+    """build_signed en el ejecutor CPU, pasando antes por el caché."""
+    return await _run_cached(KIND_SIGNED, build_signed, din, engine, agent)
+
+
+async def build_signed_envelope_cached(
+    din: DINModel, engine: Optional[str] = None, agent: Optional[str] = None
+) -> BuildResult:
+    """build_signed_envelope en el ejecutor CPU, pasando antes por el caché."""
+    return await _run_cached(KIND_ENVELOPE, build_signed_envelope, din, engine, agent)
+
+
+def _cache_key(cache: SignedXMLCache, kind: str, din: DINModel, engine: str, context: AgentContext) -> str:
+    agent_config = context.config
+    fingerprint = get_key_registry().get(agent_config).fingerprint
+    cache.check_fingerprint(agent_config.cod_agente, fingerprint)
+
+    extra = ""
+    if kind == KIND_ENVELOPE:
+        # El sobre incluye las credenciales WS-Security: un cambio de clave no debe reutilizarlo
+        extra = hashlib.sha256(f"{agent_config.ws_user}\0{context.ws_password}".encode("utf-8")).hexdigest()
+    return cache.make_key(kind, din, engine, agent_config, fingerprint, extra)
+
+
+async def _run_cached(kind: str, func, din: DINModel, engine: Optional[str], agent: Optional[str]) -> BuildResult:
+    settings = get_settings()
+    # Resolver aquí: un agente no atendido falla antes de despachar al ejecutor
+    context = get_agent_registry().get(agent)
+    if not settings.signed_cache_enabled:
+        return await get_cpu_executor().run(func, din, engine, context.code)
+
+    agent_config = context.config
+    cache = get_signed_cache()
+    # Lectura del PFX (stat, y decodificación si cambió) y hash del DIN fuera del event loop
+    key = await asyncio.to_thread(_cache_key, cache, kind, din, engine or settings.xml_builder_engine, context)
+
+    cached = cache.get(key)
+    if cached is not None:
+        logger.debug(f"XML firmado servido desde caché ({kind})")
+        if kind == KIND_ENVELOPE:
+            return BuildResult(valid=True, message="XML válido", xml_bytes=cached)
+        return BuildResult(valid=True, message="XML válido", xml=cached)
+
+    result = await get_cpu_executor().run(func, din, engine, context.code)
+    if result.valid:
+        cache.put(key, result.xml_bytes if kind == KIND_ENVELOPE else result.xml, agent_config.cod_agente)
+    return result
@@ -1,12 +1,13 @@
 import logging
-from pathlib import Path
+from functools import lru_cache
 from lxml import etree
 from signxml import XMLSigner, methods
-from cryptography.hazmat.primitives.serialization import pkcs12
 from cryptography.x509 import Certificate
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 
 from app.config import get_settings, AgentConfig
+from app.services.key_registry import LoadedKey, get_key_registry
+from app.services.metrics import STAGE_SIGN, observe_stage
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,16 @@ XMLDSIG_NS = "http://www.w3.org/2000/09/xmldsig#"
 SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
 
 
+class SHA1XMLSigner(XMLSigner):
+    """
+    Aduana exige RSA-SHA1 con digest SHA1. signxml 4 rechaza SHA1 salvo
+    opt-in explícito, que según su documentación es esta subclase.
+    """
+
+    def check_deprecated_methods(self):
+        pass
+
+
 class SignerService:
     def __init__(self, agent_config: AgentConfig = None):
         self.settings = get_settings()
@@ -22,27 +33,28 @@ class SignerService:
         self._certificate: Certificate = None
         self._load_certificate()
 
-    def _load_certificate(self):
-        cert_path = Path(self.agent_config.cert_path)
-        if not cert_path.exists():
-            raise FileNotFoundError(f"Certificado no encontrado: {cert_path}")
+    def _load_certificate(self) -> LoadedKey:
+        # La decodificación del PFX se comparte entre instancias vía el registro.
+        # Los atributos sólo alimentan get_certificate_info: la instancia se
+        # comparte entre hilos y para firmar se usa el LoadedKey retornado.
+        loaded = get_key_registry().get(self.agent_config)
+        self._private_key = loaded.private_key
+        self._certificate = loaded.certificate
+        return loaded
 
-        with open(cert_path, "rb") as f:
-            pfx_data = f.read()
+    def signing_material(self) -> tuple[RSAPrivateKey, Certificate]:
+        """Llave y certificado vigentes, para firmar fuera de signxml (ver envelope_writer)."""
+        loaded = self._load_certificate()
+        return loaded.private_key, loaded.certificate
 
-        password = self.agent_config.cert_password.encode("utf-8") if self.agent_config.cert_password else None
+    def sign_xml(self, xml_tree: etree._Element) -> etree._Element:
+        with observe_stage(STAGE_SIGN):
+            return self._sign_xml(xml_tree)
 
-        try:
-            # cryptography >= 43 no requiere backend
-            self._private_key, self._certificate, _ = pkcs12.load_key_and_certificates(
-                pfx_data, password
-            )
-            logger.info(f"Certificado cargado: {self.agent_config.cod_agente}")
-        except Exception as e:
-            logger.error(f"Error cargando certificado: {e}")
-            raise
+    def _sign_xml(self, xml_tree: etree._Element) -> etree._Element:
+        # Instancia de larga vida: recoger un certificado rotado en disco
+        loaded = self._load_certificate()
 
-    def sign_xml(self, xml_tree: etree._Element) -> etree._Element:
         body = xml_tree.find(f".//{{{SOAP_NS}}}Body")
         if body is None:
             raise ValueError("No se encontró el elemento Body en el SOAP Envelope")
@@ -57,18 +69,19 @@ class SignerService:
         if din_element is None:
             raise ValueError("No se encontró el elemento DIN dentro del Body")
 
-        signer = XMLSigner(
+        signer = SHA1XMLSigner(
             method=methods.enveloped,
             signature_algorithm="rsa-sha1",
             digest_algorithm="sha1",
             c14n_algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315",
         )
 
+        # Sin reference_uri signxml firma el DIN completo con Reference URI="";
+        # reference_uri="" lo busca como "#" y falla
         signed_din = signer.sign(
             din_element,
-            key=self._private_key,
-            cert=self._certificate,
-            reference_uri="",
+            key=loaded.private_key,
+            cert=[loaded.certificate],
         )
 
         body.remove(din_element)
@@ -99,3 +112,9 @@ class SignerService:
             "not_valid_before": self._certificate.not_valid_before_utc.isoformat(),
             "not_valid_after": self._certificate.not_valid_after_utc.isoformat(),
         }
+
+
+@lru_cache
+def get_signer() -> SignerService:
+    """Signer del agente activo, compartido por la aplicación."""
+    return SignerService()
@@ -1,80 +1,112 @@
 import logging
+import time
+from functools import lru_cache
+from typing import Optional
+
 import httpx
 from lxml import etree
 from base64 import b64encode
 
-from app.config import get_settings
+from app.config import get_settings, AgentConfig
+from app.services.http_client import HttpClientPool, get_http_pool
+from app.services.metrics import ADUANA_FAULTS, PAYLOAD_BYTES, UPSTREAM_SECONDS
+from app.services.rate_limiter import ENDPOINT_CONSULTA, ENDPOINT_RECIBE, RateLimitExceeded, get_rate_limiter
+from app.services.resilience import CircuitOpenError, call_with_retry, consulta_policy, recibe_policy
+from app.services.soap_response import SoapFault, parse_soap_response
+from app.services.ws_security import apply_ws_security
 
 logger = logging.getLogger(__name__)
 
-SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
-WSSE_NS = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"
-
 
 class SoapClientService:
-    def __init__(self):
+    def __init__(
+        self,
+        agent_config: AgentConfig = None,
+        ws_password: str = None,
+        http: HttpClientPool = None,
+    ):
         self.settings = get_settings()
-        self.timeout = httpx.Timeout(30.0, connect=10.0)
+        self.agent_config = agent_config or self.settings.get_active_agent_config()
+        self.ws_password = ws_password if ws_password is not None else self.settings.get_ws_password()
+        self.http = http or get_http_pool()
 
     def _add_ws_security_header(self, xml_str: str) -> str:
         """Agrega header WS-Security con credenciales de usuario."""
-        agent_config = self.settings.get_active_agent_config()
-        ws_user = agent_config.ws_user
-        ws_password = self.settings.get_ws_password()
-
-        if not ws_user or not ws_password:
-            logger.warning("Credenciales WS no configuradas, enviando sin autenticación")
+        tree = etree.fromstring(xml_str.encode("utf-8"))
+        if not self.apply_ws_security(tree):
             return xml_str
+        return etree.tostring(tree, encoding="UTF-8", xml_declaration=True).decode("utf-8")
 
-        tree = etree.fromstring(xml_str.encode("utf-8"))
-        header = tree.find(f"{{{SOAP_NS}}}Header")
-        
-        if header is None:
-            envelope = tree
-            body = tree.find(f"{{{SOAP_NS}}}Body")
-            header = etree.Element(f"{{{SOAP_NS}}}Header")
-            envelope.insert(0, header)
-
-        # Crear elemento Security
-        security = etree.SubElement(header, f"{{{WSSE_NS}}}Security")
-        security.set(f"{{{SOAP_NS}}}mustUnderstand", "1")
-        
-        # UsernameToken
-        username_token = etree.SubElement(security, f"{{{WSSE_NS}}}UsernameToken")
-        username_elem = etree.SubElement(username_token, f"{{{WSSE_NS}}}Username")
-        username_elem.text = ws_user
-        password_elem = etree.SubElement(username_token, f"{{{WSSE_NS}}}Password")
-        password_elem.set("Type", "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-username-token-profile-1.0#PasswordText")
-        password_elem.text = ws_password
-
-        return etree.tostring(tree, encoding="unicode", xml_declaration=True)
+    def apply_ws_security(self, tree: etree._Element) -> bool:
+        """Agrega el header WS-Security en el árbol, sin re-serializar."""
+        return apply_ws_security(tree, self.agent_config.ws_user, self.ws_password)
 
-    async def send_din(self, signed_xml: str) -> dict:
-        url = self.settings.aduana_recibe_din_url
+    async def _acquire_rate(self, endpoint: str):
+        """Espera turno en el límite de tasa del agente para el endpoint."""
+        await get_rate_limiter().acquire(self.agent_config.cod_agente, endpoint)
+
+    async def _post(self, endpoint: str, url: str, body: bytes, timeout: httpx.Timeout) -> httpx.Response:
+        """Un intento HTTP hacia Aduana, medido por endpoint y resultado."""
         headers = {
             "Content-Type": "text/xml; charset=utf-8",
             "SOAPAction": '""',
         }
+        PAYLOAD_BYTES.labels(endpoint, "request").observe(len(body))
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.http.post(url, content=body, headers=headers, timeout=timeout)
+            status = str(response.status_code)
+            PAYLOAD_BYTES.labels(endpoint, "response").observe(len(response.content))
+            return response
+        except httpx.TransportError as e:
+            status = type(e).__name__
+            raise
+        finally:
+            UPSTREAM_SECONDS.labels(endpoint, status).observe(time.perf_counter() - start)
 
+    async def send_din(self, signed_xml: str) -> dict:
         # Agregar autenticación WS-Security
         xml_with_auth = self._add_ws_security_header(signed_xml)
+        return await self.send_envelope(xml_with_auth.encode("utf-8"))
+
+    async def send_envelope(self, body: bytes) -> dict:
+        """Envía un SOAP Envelope ya firmado y autenticado, serializado a bytes."""
+        url = self.settings.aduana_recibe_din_url
 
         logger.info(f"Enviando DIN a: {url}")
-        logger.debug(f"XML a enviar (primeros 500 chars): {xml_with_auth[:500]}")
+        logger.debug(f"XML a enviar (primeros 500 bytes): {body[:500].decode('utf-8', 'replace')}")
+
+        async def send() -> httpx.Response:
+            # Cada intento, reintentos incluidos, paga su token
+            await self._acquire_rate(ENDPOINT_RECIBE)
+            return await self._post(ENDPOINT_RECIBE, url, body, self.http.recibe_din_timeout)
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    url,
-                    content=xml_with_auth.encode("utf-8"),
-                    headers=headers,
-                )
+            # RecibeDin no es idempotente: sólo se reintenta si no llegó a enviarse
+            response = await call_with_retry(url, send, recibe_policy())
 
             logger.info(f"Respuesta HTTP Status: {response.status_code}")
-            logger.debug(f"Respuesta completa: {response.text}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Respuesta completa: {response.text}")
 
             return self._parse_response(response)
 
+        except CircuitOpenError as e:
+            logger.warning(str(e))
+            return {
+                "success": False,
+                "error": "CIRCUIT_OPEN",
+                "message": f"Servicio de Aduana no disponible temporalmente: {str(e)}",
+                "raw_response": None,
+            }
+        except RateLimitExceeded as e:
+            return {
+                "success": False,
+                "error": "RATE_LIMITED",
+                "message": f"Límite de envíos hacia Aduana alcanzado: {str(e)}",
+                "raw_response": None,
+            }
         except httpx.TimeoutException as e:
             logger.error(f"Timeout en envío a Aduana: {e}")
             return {
@@ -102,10 +134,6 @@ class SoapClientService:
 
     async def consulta_din(self, ticket_id: str) -> dict:
         url = self.settings.aduana_consulta_din_url
-        headers = {
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": '""',
-        }
 
         consulta_xml = self._build_consulta_xml(ticket_id)
         # Agregar autenticación
@@ -113,18 +141,32 @@ class SoapClientService:
 
         logger.info(f"Consultando DIN ticket: {ticket_id}")
 
+        content = consulta_xml_auth.encode("utf-8")
+
+        async def send() -> httpx.Response:
+            await self._acquire_rate(ENDPOINT_CONSULTA)
+            return await self._post(ENDPOINT_CONSULTA, url, content, self.http.consulta_din_timeout)
+
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    url,
-                    content=consulta_xml_auth.encode("utf-8"),
-                    headers=headers,
-                )
+            response = await call_with_retry(url, send, consulta_policy())
 
             logger.info(f"Respuesta consulta HTTP Status: {response.status_code}")
 
             return self._parse_consulta_response(response)
 
+        except CircuitOpenError as e:
+            logger.warning(str(e))
+            return {
+                "success": False,
+                "error": "CIRCUIT_OPEN",
+                "message": f"Servicio de Aduana no disponible temporalmente: {str(e)}",
+            }
+        except RateLimitExceeded as e:
+            return {
+                "success": False,
+                "error": "RATE_LIMITED",
+                "message": f"Límite de consultas hacia Aduana alcanzado: {str(e)}",
+            }
         except httpx.TimeoutException as e:
             logger.error(f"Timeout en consulta: {e}")
             return {
@@ -140,132 +182,93 @@ class SoapClientService:
                 "message": str(e),
             }
 
-    def _parse_response(self, response: httpx.Response) -> dict:
-        raw_text = response.text
-
-        if response.status_code != 200:
-            return {
-                "success": False,
-                "error": f"HTTP_{response.status_code}",
-                "message": f"Error HTTP {response.status_code}",
-                "raw_response": raw_text,
-            }
+    def _raw(self, response: httpx.Response) -> Optional[str]:
+        """Respuesta cruda para el resultado; se omite con ADUANA_RAW_RESPONSE=false."""
+        return response.text if self.settings.aduana_raw_response else None
 
-        try:
-            tree = etree.fromstring(raw_text.encode("utf-8"))
-
-            fault = tree.find(f".//{{{SOAP_NS}}}Fault")
-            if fault is not None:
-                fault_string = fault.findtext("faultstring", "Error desconocido")
-                fault_code = fault.findtext("faultcode", "UNKNOWN")
-                return {
-                    "success": False,
-                    "error": fault_code,
-                    "message": fault_string,
-                    "raw_response": raw_text,
-                }
-
-            ticket = self._extract_ticket(tree)
-            estado = self._extract_estado(tree)
+    def _http_error(self, response: httpx.Response) -> dict:
+        return {
+            "success": False,
+            "error": f"HTTP_{response.status_code}",
+            "message": f"Error HTTP {response.status_code}",
+            "raw_response": self._raw(response),
+        }
 
-            return {
-                "success": True,
-                "ticket": ticket,
-                "estado": estado,
-                "message": "DIN enviado correctamente",
-                "raw_response": raw_text,
-            }
+    def _fault(self, endpoint: str, fault: SoapFault, response: httpx.Response) -> dict:
+        ADUANA_FAULTS.labels(endpoint, fault.code).inc()
+        return {
+            "success": False,
+            "error": fault.code,
+            "message": fault.message,
+            "raw_response": self._raw(response),
+        }
 
+    def _parse_response(self, response: httpx.Response) -> dict:
+        try:
+            parsed = parse_soap_response(response.content)
         except etree.XMLSyntaxError as e:
+            if response.status_code != 200:
+                return self._http_error(response)
             logger.error(f"Error parseando respuesta XML: {e}")
             return {
                 "success": False,
                 "error": "XML_PARSE_ERROR",
                 "message": f"Error parseando respuesta: {str(e)}",
-                "raw_response": raw_text,
+                "raw_response": self._raw(response),
             }
 
-    def _parse_consulta_response(self, response: httpx.Response) -> dict:
-        raw_text = response.text
-
+        # SOAP 1.1 responde los Fault con HTTP 500
+        if parsed.fault is not None:
+            return self._fault(ENDPOINT_RECIBE, parsed.fault, response)
         if response.status_code != 200:
+            return self._http_error(response)
+
+        if parsed.errors:
+            first = parsed.errors[0]
             return {
                 "success": False,
-                "error": f"HTTP_{response.status_code}",
-                "message": f"Error HTTP {response.status_code}",
-                "raw_response": raw_text,
+                "error": "ADUANA_ERRORES",
+                "message": f"Aduana informó {len(parsed.errors)} error(es): {first.codigo} {first.glosa}".strip(),
+                "errores": parsed.errors,
+                "raw_response": self._raw(response),
             }
 
-        try:
-            tree = etree.fromstring(raw_text.encode("utf-8"))
-            estado = self._extract_estado(tree)
-            detalles = self._extract_detalles_consulta(tree)
-
-            return {
-                "success": True,
-                "estado": estado,
-                "detalles": detalles,
-                "raw_response": raw_text,
-            }
+        return {
+            "success": True,
+            "ticket": parsed.ticket,
+            "estado": parsed.estado,
+            "message": "DIN enviado correctamente",
+            "raw_response": self._raw(response),
+            # Cuerpo original para /send/raw, sin decodificar
+            "raw_bytes": response.content,
+        }
 
-        except Exception as e:
+    def _parse_consulta_response(self, response: httpx.Response) -> dict:
+        try:
+            parsed = parse_soap_response(response.content)
+        except etree.XMLSyntaxError as e:
+            if response.status_code != 200:
+                return self._http_error(response)
             logger.error(f"Error parseando consulta: {e}")
             return {
                 "success": False,
                 "error": "PARSE_ERROR",
                 "message": str(e),
-                "raw_response": raw_text,
+                "raw_response": self._raw(response),
             }
 
-    def _extract_ticket(self, tree: etree._Element) -> str:
-        paths = [
-            ".//TICKET",
-            ".//ticket",
-            ".//{*}TICKET",
-            ".//{*}ticket",
-            ".//NUMEROENCRIPTADO",
-            ".//{*}NUMEROENCRIPTADO",
-        ]
-
-        for path in paths:
-            elem = tree.find(path)
-            if elem is not None and elem.text:
-                return elem.text.strip()
-
-        return None
-
-    def _extract_estado(self, tree: etree._Element) -> str:
-        paths = [
-            ".//ESTADO",
-            ".//estado",
-            ".//{*}ESTADO",
-            ".//{*}estado",
-        ]
-
-        for path in paths:
-            elem = tree.find(path)
-            if elem is not None and elem.text:
-                return elem.text.strip()
-
-        return None
-
-    def _extract_detalles_consulta(self, tree: etree._Element) -> dict:
-        detalles = {}
-
-        campos = [
-            "ESTADO",
-            "TIPOSELECCION",
-            "FECHACEPTACION",
-            "NUMEROENCRIPTADO",
-            "NUMEROACEPTACION",
-        ]
-
-        for campo in campos:
-            elem = tree.find(f".//{{{SOAP_NS}}}{campo}") or tree.find(f".//{campo}")
-            if elem is not None and elem.text:
-                detalles[campo.lower()] = elem.text.strip()
-
-        return detalles
+        if parsed.fault is not None:
+            return self._fault(ENDPOINT_CONSULTA, parsed.fault, response)
+        if response.status_code != 200:
+            return self._http_error(response)
+
+        return {
+            "success": True,
+            "estado": parsed.estado,
+            "detalles": parsed.detalles,
+            "errores": parsed.errors or None,
+            "raw_response": self._raw(response),
+        }
 
     def _build_consulta_xml(self, ticket_id: str) -> str:
         return f"""<?xml version="1.0" encoding="UTF-8"?>
@@ -277,3 +280,9 @@ class SoapClientService:
         </ConsultaDIN>
     </soapenv:Body>
 </soapenv:Envelope>"""
+
+
+@lru_cache
+def get_soap_client() -> SoapClientService:
+    """Cliente SOAP del agente activo (ACTIVE_AGENT)."""
+    return SoapClientService()
@@ -0,0 +1,123 @@
+"""
+Parser de respuestas SOAP de Aduana en una sola pasada.
+
+Recorre los bytes de la respuesta con iterparse y reconoce los elementos
+por nombre local, sin importar el namespace con que Aduana los califique:
+TICKET, ESTADO, NUMEROENCRIPTADO y los campos de detalle de la consulta,
+el SOAP Fault y los bloques RESPUESTA y ERRORES completos. Cada ERROR se
+libera al procesarlo, de modo que una respuesta con muchos errores no
+mantiene el árbol entero en memoria ni requiere recorrerlo varias veces.
+"""
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Optional
+
+from lxml import etree
+
+from app.models.din import ErrorModel, ErroresModel, RespuestaModel
+
+# Campos de detalle de servicioConsultaDIN (la clave del dict es el nombre en minúsculas)
+DETALLE_FIELDS = (
+    "ESTADO",
+    "TIPOSELECCION",
+    "FECHACEPTACION",
+    "NUMEROENCRIPTADO",
+    "NUMEROACEPTACION",
+)
+
+_RESPUESTA_FIELDS = ("FECHACEPTACION", "NUMEROENCRIPTADO", "ESTADO", "TIPOSELECCION")
+
+
+@dataclass
+class SoapFault:
+    code: str
+    message: str
+
+
+@dataclass
+class AduanaResponse:
+    ticket: Optional[str] = None
+    estado: Optional[str] = None
+    numeroencriptado: Optional[str] = None
+    fault: Optional[SoapFault] = None
+    respuesta: Optional[RespuestaModel] = None
+    errores: Optional[ErroresModel] = None
+    detalles: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def errors(self) -> list[ErrorModel]:
+        return self.errores.errores if self.errores is not None else []
+
+
+def _localname(elem: etree._Element) -> Optional[str]:
+    tag = elem.tag
+    if not isinstance(tag, str):  # comentarios e instrucciones de procesamiento
+        return None
+    return tag.rsplit("}", 1)[-1]
+
+
+def _text(elem: etree._Element) -> Optional[str]:
+    text = elem.text.strip() if elem.text else ""
+    return text or None
+
+
+def _children(elem: etree._Element) -> dict[str, str]:
+    values = {}
+    for child in elem:
+        name = _localname(child)
+        if name is not None and name not in values:
+            values[name] = _text(child) or ""
+    return values
+
+
+def parse_soap_response(content: bytes) -> AduanaResponse:
+    """
+    Extrae los datos de la respuesta en un recorrido; lanza
+    etree.XMLSyntaxError si el contenido no es XML bien formado.
+    """
+    result = AduanaResponse()
+    ticket = None
+    errors: list[ErrorModel] = []
+
+    for _, elem in etree.iterparse(BytesIO(content), events=("end",), resolve_entities=False, no_network=True):
+        name = _localname(elem)
+        if name is None:
+            continue
+
+        upper = name.upper()
+        if upper == "ERROR":
+            values = _children(elem)
+            errors.append(ErrorModel.model_construct(codigo=values.get("CODIGO", ""), glosa=values.get("GLOSA", "")))
+            elem.clear()
+        elif upper == "ERRORES":
+            result.errores = ErroresModel(fechaproceso=_children(elem).get("FECHAPROCESO", ""))
+            elem.clear()
+        elif name == "Fault":
+            values = _children(elem)
+            result.fault = SoapFault(
+                code=values.get("faultcode") or "UNKNOWN",
+                message=values.get("faultstring") or "Error desconocido",
+            )
+        elif upper == "RESPUESTA":
+            values = _children(elem)
+            result.respuesta = RespuestaModel(**{f.lower(): values.get(f, "") for f in _RESPUESTA_FIELDS})
+        else:
+            text = _text(elem)
+            if text is None:
+                continue
+            if upper == "TICKET" and ticket is None:
+                ticket = text
+            if upper == "ESTADO" and result.estado is None:
+                result.estado = text
+            if upper == "NUMEROENCRIPTADO" and result.numeroencriptado is None:
+                result.numeroencriptado = text
+            if name in DETALLE_FIELDS:
+                result.detalles.setdefault(name.lower(), text)
+
+    if errors:
+        if result.errores is None:
+            result.errores = ErroresModel()
+        result.errores.errores = errors
+    # Sin TICKET, Aduana identifica el envío con NUMEROENCRIPTADO
+    result.ticket = ticket or result.numeroencriptado
+    return result
@@ -0,0 +1,163 @@
+"""
+Caché de consultas de estado (ConsultaDIN) con coalescencia single-flight.
+
+Las consultas concurrentes por un mismo ticket comparten una única llamada
+SOAP. Los resultados se guardan poco tiempo mientras el DIN está en trámite
+y sin expiración cuando alcanza un estado terminal (aceptado/rechazado).
+
+El caché vive en el event loop y no requiere locks.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Origen de la respuesta, informado en X-Cache
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+CACHE_COALESCED = "COALESCED"
+
+# max-age informado para estados terminales (no cambian más)
+TERMINAL_MAX_AGE = 86400
+
+
+@dataclass
+class _CachedStatus:
+    result: dict
+    stored_at: float
+    expires_at: Optional[float]  # None = estado terminal, no expira
+
+
+@dataclass
+class StatusLookup:
+    result: dict
+    cache: str
+    age: int = 0
+    max_age: Optional[int] = None
+    terminal: bool = False
+
+    def headers(self) -> dict[str, str]:
+        """Headers HTTP para que los clientes ajusten su frecuencia de consulta."""
+        headers = {"X-Cache": self.cache}
+        if not self.result.get("success"):
+            headers["Cache-Control"] = "no-store"
+            return headers
+        headers["Age"] = str(self.age)
+        if self.terminal:
+            headers["Cache-Control"] = f"private, max-age={TERMINAL_MAX_AGE}, immutable"
+        else:
+            headers["Cache-Control"] = f"private, max-age={self.max_age or 0}"
+        return headers
+
+
+class StatusCache:
+    def __init__(self, ttl: float, terminal_states: set[str], max_entries: int):
+        self.ttl = ttl
+        self.terminal_states = {state.upper() for state in terminal_states}
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, _CachedStatus] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def is_terminal(self, result: dict) -> bool:
+        estado = result.get("estado")
+        return bool(estado) and estado.strip().upper() in self.terminal_states
+
+    async def lookup(
+        self, ticket_id: str, fetch: Callable[[str], Awaitable[dict]], scope: str = ""
+    ) -> StatusLookup:
+        """
+        `scope` separa las entradas por agente: un ticket sólo se comparte
+        entre consultas hechas con las mismas credenciales.
+        """
+        key = f"{scope}/{ticket_id}" if scope else ticket_id
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at is None or entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._lookup(entry, CACHE_HIT, now)
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            origin = CACHE_COALESCED
+        else:
+            self.misses += 1
+            origin = CACHE_MISS
+            # La llamada corre como tarea propia: si el cliente que la inició
+            # se desconecta, las demás peticiones esperando no se cancelan.
+            task = asyncio.create_task(fetch(ticket_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+
+        result = await asyncio.shield(task)
+        entry = self._entries.get(key)
+        if entry is not None and entry.result is result:
+            return self._lookup(entry, origin, time.monotonic())
+        return StatusLookup(result=result, cache=origin)
+
+    def _store(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        # Errores (timeout, fault, HTTP) no se guardan
+        if not result.get("success"):
+            return
+
+        now = time.monotonic()
+        terminal = self.is_terminal(result)
+        self._entries[key] = _CachedStatus(
+            result=result,
+            stored_at=now,
+            expires_at=None if terminal else now + self.ttl,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if terminal:
+            logger.info(f"Ticket {key} en estado terminal {result.get('estado')}, cacheado sin expiración")
+
+    def _lookup(self, entry: _CachedStatus, origin: str, now: float) -> StatusLookup:
+        terminal = entry.expires_at is None
+        return StatusLookup(
+            result=entry.result,
+            cache=origin,
+            age=int(now - entry.stored_at),
+            max_age=None if terminal else max(0, int(entry.expires_at - now)),
+            terminal=terminal,
+        )
+
+    def invalidate(self, ticket_id: str = None, scope: str = ""):
+        if ticket_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(f"{scope}/{ticket_id}" if scope else ticket_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+@lru_cache
+def get_status_cache() -> StatusCache:
+    settings = get_settings()
+    terminal_states = {state.strip() for state in settings.status_terminal_states.split(",") if state.strip()}
+    return StatusCache(settings.status_cache_ttl, terminal_states, settings.status_cache_max_entries)
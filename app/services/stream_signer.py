@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+
+from litestar.types import Receive, Send
+from pydantic import ValidationError
+
+from app.config import get_settings
+from app.models.din import DINRequest, DINStreamResult
+from app.services.agents import UnknownAgentError, get_agent_registry
+from app.services.ingest import validate_json_bytes
+from app.services.signed_cache import build_signed_cached
+
+logger = logging.getLogger(__name__)
+
+
+class NDJSONStreamSigner:
+    """
+    Firma DIN recibidos como NDJSON (un DINRequest por línea) y emite una
+    línea NDJSON por documento apenas termina, en orden de finalización.
+
+    El cuerpo se consume de a trozos y nunca hay más de `max_in_flight`
+    documentos en proceso: mientras se alcanza ese límite no se lee más
+    entrada, por lo que la memoria no depende del tamaño del lote.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[str] = None,
+        max_in_flight: int = None,
+        max_line_bytes: int = None,
+        agent: Optional[str] = None,
+    ):
+        settings = get_settings()
+        self.engine = engine
+        # Agente por defecto del stream; cada línea puede indicar el suyo en AGENTE
+        self.agent = agent
+        self.max_in_flight = max_in_flight or settings.stream_max_in_flight
+        self.max_line_bytes = max_line_bytes or settings.stream_max_line_bytes
+
+    async def respond(self, receive: Receive, send: Send) -> None:
+        """
+        Atiende la petición ASGI completa: lee el cuerpo desde `receive`
+        mientras envía resultados por `send`.
+
+        Se usa ASGI directo porque las respuestas Stream de Litestar escuchan
+        `receive` en paralelo para detectar desconexión y consumirían el
+        cuerpo que aún no se ha leído.
+        """
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson")],
+        })
+        async with aclosing(self.sign_stream(_receive_body(receive))) as outputs:
+            async for output in outputs:
+                await send({"type": "http.response.body", "body": output, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def sign_stream(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        pending: set[asyncio.Task] = set()
+        buffer = bytearray()
+        # Lo anterior a `searched` ya se revisó y no tiene saltos de línea
+        searched = 0
+        index = 0
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                start = 0
+                while True:
+                    newline = buffer.find(b"\n", max(start, searched))
+                    if newline < 0:
+                        break
+                    line = bytes(buffer[start:newline])
+                    start = newline + 1
+                    if not line.strip():
+                        continue
+                    while len(pending) >= self.max_in_flight:
+                        for output in await self._wait(pending):
+                            yield output
+                    pending.add(asyncio.create_task(self._sign_line(index, line)))
+                    index += 1
+                # Un solo corte por chunk para las líneas ya despachadas
+                del buffer[:start]
+                searched = len(buffer)
+
+                if len(buffer) > self.max_line_bytes:
+                    logger.error(f"Stream NDJSON: línea {index} excede {self.max_line_bytes} bytes")
+                    yield _dump(DINStreamResult(
+                        index=index,
+                        success=False,
+                        message=f"Línea excede el máximo de {self.max_line_bytes} bytes, stream abortado",
+                        error="LINE_TOO_LONG",
+                    ))
+                    return
+
+                # Emitir lo ya terminado sin bloquear la lectura
+                for output in _collect_done(pending):
+                    yield output
+
+            if buffer.strip():
+                pending.add(asyncio.create_task(self._sign_line(index, bytes(buffer))))
+                index += 1
+
+            while pending:
+                for output in await self._wait(pending):
+                    yield output
+
+            logger.info(f"Stream NDJSON finalizado: {index} DIN procesados")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _wait(self, pending: set[asyncio.Task]) -> list[bytes]:
+        await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        return _collect_done(pending)
+
+    async def _sign_line(self, index: int, line: bytes) -> bytes:
+        try:
+            request = validate_json_bytes(DINRequest, line)
+        except ValidationError as e:
+            return _dump(DINStreamResult(
+                index=index,
+                success=False,
+                message=f"JSON inválido: {e.error_count()} errores de validación",
+                error="INVALID_REQUEST",
+            ))
+
+        try:
+            agent = get_agent_registry().resolve(request.agente or self.agent)
+        except UnknownAgentError as e:
+            return _dump(DINStreamResult(
+                index=index,
+                success=False,
+                message=str(e),
+                error="UNKNOWN_AGENT",
+            ))
+
+        try:
+            result = await build_signed_cached(request.din, self.engine, agent)
+        except Exception as e:
+            logger.error(f"Stream NDJSON ítem {index}: error firmando XML: {e}")
+            return _dump(DINStreamResult(
+                index=index,
+                success=False,
+                message=f"Error interno: {str(e)}",
+                error=type(e).__name__,
+            ))
+
+        if not result.valid:
+            return _dump(DINStreamResult(
+                index=index,
+                success=False,
+                message=f"Error en estructura XML: {result.message}",
+                error="XSD_INVALID" if result.schema_errors else "XML_INVALID",
+                schema_errors=result.schema_errors,
+            ))
+
+        return _dump(DINStreamResult(
+            index=index,
+            success=True,
+            message="XML firmado generado correctamente",
+            xml=result.xml,
+        ))
+
+
+async def _receive_body(receive: Receive) -> AsyncIterator[bytes]:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            logger.warning("Stream NDJSON: cliente desconectado")
+            return
+        chunk = message.get("body", b"")
+        if chunk:
+            yield chunk
+        if not message.get("more_body", False):
+            return
+
+
+def _collect_done(pending: set[asyncio.Task]) -> list[bytes]:
+    done = [task for task in pending if task.done()]
+    for task in done:
+        pending.discard(task)
+    return [task.result() for task in done]
+
+
+def _dump(result: DINStreamResult) -> bytes:
+    return result.model_dump_json(exclude_none=True).encode("utf-8") + b"\n"
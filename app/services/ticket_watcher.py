@@ -0,0 +1,206 @@
+"""
+Seguimiento de tickets en servidor para /status/{ticket_id}/events (SSE).
+
+Cada ticket observado tiene una única tarea de fondo que consulta su estado
+con backoff adaptativo y reparte los cambios a todos los suscriptores. Con
+N clientes mirando M tickets se hacen M consultas, no N×M.
+
+Las consultas pasan por el caché de estado (ver status_cache), así que
+también se coalescen con las peticiones normales a /status.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+from app.config import get_settings
+from app.services.agents import get_agent_registry
+from app.services.status_cache import get_status_cache
+
+logger = logging.getLogger(__name__)
+
+EVENT_STATUS = "status"
+EVENT_ERROR = "error"
+EVENT_END = "end"
+
+# Cola por suscriptor; un cliente lento sólo pierde eventos intermedios
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class TooManyTicketsError(Exception):
+    """Se alcanzó el máximo de tickets observados simultáneamente."""
+
+
+@dataclass
+class TicketEvent:
+    id: int
+    event: str
+    data: dict
+
+
+@dataclass
+class _WatchedTicket:
+    ticket_id: str
+    agent: str
+    subscribers: set[asyncio.Queue] = field(default_factory=set)
+    task: Optional[asyncio.Task] = None
+    last_event: Optional[TicketEvent] = None
+    last_snapshot: Optional[dict] = None
+    next_id: int = 1
+    finished: bool = False
+
+
+class TicketWatcher:
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        backoff: float,
+        max_tickets: int,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_tickets = max_tickets
+        self._tickets: dict[tuple[str, str], _WatchedTicket] = {}
+        self.polls = 0
+
+    def accepts(self, ticket_id: str, agent: str = "") -> bool:
+        """True si el ticket ya se observa o hay capacidad para uno nuevo."""
+        return (agent, ticket_id) in self._tickets or len(self._tickets) < self.max_tickets
+
+    async def subscribe(
+        self, ticket_id: str, keepalive: Optional[float] = None, agent: str = ""
+    ) -> AsyncIterator[Optional[TicketEvent]]:
+        """
+        Itera los eventos de un ticket. El último estado conocido se entrega
+        de inmediato; la iteración termina tras el evento "end".
+
+        Si pasan `keepalive` segundos sin eventos se entrega None, para que
+        el llamador envíe un latido y detecte clientes desconectados.
+
+        Las consultas se hacen con las credenciales de `agent` (código del
+        registro de agentes; vacío = ACTIVE_AGENT).
+        """
+        key = (agent, ticket_id)
+        watched = self._tickets.get(key)
+        if watched is None:
+            if len(self._tickets) >= self.max_tickets:
+                raise TooManyTicketsError(f"Máximo de {self.max_tickets} tickets observados alcanzado")
+            watched = self._tickets[key] = _WatchedTicket(ticket_id, agent)
+            watched.task = asyncio.create_task(self._poll(watched))
+            logger.info(f"Iniciando seguimiento de ticket {ticket_id}")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if watched.last_event is not None:
+            queue.put_nowait(watched.last_event)
+        watched.subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event.event == EVENT_END:
+                    return
+        finally:
+            watched.subscribers.discard(queue)
+            if not watched.subscribers and not watched.finished:
+                self._stop(watched)
+
+    async def _poll(self, watched: _WatchedTicket):
+        interval = self.min_interval
+        try:
+            context = get_agent_registry().get(watched.agent or None)
+            while True:
+                self.polls += 1
+                lookup = await get_status_cache().lookup(
+                    watched.ticket_id, context.soap_client.consulta_din, scope=context.code
+                )
+                result = lookup.result
+
+                if not result.get("success"):
+                    self._publish(watched, EVENT_ERROR, {
+                        "ticket": watched.ticket_id,
+                        "message": result.get("message", "Error en consulta"),
+                    }, remember=False)
+                    interval = min(interval * self.backoff, self.max_interval)
+                else:
+                    snapshot = _snapshot(watched.ticket_id, result)
+                    if snapshot != watched.last_snapshot:
+                        watched.last_snapshot = snapshot
+                        self._publish(watched, EVENT_STATUS, snapshot)
+                        interval = self.min_interval
+                    else:
+                        interval = min(interval * self.backoff, self.max_interval)
+
+                    if lookup.terminal:
+                        watched.finished = True
+                        self._publish(watched, EVENT_END, snapshot)
+                        logger.info(f"Ticket {watched.ticket_id} en estado terminal, seguimiento finalizado")
+                        return
+
+                await asyncio.sleep(interval)
+        except Exception as e:
+            logger.error(f"Error en seguimiento de ticket {watched.ticket_id}: {e}", exc_info=True)
+            watched.finished = True
+            self._publish(watched, EVENT_END, {"ticket": watched.ticket_id, "message": f"Error interno: {e}"})
+        finally:
+            if self._tickets.get((watched.agent, watched.ticket_id)) is watched:
+                del self._tickets[(watched.agent, watched.ticket_id)]
+
+    def _publish(self, watched: _WatchedTicket, event_type: str, data: dict, remember: bool = True):
+        event = TicketEvent(id=watched.next_id, event=event_type, data=data)
+        watched.next_id += 1
+        if remember:
+            watched.last_event = event
+        for queue in watched.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def _stop(self, watched: _WatchedTicket):
+        if watched.task is not None and not watched.task.done():
+            watched.task.cancel()
+        if self._tickets.get((watched.agent, watched.ticket_id)) is watched:
+            del self._tickets[(watched.agent, watched.ticket_id)]
+        logger.info(f"Sin suscriptores, seguimiento detenido: {watched.ticket_id}")
+
+    async def close(self):
+        tasks = [w.task for w in self._tickets.values() if w.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tickets.clear()
+
+    def stats(self) -> dict:
+        return {
+            "tickets": len(self._tickets),
+            "subscribers": sum(len(w.subscribers) for w in self._tickets.values()),
+            "polls": self.polls,
+        }
+
+
+def _snapshot(ticket_id: str, result: dict) -> dict:
+    detalles = result.get("detalles") or {}
+    return {
+        "ticket": ticket_id,
+        "estado": result.get("estado"),
+        "tiposeleccion": detalles.get("tiposeleccion"),
+        "numeroaceptacion": detalles.get("numeroaceptacion"),
+        "fechaceptacion": detalles.get("fechaceptacion"),
+    }
+
+
+@lru_cache
+def get_ticket_watcher() -> TicketWatcher:
+    settings = get_settings()
+    return TicketWatcher(
+        min_interval=settings.status_watch_min_interval,
+        max_interval=settings.status_watch_max_interval,
+        backoff=settings.status_watch_backoff,
+        max_tickets=settings.status_watch_max_tickets,
+    )
@@ -6,6 +6,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional
 from app.models.din import DINModel
+from app.utils.formatters import format_monto
 
 logger = logging.getLogger(__name__)
 
@@ -492,12 +493,8 @@ class DINValidator:
             return 0.0
 
     def _format_monto(self, value: Optional[str], total_len: int, decimals: int = 2) -> str:
-        """Formatea un monto con padding de ceros."""
-        num = self._parse_decimal(value)
-        # Formato con decimales fijos
-        formatted = f"{abs(num):.{decimals}f}"
-        # Padding izquierdo con ceros
-        return formatted.zfill(total_len)
+        """Formatea un monto con padding de ceros (sin pasar por float)."""
+        return format_monto(value, total_len, decimals)
 
     def _format_cantidad(self, value: Optional[str], total_len: int, decimals: int = 4) -> str:
         """Formatea una cantidad con padding de ceros."""
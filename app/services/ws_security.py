@@ -0,0 +1,46 @@
+import logging
+from lxml import etree
+
+from app.services.metrics import STAGE_WS_SECURITY, observe_stage
+
+logger = logging.getLogger(__name__)
+
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+WSSE_NS = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"
+PASSWORD_TEXT_TYPE = (
+    "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-username-token-profile-1.0#PasswordText"
+)
+
+
+def apply_ws_security(tree: etree._Element, ws_user: str, ws_password: str) -> bool:
+    """
+    Inserta el header WS-Security (UsernameToken) directamente en el árbol.
+
+    Retorna False si no hay credenciales configuradas y el árbol no se modificó.
+    """
+    if not ws_user or not ws_password:
+        logger.warning("Credenciales WS no configuradas, enviando sin autenticación")
+        return False
+
+    with observe_stage(STAGE_WS_SECURITY):
+        _insert_username_token(tree, ws_user, ws_password)
+    return True
+
+
+def _insert_username_token(tree: etree._Element, ws_user: str, ws_password: str):
+    header = tree.find(f"{{{SOAP_NS}}}Header")
+    if header is None:
+        header = etree.Element(f"{{{SOAP_NS}}}Header")
+        tree.insert(0, header)
+
+    # Crear elemento Security
+    security = etree.SubElement(header, f"{{{WSSE_NS}}}Security")
+    security.set(f"{{{SOAP_NS}}}mustUnderstand", "1")
+
+    # UsernameToken
+    username_token = etree.SubElement(security, f"{{{WSSE_NS}}}UsernameToken")
+    username_elem = etree.SubElement(username_token, f"{{{WSSE_NS}}}Username")
+    username_elem.text = ws_user
+    password_elem = etree.SubElement(username_token, f"{{{WSSE_NS}}}Password")
+    password_elem.set("Type", PASSWORD_TEXT_TYPE)
+    password_elem.text = ws_password
@@ -1,19 +1,27 @@
 import os
 import logging
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from typing import Optional
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from lxml import etree
 
+from app.config import get_settings
 from app.models.din import DINModel
+from app.services.metrics import STAGE_PARSE, STAGE_RENDER, STAGE_VALIDATE, observe_stage
 from app.services.validators import validate_din
+from app.services.xml_tree_builder import build_envelope
 
 logger = logging.getLogger(__name__)
 
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
+DEFAULT_JINJA_CACHE_DIR = Path(__file__).parent.parent.parent / ".jinja_cache"
+
+# "jinja": plantilla din_soap.xml.j2; "lxml": árbol construido directamente
+BUILDER_ENGINES = ("jinja", "lxml")
 
 
 class XMLBuilderService:
-    def __init__(self, apply_validations: bool = True):
+    def __init__(self, apply_validations: bool = True, engine: str = None):
         """
         Inicializa el servicio de construcción de XML.
         
@@ -21,49 +29,77 @@ class XMLBuilderService:
             apply_validations: Si True, aplica todas las validaciones y
                                transformaciones del sistema legacy antes
                                de generar el XML.
+            engine: Motor de construcción ("jinja" o "lxml"). Por defecto
+                    se usa XML_BUILDER_ENGINE.
         """
         self.apply_validations = apply_validations
+        self.engine = (engine or get_settings().xml_builder_engine).lower()
+        if self.engine not in BUILDER_ENGINES:
+            raise ValueError(f"Motor de construcción XML no válido: {self.engine}")
         self.env = Environment(
             loader=FileSystemLoader(str(TEMPLATES_DIR)),
+            bytecode_cache=_bytecode_cache(),
             autoescape=False,
             trim_blocks=True,
             lstrip_blocks=True,
         )
         self.template = self.env.get_template("din_soap.xml.j2")
 
+    def prepare(self, din: DINModel) -> DINModel:
+        """Validaciones y transformaciones previas a construir (si apply_validations=True)."""
+        if self.apply_validations:
+            logger.info("Aplicando validaciones y transformaciones")
+            with observe_stage(STAGE_VALIDATE):
+                din = validate_din(din)
+        return din
+
+    def _render(self, din: DINModel) -> str:
+        with observe_stage(STAGE_RENDER):
+            din_dict = din.model_dump(by_alias=False)
+            # Renombrar 'items' para evitar conflicto con método builtin de dict
+            if 'items' in din_dict:
+                din_dict['items_list'] = din_dict.pop('items')
+            return self.template.render(din=din_dict)
+
     def build_xml(self, din: DINModel) -> str:
         """
         Construye el XML a partir del modelo DIN.
         
         Aplica validaciones y transformaciones si apply_validations=True.
         """
-        # Aplicar validaciones si está habilitado
-        if self.apply_validations:
-            logger.info("Aplicando validaciones y transformaciones")
-            din = validate_din(din)
-
-        din_dict = din.model_dump(by_alias=False)
-        # Renombrar 'items' para evitar conflicto con método builtin de dict
-        if 'items' in din_dict:
-            din_dict['items_list'] = din_dict.pop('items')
-        xml_content = self.template.render(din=din_dict)
-        return xml_content
+        din = self.prepare(din)
+        if self.engine == "lxml":
+            xml_bytes = etree.tostring(build_envelope(din), encoding="UTF-8", xml_declaration=True)
+            return xml_bytes.decode("utf-8")
+        return self._render(din)
 
     def build_xml_for_signing(self, din: DINModel) -> etree._Element:
-        xml_str = self.build_xml(din)
-        parser = etree.XMLParser(remove_blank_text=True)
-        return etree.fromstring(xml_str.encode("utf-8"), parser=parser)
-
-    def validate_xml_structure(self, xml_str: str) -> tuple[bool, str]:
-        try:
+        din = self.prepare(din)
+        if self.engine == "lxml":
+            with observe_stage(STAGE_RENDER):
+                return build_envelope(din)
+        rendered = self._render(din)
+        with observe_stage(STAGE_PARSE):
             parser = etree.XMLParser(remove_blank_text=True)
-            etree.fromstring(xml_str.encode("utf-8"), parser=parser)
-            return True, "XML válido"
-        except etree.XMLSyntaxError as e:
-            logger.error(f"Error de sintaxis XML: {e}")
-            return False, str(e)
+            return etree.fromstring(rendered.encode("utf-8"), parser=parser)
 
     def prettify_xml(self, xml_str: str) -> str:
         parser = etree.XMLParser(remove_blank_text=True)
         tree = etree.fromstring(xml_str.encode("utf-8"), parser=parser)
         return etree.tostring(tree, pretty_print=True, encoding="unicode")
+
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    """
+    Caché de bytecode persistente: la plantilla se compila una vez por
+    despliegue (durante el build de la imagen o el primer arranque) y los
+    procesos siguientes cargan el bytecode. Jinja invalida la entrada si
+    cambia el fuente de la plantilla.
+    """
+    cache_dir = Path(get_settings().jinja_cache_dir or DEFAULT_JINJA_CACHE_DIR)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"No se pudo crear caché Jinja en {cache_dir}: {e}")
+        return None
+    return FileSystemBytecodeCache(str(cache_dir))
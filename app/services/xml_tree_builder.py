@@ -0,0 +1,314 @@
+"""
+Construcción directa del SOAP Envelope DIN como árbol lxml.
+
+Alternativa al motor Jinja (din_soap.xml.j2): recorre el DINModel y emite
+elementos lxml sin pasar por un string intermedio ni re-parsear. El orden
+de elementos, prefijos y namespaces replican exactamente la plantilla.
+"""
+from typing import Any, Iterable, Optional
+
+from lxml import etree
+
+from app.models.din import DINModel
+
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+ESQUEMAS = "http://www.aduana.cl/xml/esquemas"
+
+# Mapa de namespaces declarado en el elemento DIN (igual que la plantilla)
+DIN_NSMAP = {
+    "ns10": f"{ESQUEMAS}/ITEM",
+    "ns11": f"{ESQUEMAS}/OBSERVACIONITEM",
+    "ns12": f"{ESQUEMAS}/OBSERVACIONESITEM",
+    "ns13": f"{ESQUEMAS}/CUENTAITEM",
+    "ns14": f"{ESQUEMAS}/CUENTASITEM",
+    "ns15": f"{ESQUEMAS}/INSUMO",
+    "ns16": f"{ESQUEMAS}/INSUMOS",
+    "ns17": f"{ESQUEMAS}/ANEXA",
+    "ns18": f"{ESQUEMAS}/ANEXAS",
+    "ns19": f"{ESQUEMAS}/ITEMS",
+    "ns2": f"{ESQUEMAS}/LOG",
+    "ns20": f"{ESQUEMAS}/VISTOBUENO",
+    "ns21": f"{ESQUEMAS}/VISTOSBUENOS",
+    "ns22": f"{ESQUEMAS}/BULTOS",
+    "ns23": f"{ESQUEMAS}/BULTO",
+    "ns24": f"{ESQUEMAS}/CUENTASYVALORES",
+    "ns25": f"{ESQUEMAS}/CUENTAGIRO",
+    "ns26": f"{ESQUEMAS}/CUENTASGIRO",
+    "ns27": f"{ESQUEMAS}/PAGODIFERIDO",
+    "ns28": f"{ESQUEMAS}/FECHAVENCCUOTA",
+    "ns29": f"{ESQUEMAS}/CUOTA",
+    "ns3": f"{ESQUEMAS}/CABEZA",
+    "ns30": f"{ESQUEMAS}/MONTOCUOTA",
+    "ns31": f"{ESQUEMAS}/CUOTAS",
+    "ns32": f"{ESQUEMAS}/ANEXASDIN",
+    "ns33": f"{ESQUEMAS}/ERRORES",
+    "ns34": f"{ESQUEMAS}/ERROR",
+    "ns35": "http://www.w3.org/2000/09/xmldsig#",
+    "ns36": f"{ESQUEMAS}/EnvioDin",
+    "ns4": f"{ESQUEMAS}/IDENTIFICACION",
+    "ns5": f"{ESQUEMAS}/REGIMENSUSPENSIVO",
+    "ns6": f"{ESQUEMAS}/ORIGENTRANSPALMACENAJE",
+    "ns7": f"{ESQUEMAS}/ANTECEDENTESFINANCIEROS",
+    "ns8": f"{ESQUEMAS}/TOTALES",
+    "ns9": f"{ESQUEMAS}/RESPUESTA",
+}
+
+NS_LOG = DIN_NSMAP["ns2"]
+NS_CABEZA = DIN_NSMAP["ns3"]
+NS_IDENTIFICACION = DIN_NSMAP["ns4"]
+NS_REGIMENSUSPENSIVO = DIN_NSMAP["ns5"]
+NS_ORIGEN = DIN_NSMAP["ns6"]
+NS_ANTECEDENTES = DIN_NSMAP["ns7"]
+NS_TOTALES = DIN_NSMAP["ns8"]
+NS_RESPUESTA = DIN_NSMAP["ns9"]
+NS_ITEM = DIN_NSMAP["ns10"]
+NS_OBSERVACIONITEM = DIN_NSMAP["ns11"]
+NS_OBSERVACIONESITEM = DIN_NSMAP["ns12"]
+NS_CUENTAITEM = DIN_NSMAP["ns13"]
+NS_CUENTASITEM = DIN_NSMAP["ns14"]
+NS_INSUMO = DIN_NSMAP["ns15"]
+NS_INSUMOS = DIN_NSMAP["ns16"]
+NS_ANEXA = DIN_NSMAP["ns17"]
+NS_ANEXAS = DIN_NSMAP["ns18"]
+NS_ITEMS = DIN_NSMAP["ns19"]
+NS_VISTOBUENO = DIN_NSMAP["ns20"]
+NS_VISTOSBUENOS = DIN_NSMAP["ns21"]
+NS_BULTOS = DIN_NSMAP["ns22"]
+NS_BULTO = DIN_NSMAP["ns23"]
+NS_CUENTASYVALORES = DIN_NSMAP["ns24"]
+NS_CUENTAGIRO = DIN_NSMAP["ns25"]
+NS_CUENTASGIRO = DIN_NSMAP["ns26"]
+NS_PAGODIFERIDO = DIN_NSMAP["ns27"]
+NS_FECHAVENCCUOTA = DIN_NSMAP["ns28"]
+NS_CUOTA = DIN_NSMAP["ns29"]
+NS_MONTOCUOTA = DIN_NSMAP["ns30"]
+NS_CUOTAS = DIN_NSMAP["ns31"]
+NS_ANEXASDIN = DIN_NSMAP["ns32"]
+NS_ERRORES = DIN_NSMAP["ns33"]
+NS_ERROR = DIN_NSMAP["ns34"]
+NS_ENVIODIN = DIN_NSMAP["ns36"]
+
+_SubElement = etree.SubElement
+
+
+def _spec(ns: str, names: Iterable[str]) -> tuple[tuple[str, str], ...]:
+    """Precalcula (tag calificado, atributo del modelo) para una sección."""
+    return tuple((f"{{{ns}}}{name}", name.lower()) for name in names)
+
+
+def _q(ns: str, name: str) -> str:
+    return f"{{{ns}}}{name}"
+
+
+# Campos simples por sección, en el orden de la plantilla.
+# El atributo del modelo es siempre el tag en minúsculas.
+LOG_FIELDS = _spec(NS_LOG, ("SECUENCIA", "ADUANA", "SOBRE", "FECHA", "HORA", "VAN", "ORIGEN", "DESTINO"))
+CABEZA_FIELDS = _spec(NS_CABEZA, (
+    "FORM", "NUMIDENTIF", "FECVENCI", "ADU", "AGENTE", "TPODOCTO", "TIPOINGR",
+    "NUMAUT", "FECAUT", "GBCOCEN", "FECTRA", "FECACEP", "AFORO", "FECCONFDI",
+    "NUMENCRIP", "FECCONFEC", "NUMIDENACL", "NUMRES", "FECRES",
+))
+IDENTIFICACION_FIELDS = _spec(NS_IDENTIFICACION, (
+    "NOMBRE", "DIREC", "CODCOMUN", "TIPRUT", "RUT", "DVRUT", "NOMREPLEG",
+    "NUMRUTRL", "DIGVERRL", "NOMCONSIG", "DESDIRCON", "CODPAISCON",
+))
+REGIMENSUSPENSIVO_FIELDS = _spec(NS_REGIMENSUSPENSIVO, (
+    "DESDIRALM", "CODCOMRS", "ADUCTROL", "NUMPLAZO", "INDPARCIAL", "NUMHOJINS",
+    "TOTINSUM", "CODALMA", "NUMRS", "FECRS", "ADUARS", "NUMHOJANE", "NUMSEC",
+))
+ORIGEN_FIELDS = _spec(NS_ORIGEN, (
+    "PAORIG", "GPAORIG", "PAADQ", "GPAADQ", "VIATRAN", "DESPUERT", "TRANSB",
+    "PTOEMB", "GPTODESEM", "PTODESEM", "TPOCARGA", "DESALMAC", "ALMACEN",
+    "FECALMAC", "FECRETIRO", "GNOMCIAT", "CODPAISCIA", "NUMRUTCIA", "DIGVERCIA",
+    "NUMMANIF", "NUMMANIF1", "NUMMANIF2", "FECMANIF", "NUMCONOC", "FECCONOC",
+    "NOMEMISOR", "NUMRUTEMI", "DIGVEREMI",
+))
+ANTECEDENTES_FIELDS = _spec(NS_ANTECEDENTES, (
+    "GREGIMP", "REGIMP", "BCOCOM", "CODORDIV", "FORMPAGO", "NUMDIAS",
+    "VALEXFAB", "MONEDA", "MONGASFOB", "CLCOMPRA", "PAGOGRAV",
+))
+TOTALES_FIELDS = _spec(NS_TOTALES, (
+    "TOTITEMS", "FOB", "TOTHOJAS", "CODFLE", "FLETE", "TOTBULTOS", "CODSEG",
+    "SEGURO", "TOTPESO", "CIF",
+))
+RESPUESTA_FIELDS = _spec(NS_RESPUESTA, ("FECHACEPTACION", "NUMEROENCRIPTADO", "ESTADO"))
+ITEM_FIELDS = _spec(NS_ITEM, (
+    "NUMITEM", "DNOMBRE", "DMARCA", "DVARIEDAD", "DOTRO1", "DOTRO2", "ATR5",
+    "ATR6", "SAJUITEM", "AJUITEM", "CANTMERC", "MEDIDA", "CODESTUM", "PREUNIT",
+    "ARANCALA", "NUMCOR", "NUMACU", "CONCUPO", "ARANCNAC", "CIFITEM",
+    "ADVALALA", "ADVAL", "VALAD",
+))
+OBSERVACIONITEM_FIELDS = _spec(NS_OBSERVACIONITEM, ("CODOBS", "DESOBS"))
+CUENTAITEM_FIELDS = _spec(NS_CUENTAITEM, ("OTRO", "CTA", "SIGVAL", "VALOR"))
+INSUMO_FIELDS = _spec(NS_INSUMO, ("NUMITEM", "NUMINSUMO", "DESINSUMO", "CANINSUMO", "CODMEDIDA", "CIFINSUMO"))
+ANEXA_FIELDS = _spec(NS_ANEXA, (
+    "NUMSEC", "NUMDAPEX", "FECDAPEX", "CODADUANA", "NUMITEM", "NUMINSUMO",
+    "NOMINSUMO", "CODUNMEDI", "NUMITEMDEC", "NOMPRODUCTO", "CANPRODUCTO",
+    "CODUNMEDP", "FACCONSUMO", "NUMINSUTI",
+))
+VISTOBUENO_FIELDS = _spec(NS_VISTOBUENO, ("NUREGR", "ANOREG", "CODVISBUEN", "NUMREGLA", "NUMANORES", "CODULTVB"))
+BULTO_FIELDS = _spec(NS_BULTO, ("DESTIPBUL", "TPOBUL", "CANTBUL"))
+CUENTASYVALORES_FIELDS = _spec(NS_CUENTASYVALORES, ("MON178", "MON191", "MON699", "MON199"))
+CUENTAGIRO_FIELDS = _spec(NS_CUENTAGIRO, ("CTAOTRO", "MONOTRO"))
+PAGODIFERIDO_FIELDS = _spec(NS_PAGODIFERIDO, ("TASA", "NCUOTAS", "ADUDI", "NUMDI", "FECDI"))
+FECHAVENCCUOTA_FIELDS = _spec(NS_FECHAVENCCUOTA, ("FECHA", "CODFECHA"))
+MONTOCUOTA_FIELDS = _spec(NS_MONTOCUOTA, ("VALOR", "CODVALOR"))
+ERROR_FIELDS = _spec(NS_ERROR, ("CODIGO", "GLOSA"))
+
+# Tags de contenedores
+TAG_TIPOENVIO = _q(NS_ENVIODIN, "TIPOENVIO")
+TAG_LOG = _q(NS_ENVIODIN, "LOG")
+TAG_CABEZA = _q(NS_ENVIODIN, "CABEZA")
+TAG_ITEMS = _q(NS_ENVIODIN, "ITEMS")
+TAG_VISTOSBUENOS = _q(NS_ENVIODIN, "VISTOSBUENOS")
+TAG_BULTOS = _q(NS_ENVIODIN, "BULTOS")
+TAG_CUENTASYVALORES = _q(NS_ENVIODIN, "CUENTASYVALORES")
+TAG_PAGODIFERIDO = _q(NS_ENVIODIN, "PAGODIFERIDO")
+TAG_ANEXASDIN = _q(NS_ENVIODIN, "ANEXASDIN")
+TAG_ERRORES = _q(NS_ENVIODIN, "ERRORES")
+TAG_IDENTIFICACION = _q(NS_CABEZA, "IDENTIFICACION")
+TAG_REGIMENSUSPENSIVO = _q(NS_CABEZA, "REGIMENSUSPENSIVO")
+TAG_ORIGEN = _q(NS_CABEZA, "ORIGENTRANSPALMACENAJE")
+TAG_ANTECEDENTES = _q(NS_CABEZA, "ANTECEDENTESFINANCIEROS")
+TAG_TOTALES = _q(NS_CABEZA, "TOTALES")
+TAG_RESPUESTA = _q(NS_CABEZA, "RESPUESTA")
+TAG_TIPOSELECCION = _q(NS_RESPUESTA, "TIPOSELECCION")
+TAG_ITEM = _q(NS_ITEMS, "ITEM")
+TAG_OBSERVACIONESITEM = _q(NS_ITEM, "OBSERVACIONESITEM")
+TAG_CUENTASITEM = _q(NS_ITEM, "CUENTASITEM")
+TAG_INSUMOS = _q(NS_ITEM, "INSUMOS")
+TAG_ANEXAS = _q(NS_ITEM, "ANEXAS")
+TAG_OBSERVACIONITEM = _q(NS_OBSERVACIONESITEM, "OBSERVACIONITEM")
+TAG_CUENTAITEM = _q(NS_CUENTASITEM, "CUENTAITEM")
+TAG_INSUMO = _q(NS_INSUMOS, "INSUMO")
+TAG_ITEM_ANEXA = _q(NS_ANEXAS, "ANEXA")
+TAG_VISTOBUENO = _q(NS_VISTOSBUENOS, "VISTOBUENO")
+TAG_IDBULTOS = _q(NS_BULTOS, "IDBULTOS")
+TAG_BULTO = _q(NS_BULTOS, "BULTO")
+TAG_CUENTASGIRO = _q(NS_CUENTASYVALORES, "CUENTASGIRO")
+TAG_CUENTAGIRO = _q(NS_CUENTASGIRO, "CUENTAGIRO")
+TAG_CUOTAS = _q(NS_PAGODIFERIDO, "CUOTAS")
+TAG_CUOTA = _q(NS_CUOTAS, "CUOTA")
+TAG_FECHAVENCCUOTA = _q(NS_CUOTA, "FECHAVENCCUOTA")
+TAG_MONTOCUOTA = _q(NS_CUOTA, "MONTOCUOTA")
+TAG_DIN_ANEXA = _q(NS_ANEXASDIN, "ANEXA")
+TAG_FECHAPROCESO = _q(NS_ERRORES, "FECHAPROCESO")
+TAG_ERROR = _q(NS_ERRORES, "ERROR")
+
+
+def _text(value: Any) -> Optional[str]:
+    # La plantilla renderiza valores/secciones ausentes como texto vacío
+    return str(value) if value else None
+
+
+def _fields(parent: etree._Element, obj: Any, spec: tuple[tuple[str, str], ...]):
+    # Los campos vacíos quedan sin texto (<tag/>), igual que al parsear la
+    # salida de la plantilla; en forma canónica ambos son <tag></tag>.
+    if obj is None:
+        for qname, _ in spec:
+            _SubElement(parent, qname)
+        return
+    for qname, attr in spec:
+        value = getattr(obj, attr)
+        if value:
+            _SubElement(parent, qname).text = value
+        else:
+            _SubElement(parent, qname)
+
+
+def _section(parent: etree._Element, tag: str, obj: Any, spec: tuple[tuple[str, str], ...]) -> etree._Element:
+    elem = _SubElement(parent, tag)
+    _fields(elem, obj, spec)
+    return elem
+
+
+def _list_section(parent: etree._Element, tag: str, objs: Iterable[Any], spec: tuple[tuple[str, str], ...]):
+    for obj in objs:
+        _section(parent, tag, obj, spec)
+
+
+def build_item(parent: etree._Element, item) -> etree._Element:
+    item_elem = _section(parent, TAG_ITEM, item, ITEM_FIELDS)
+    _list_section(_SubElement(item_elem, TAG_OBSERVACIONESITEM), TAG_OBSERVACIONITEM,
+                  item.observacionesitem, OBSERVACIONITEM_FIELDS)
+    _list_section(_SubElement(item_elem, TAG_CUENTASITEM), TAG_CUENTAITEM,
+                  item.cuentasitem, CUENTAITEM_FIELDS)
+    _list_section(_SubElement(item_elem, TAG_INSUMOS), TAG_INSUMO, item.insumos, INSUMO_FIELDS)
+    _list_section(_SubElement(item_elem, TAG_ANEXAS), TAG_ITEM_ANEXA, item.anexas, ANEXA_FIELDS)
+    return item_elem
+
+
+def build_cabeza(parent: etree._Element, cabeza) -> etree._Element:
+    cabeza_elem = _section(parent, TAG_CABEZA, cabeza, CABEZA_FIELDS)
+    _section(cabeza_elem, TAG_IDENTIFICACION, cabeza.identificacion, IDENTIFICACION_FIELDS)
+    _section(cabeza_elem, TAG_REGIMENSUSPENSIVO, cabeza.regimensuspensivo, REGIMENSUSPENSIVO_FIELDS)
+    _section(cabeza_elem, TAG_ORIGEN, cabeza.origentranspalmacenaje, ORIGEN_FIELDS)
+    _section(cabeza_elem, TAG_ANTECEDENTES, cabeza.antecedentesfinancieros, ANTECEDENTES_FIELDS)
+    _section(cabeza_elem, TAG_TOTALES, cabeza.totales, TOTALES_FIELDS)
+    respuesta_elem = _section(cabeza_elem, TAG_RESPUESTA, cabeza.respuesta, RESPUESTA_FIELDS)
+    tiposeleccion = getattr(cabeza.respuesta, "tiposeleccion", None)
+    if tiposeleccion:
+        _SubElement(respuesta_elem, TAG_TIPOSELECCION).text = tiposeleccion
+    return cabeza_elem
+
+
+def build_din_element(din: DINModel, parent: etree._Element = None) -> etree._Element:
+    """Construye el elemento DIN (sin firma) con el mapa de namespaces de la plantilla."""
+    if parent is None:
+        din_elem = etree.Element("DIN", nsmap=DIN_NSMAP)
+    else:
+        din_elem = _SubElement(parent, "DIN", nsmap=DIN_NSMAP)
+
+    build_din_head(din_elem, din)
+    items_elem = _SubElement(din_elem, TAG_ITEMS)
+    for item in din.items:
+        build_item(items_elem, item)
+    build_din_tail(din_elem, din)
+    return din_elem
+
+
+def build_din_head(din_elem: etree._Element, din: DINModel):
+    """Secciones del DIN anteriores a ITEMS: TIPOENVIO, LOG y CABEZA."""
+    _SubElement(din_elem, TAG_TIPOENVIO).text = _text(din.tipoenvio)
+    _section(din_elem, TAG_LOG, din.log, LOG_FIELDS)
+    build_cabeza(din_elem, din.cabeza)
+
+
+def build_din_tail(din_elem: etree._Element, din: DINModel):
+    """Secciones del DIN posteriores a ITEMS, de VISTOSBUENOS a ERRORES."""
+    _list_section(_SubElement(din_elem, TAG_VISTOSBUENOS), TAG_VISTOBUENO,
+                  din.vistosbuenos, VISTOBUENO_FIELDS)
+
+    bultos_elem = _SubElement(din_elem, TAG_BULTOS)
+    _SubElement(bultos_elem, TAG_IDBULTOS).text = _text(din.bultos.idbultos)
+    _list_section(bultos_elem, TAG_BULTO, din.bultos.bultos, BULTO_FIELDS)
+
+    cv = din.cuentasyvalores
+    cv_elem = _section(din_elem, TAG_CUENTASYVALORES, cv, CUENTASYVALORES_FIELDS)
+    _list_section(_SubElement(cv_elem, TAG_CUENTASGIRO), TAG_CUENTAGIRO, cv.cuentasgiro, CUENTAGIRO_FIELDS)
+
+    pd = din.pagodiferido
+    if pd:
+        pd_elem = _section(din_elem, TAG_PAGODIFERIDO, pd, PAGODIFERIDO_FIELDS)
+        if pd.cuotas:
+            cuotas_elem = _SubElement(pd_elem, TAG_CUOTAS)
+            for cuota in pd.cuotas:
+                cuota_elem = _SubElement(cuotas_elem, TAG_CUOTA)
+                _list_section(cuota_elem, TAG_FECHAVENCCUOTA, cuota.fechavenccuota, FECHAVENCCUOTA_FIELDS)
+                _list_section(cuota_elem, TAG_MONTOCUOTA, cuota.montocuota, MONTOCUOTA_FIELDS)
+
+    if din.anexasdin:
+        _list_section(_SubElement(din_elem, TAG_ANEXASDIN), TAG_DIN_ANEXA, din.anexasdin, ANEXA_FIELDS)
+
+    errores_elem = _SubElement(din_elem, TAG_ERRORES)
+    _SubElement(errores_elem, TAG_FECHAPROCESO).text = _text(getattr(din.errores, "fechaproceso", None))
+    _list_section(errores_elem, TAG_ERROR, getattr(din.errores, "errores", None) or [], ERROR_FIELDS)
+
+
+def build_envelope(din: DINModel) -> etree._Element:
+    """Construye el SOAP Envelope completo (Header vacío + Body/DIN)."""
+    envelope = etree.Element(f"{{{SOAP_NS}}}Envelope", nsmap={"soapenv": SOAP_NS})
+    _SubElement(envelope, f"{{{SOAP_NS}}}Header")
+    body = _SubElement(envelope, f"{{{SOAP_NS}}}Body")
+    build_din_element(din, body)
+    return envelope
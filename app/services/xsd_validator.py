@@ -0,0 +1,129 @@
+"""
+Validación XSD del DIN contra los esquemas de docs/EsquemasMensajeriaDin.
+
+Los esquemas se resuelven siempre desde disco (sin red). Dos ajustes se
+hacen en memoria, sin tocar los archivos:
+
+- El elemento raíz DIN viaja sin namespace dentro del Body SOAP (ver
+  docs/formato_xml_correcto.xml), mientras EnvioDin.xsd sólo declara
+  ns36:DIN. Se compila un esquema envoltorio sin targetNamespace que
+  declara DIN con el tipo EnvioDin:DIN.
+- La validación ocurre antes de firmar, por lo que ds:Signature se marca
+  como opcional.
+"""
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from lxml import etree
+
+from app.config import get_settings
+from app.models.din import SchemaErrorDetail
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEMAS_DIR = Path(__file__).parent.parent.parent / "docs" / "EsquemasMensajeriaDin"
+
+XSD_NS = "http://www.w3.org/2001/XMLSchema"
+ENVIO_DIN_NS = "http://www.aduana.cl/xml/esquemas/EnvioDin"
+ROOT_SCHEMA = "EnvioDin.xsd"
+
+WRAPPER_SCHEMA = f"""<schema xmlns="{XSD_NS}" xmlns:env="{ENVIO_DIN_NS}">
+    <import namespace="{ENVIO_DIN_NS}" schemaLocation="{ROOT_SCHEMA}"/>
+    <element name="DIN" type="env:DIN"/>
+</schema>""".encode("utf-8")
+
+_ELEMENT_RE = re.compile(r"Element '([^']+)'")
+
+
+class LocalSchemaResolver(etree.Resolver):
+    """Resuelve los schemaLocation por nombre de archivo dentro de schemas_dir."""
+
+    def __init__(self, schemas_dir: Path):
+        super().__init__()
+        self.schemas_dir = schemas_dir
+
+    def resolve(self, url, pubid, context):
+        path = self.schemas_dir / os.path.basename(url or "")
+        if not path.is_file():
+            logger.warning(f"Esquema no encontrado localmente: {url}")
+            return None
+        if path.name == ROOT_SCHEMA:
+            return self.resolve_string(_unsigned_root_schema(path), context, base_url=str(path))
+        return self.resolve_filename(str(path), context)
+
+
+def _unsigned_root_schema(path: Path) -> bytes:
+    doc = etree.parse(str(path))
+    for element in doc.iter(f"{{{XSD_NS}}}element"):
+        if element.get("ref", "").endswith(":Signature"):
+            element.set("minOccurs", "0")
+    return etree.tostring(doc)
+
+
+class DINSchemaValidator:
+    """
+    Valida el elemento DIN (sin firmar) contra EnvioDin.xsd.
+
+    El XMLSchema compilado guarda su error_log en el propio objeto, así que
+    cada hilo compila y reutiliza su propia instancia.
+    """
+
+    def __init__(self, schemas_dir: Optional[str] = None):
+        self.schemas_dir = Path(schemas_dir) if schemas_dir else DEFAULT_SCHEMAS_DIR
+        self._local = threading.local()
+
+    @property
+    def schema(self) -> etree.XMLSchema:
+        schema = getattr(self._local, "schema", None)
+        if schema is None:
+            schema = self._local.schema = self._compile()
+        return schema
+
+    def _compile(self) -> etree.XMLSchema:
+        if not (self.schemas_dir / ROOT_SCHEMA).is_file():
+            raise FileNotFoundError(f"Esquema {ROOT_SCHEMA} no encontrado en {self.schemas_dir}")
+        parser = etree.XMLParser(no_network=True)
+        parser.resolvers.add(LocalSchemaResolver(self.schemas_dir))
+        wrapper = etree.fromstring(
+            WRAPPER_SCHEMA, parser, base_url=str(self.schemas_dir / "_EnvioDinRaiz.xsd")
+        )
+        schema = etree.XMLSchema(etree.ElementTree(wrapper))
+        logger.info(f"Esquema XSD compilado desde {self.schemas_dir}")
+        return schema
+
+    def validate(self, tree: etree._Element) -> list[SchemaErrorDetail]:
+        """Valida el DIN contenido en `tree` (sobre SOAP o DIN); retorna los errores."""
+        din = tree if tree.tag == "DIN" else tree.find(".//DIN")
+        if din is None:
+            return [SchemaErrorDetail(message="Elemento DIN no encontrado")]
+
+        schema = self.schema
+        if schema.validate(din):
+            return []
+        return [
+            SchemaErrorDetail(
+                line=entry.line or None,
+                path=entry.path,
+                element=_element_name(entry.message),
+                message=entry.message,
+            )
+            for entry in schema.error_log
+        ]
+
+
+def _element_name(message: str) -> Optional[str]:
+    match = _ELEMENT_RE.search(message)
+    if not match:
+        return None
+    # '{namespace}NOMBRE' -> 'NOMBRE'
+    return match.group(1).rsplit("}", 1)[-1]
+
+
+@lru_cache
+def get_schema_validator() -> DINSchemaValidator:
+    return DINSchemaValidator(get_settings().xsd_schemas_dir or None)
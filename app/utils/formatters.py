@@ -0,0 +1,72 @@
+"""
+Formateo de montos de ancho fijo para la mensajería DIN.
+
+Los montos se manejan como enteros escalados (valor * 10**decimales) en vez
+de float, así que los valores de 14 dígitos (FOB/CIF) no pierden precisión.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+def format_monto(value: str | None, total_len: int, decimals: int = 2) -> str:
+    """
+    Formatea un monto como valor absoluto con `decimals` decimales y padding
+    izquierdo de ceros hasta `total_len` (p.ej. "0000000000.00").
+
+    Acepta coma como separador decimal. Valores vacíos o no numéricos se
+    formatean como cero. El redondeo es half-up sobre el valor decimal
+    exacto. Si el valor ya viene en el formato final se retorna tal cual.
+    """
+    if not value:
+        return _zero(total_len, decimals)
+    if _is_formatted(value, total_len, decimals):
+        return value
+
+    clean = value.strip()
+    if "," in clean:
+        clean = clean.replace(",", ".")
+    if clean[:1] in ("+", "-"):
+        clean = clean[1:]
+    int_part, _, frac = clean.partition(".")
+
+    if clean.isascii() and (int_part.isdigit() or (not int_part and frac)) and (not frac or frac.isdigit()):
+        int_part = int_part.lstrip("0") or "0"
+        if len(frac) <= decimals:
+            # Sin redondeo: sólo completar decimales
+            if not decimals:
+                return int_part.zfill(total_len)
+            return f"{int_part}.{frac.ljust(decimals, '0')}".zfill(total_len)
+        scaled = int(int_part + frac[:decimals])
+        if frac[decimals] >= "5":
+            scaled += 1
+    else:
+        # Notación exponencial u otros formatos que float() aceptaba
+        try:
+            num = Decimal(clean)
+        except InvalidOperation:
+            return _zero(total_len, decimals)
+        if not num.is_finite():
+            return _zero(total_len, decimals)
+        scaled = int(abs(num).scaleb(decimals).to_integral_value(ROUND_HALF_UP))
+
+    if not decimals:
+        return str(scaled).zfill(total_len)
+    digits = str(scaled).rjust(decimals + 1, "0")
+    return f"{digits[:-decimals]}.{digits[-decimals:]}".zfill(total_len)
+
+
+def _is_formatted(value: str, total_len: int, decimals: int) -> bool:
+    if len(value) != total_len or not value.isascii():
+        return False
+    if not decimals:
+        return value.isdigit()
+    point = total_len - decimals - 1
+    return (
+        point > 0
+        and value[point] == "."
+        and value[:point].isdigit()
+        and value[point + 1:].isdigit()
+    )
+
+
+def _zero(total_len: int, decimals: int) -> str:
+    return ("0." + "0" * decimals if decimals else "0").zfill(total_len)
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark de DINValidator._format_monto: implementación anterior
+(float + f-string) versus app.utils.formatters.format_monto.
+
+Mide tres mezclas de entrada:
+  - formateados: valores que ya vienen como "0000000000.00" (camino rápido)
+  - crudos:      montos sin padding como "1234.5"
+  - mixtos:      mitad y mitad, similar a un DIN real
+
+Uso:
+    python -m scripts.bench_format_monto [--number N]
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.utils.formatters import format_monto  # noqa: E402
+
+
+def legacy_format_monto(value, total_len, decimals=2):
+    """Implementación previa, copiada para comparar."""
+    if not value:
+        num = 0.0
+    else:
+        try:
+            num = float(value.replace(",", ".").strip())
+        except (ValueError, TypeError):
+            num = 0.0
+    return f"{abs(num):.{decimals}f}".zfill(total_len)
+
+
+def make_inputs(count: int, seed: int = 42) -> dict[str, list[str]]:
+    rng = random.Random(seed)
+    raw = [f"{rng.randint(0, 10**9)}.{rng.randint(0, 99):02d}" for _ in range(count)]
+    formatted = [legacy_format_monto(v, 13) for v in raw]
+    mixed = [formatted[i] if i % 2 else raw[i] for i in range(count)]
+    return {"formateados": formatted, "crudos": raw, "mixtos": mixed}
+
+
+def bench(func, values: list[str], number: int) -> float:
+    """Retorna llamadas por segundo."""
+    elapsed = min(timeit.repeat(lambda: [func(v, 13) for v in values], number=number, repeat=5))
+    return len(values) * number / elapsed
+
+
+def precision_check() -> None:
+    value = "123456789012.34"
+    print(f"Precisión (14 dígitos, 6 decimales) para {value}:")
+    print(f"  anterior: {legacy_format_monto(value, 19, 6)}")
+    print(f"  nuevo:    {format_monto(value, 19, 6)}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20, help="repeticiones por medición")
+    parser.add_argument("--values", type=int, default=10_000, help="montos por mezcla")
+    args = parser.parse_args()
+
+    print(f"{'mezcla':<12} {'anterior (ops/s)':>18} {'nuevo (ops/s)':>16} {'speedup':>8}")
+    for name, values in make_inputs(args.values).items():
+        old = bench(legacy_format_monto, values, args.number)
+        new = bench(format_monto, values, args.number)
+        print(f"{name:<12} {old:>18,.0f} {new:>16,.0f} {new / old:>7.2f}x")
+
+    print()
+    precision_check()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Benchmark de ingesta de DINRequest: camino anterior contra el actual.
+
+Compara, sobre el mismo JSON sintético (scripts.synthetic_din):
+  - litestar:       lo que hacía Litestar con `data: DINRequest`
+                    (msgspec a dict y model_validate, recolector activo)
+  - validate_json:  DINRequest.model_validate_json sobre los bytes
+  - ingest:         validate_json_bytes (msgspec + model_validate con
+                    el recolector pausado; app.services.ingest)
+  - job_before:     DINModel.model_validate_json del payload de la cola
+  - job_payload:    validate_json_bytes del payload de la cola (solo tras
+                    reinicio o reintento; en el caso normal el worker
+                    recibe el DIN ya validado y no hay ingesta)
+  - http_data:      POST de punta a punta a un handler `data: DINRequest`
+  - http_dto:       POST al mismo handler con dto=IngestDTO[DINRequest]
+
+Los tiempos de http_* incluyen el cliente de prueba de Litestar; sirven
+para comparar entre sí, no como latencia absoluta del servidor.
+
+Uso:
+    python -m scripts.bench_ingest [--sizes 999] [--min-time 2]
+                                   [--output bench-results/ingest.json]
+"""
+import argparse
+import datetime
+import json
+import logging
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.bench_pipeline import environment_info, measure  # noqa: E402
+
+DEFAULT_SIZES = (999,)
+
+
+def make_http_client():
+    from litestar import Litestar, post
+    from litestar.testing import TestClient
+
+    from app.models.din import DINRequest
+    from app.services.ingest import IngestDTO
+
+    @post("/data")
+    async def with_data(data: DINRequest) -> int:
+        return len(data.din.items)
+
+    @post("/dto", dto=IngestDTO[DINRequest], return_dto=None)
+    async def with_dto(data: DINRequest) -> int:
+        return len(data.din.items)
+
+    return TestClient(Litestar(route_handlers=[with_data, with_dto]))
+
+
+def bench_size(items: int, client, min_time: float, min_iterations: int, max_iterations: int) -> dict:
+    from litestar.serialization import decode_json
+
+    from app.models.din import DINModel, DINRequest
+    from app.services.ingest import validate_json_bytes
+    from scripts.synthetic_din import make_din_request
+
+    raw = json.dumps(make_din_request(items, seed=items)).encode("utf-8")
+    # Mismo formato que JobWorkerPool.submit guarda en SQLite
+    payload = DINRequest.model_validate_json(raw).din.model_dump_json(by_alias=True)
+    headers = {"Content-Type": "application/json"}
+
+    def post(path):
+        def run(body):
+            response = client.post(path, content=body, headers=headers)
+            if response.status_code != 201:
+                raise RuntimeError(f"{path}: HTTP {response.status_code} {response.text[:200]}")
+        return run
+
+    stages = {
+        "litestar": (lambda: raw, lambda body: DINRequest.model_validate(decode_json(body))),
+        "validate_json": (lambda: raw, DINRequest.model_validate_json),
+        "ingest": (lambda: raw, lambda body: validate_json_bytes(DINRequest, body)),
+        "job_before": (lambda: payload, DINModel.model_validate_json),
+        "job_payload": (lambda: payload, lambda body: validate_json_bytes(DINModel, body)),
+        "http_data": (lambda: raw, post("/data")),
+        "http_dto": (lambda: raw, post("/dto")),
+    }
+    results = {"json_bytes": len(raw), "stages": {}}
+    for stage, (setup, run) in stages.items():
+        results["stages"][stage] = measure(setup, run, min_time, min_iterations, max_iterations)
+        stats = results["stages"][stage]
+        print(
+            f"{items:>4} ítems  {stage:<14} {stats['ops_per_sec']:>9.1f} ops/s  "
+            f"p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+            f"p99 {stats['p99_ms']:>8.2f} ms",
+            file=sys.stderr,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Cantidades de ítems separadas por coma")
+    parser.add_argument("--min-time", type=float, default=2.0, help="Segundos medidos por etapa y tamaño")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=100_000)
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Archivo JSON de resultados (por defecto bench-results/ingest-<fecha>.json)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    logging.disable(logging.INFO)
+
+    with make_http_client() as client:
+        report = {
+            "benchmark": "ingest",
+            "environment": environment_info(),
+            "min_time": args.min_time,
+            "results": {
+                str(items): bench_size(items, client, args.min_time, args.min_iterations, args.max_iterations)
+                for items in sizes
+            },
+        }
+
+    output = args.output
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = ROOT / "bench-results" / f"ingest-{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"Resultados escritos en {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
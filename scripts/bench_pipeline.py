@@ -0,0 +1,238 @@
+"""
+Benchmark por etapa del pipeline de DIN, escalando por cantidad de ítems.
+
+Usa DIN sintéticos (scripts.synthetic_din) y un certificado de prueba
+desechable generado al vuelo, por lo que corre sin red ni certificados
+reales. Etapas:
+  - ingest:      validate_json_bytes(DINRequest) sobre el JSON crudo
+  - validate:    validate_din (DINValidator.validate_and_transform)
+  - render:      plantilla Jinja (motor "jinja")
+  - render_lxml: árbol lxml directo (motor "lxml")
+  - sign:        SignerService.sign_xml sobre el sobre ya construido
+  - pipeline:    build_signed_envelope completo (validación, render,
+                 parseo, XSD, firma, WS-Security y serialización)
+
+Por etapa se informa throughput (ops/s), latencia p50/p95/p99 en ms y
+memoria pico. La memoria se mide con tracemalloc en una pasada aparte:
+cubre asignaciones Python, no las internas de libxml2.
+
+Uso:
+    python -m scripts.bench_pipeline [--sizes 1,10,100,999] [--min-time 2]
+                                     [--output bench-results/pipeline.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SIZES = (1, 10, 100, 999)
+TEST_CERT_PASSWORD = "benchmark"
+
+
+def make_test_certificate(directory: Path) -> Path:
+    """Genera un PFX autofirmado RSA 2048 de un solo uso."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import BestAvailableEncryption, pkcs12
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "DIN benchmark")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    path = directory / "benchmark.pfx"
+    path.write_bytes(pkcs12.serialize_key_and_certificates(
+        b"benchmark", key, cert, None, BestAvailableEncryption(TEST_CERT_PASSWORD.encode())
+    ))
+    return path
+
+
+def configure_environment(cert_path: Path):
+    """Apunta el agente activo al certificado de prueba (antes de importar app)."""
+    os.environ["ACTIVE_AGENT"] = "G02"
+    os.environ["SERVED_AGENTS"] = ""
+    os.environ["G02_CERT_PATH"] = str(cert_path)
+    os.environ["G02_CERT_PASSWORD"] = TEST_CERT_PASSWORD
+    os.environ["G02_WS_USER"] = "benchmark"
+    os.environ["G02_WS_PASSWORD_QA"] = "benchmark"
+    os.environ["APP_ENV"] = "testing"
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(
+    setup: Callable[[], Any],
+    run: Callable[[Any], Any],
+    min_time: float,
+    min_iterations: int,
+    max_iterations: int,
+) -> dict:
+    """Ejecuta `run(setup())` hasta cubrir `min_time` segundos medidos."""
+    run(setup())  # calentamiento
+
+    latencies = []
+    total = 0.0
+    while len(latencies) < max_iterations and (total < min_time or len(latencies) < min_iterations):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        total += elapsed
+
+    arg = setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": len(latencies),
+        "ops_per_sec": round(len(latencies) / total, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "peak_memory_bytes": peak,
+    }
+
+
+def bench_size(items: int, min_time: float, min_iterations: int, max_iterations: int) -> dict:
+    from lxml import etree
+
+    from app.models.din import DINRequest
+    from app.services.ingest import validate_json_bytes
+    from app.services.pipeline import build_signed_envelope, get_builder
+    from app.services.signer import get_signer
+    from app.services.validators import validate_din
+    from scripts.synthetic_din import make_din_request
+
+    raw = json.dumps(make_din_request(items, seed=items)).encode("utf-8")
+    pristine = DINRequest.model_validate_json(raw).din
+    validated = validate_din(pristine.model_copy(deep=True))
+    jinja = get_builder("jinja")
+    lxml_builder = get_builder("lxml")
+    envelope = etree.tostring(jinja.build_xml_for_signing(pristine.model_copy(deep=True)))
+    signer = get_signer()
+
+    def fresh_din():
+        # validate_din transforma el modelo en el lugar
+        return pristine.model_copy(deep=True)
+
+    def check_pipeline(din):
+        result = build_signed_envelope(din, "jinja")
+        if not result.valid:
+            raise RuntimeError(f"DIN sintético inválido ({items} ítems): {result.message}")
+
+    stages = {
+        "ingest": (lambda: raw, lambda body: validate_json_bytes(DINRequest, body)),
+        "validate": (fresh_din, validate_din),
+        "render": (lambda: validated, jinja._render),
+        "render_lxml": (lambda: validated, lxml_builder.build_xml_for_signing),
+        "sign": (lambda: etree.fromstring(envelope), signer.sign_xml),
+        "pipeline": (fresh_din, check_pipeline),
+    }
+    results = {"json_bytes": len(raw), "envelope_bytes": len(envelope), "stages": {}}
+    for stage, (setup, run) in stages.items():
+        results["stages"][stage] = measure(setup, run, min_time, min_iterations, max_iterations)
+        stats = results["stages"][stage]
+        print(
+            f"{items:>4} ítems  {stage:<12} {stats['ops_per_sec']:>10.1f} ops/s  "
+            f"p50 {stats['p50_ms']:>9.3f} ms  p99 {stats['p99_ms']:>9.3f} ms  "
+            f"pico {stats['peak_memory_bytes'] / 1024:>9.0f} KiB",
+            file=sys.stderr,
+        )
+    return results
+
+
+def environment_info() -> dict:
+    from importlib.metadata import PackageNotFoundError, version
+
+    packages = {}
+    for package in ("lxml", "pydantic", "signxml", "jinja2", "cryptography"):
+        try:
+            packages[package] = version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Cantidades de ítems separadas por coma")
+    parser.add_argument("--min-time", type=float, default=2.0, help="Segundos medidos por etapa y tamaño")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=100_000)
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Archivo JSON de resultados (por defecto bench-results/pipeline-<fecha>.json)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(make_test_certificate(Path(tmp)))
+        from app.config import get_settings
+
+        settings = get_settings()
+        report = {
+            "benchmark": "pipeline",
+            "environment": environment_info(),
+            "settings": {"xsd_validation": settings.xsd_validation},
+            "min_time": args.min_time,
+            "results": {
+                str(items): bench_size(items, args.min_time, args.min_iterations, args.max_iterations)
+                for items in sizes
+            },
+        }
+
+    output = args.output
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = ROOT / "bench-results" / f"pipeline-{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"Resultados escritos en {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
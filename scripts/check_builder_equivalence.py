@@ -0,0 +1,94 @@
+"""
+Verifica que los motores de construcción XML "jinja" y "lxml" sean equivalentes.
+
+Compara la forma canónica (C14N, la misma que se firma) de:
+  1. La salida de ambos motores para examples/sample_din_request.json.
+  2. La salida del motor lxml contra docs/formato_xml_correcto.xml (sin la
+     firma y sólo en las secciones presentes en el documento de referencia).
+
+La plantilla Jinja deja espacios en blanco dentro de contenedores vacíos
+(p.ej. <ns10:INSUMOS> sin insumos) que remove_blank_text no elimina; el motor
+lxml los emite vacíos, igual que el documento de referencia. Por eso el texto
+sólo-espacios se normaliza antes de comparar.
+
+Uso:
+    python -m scripts.check_builder_equivalence
+"""
+import json
+import sys
+from pathlib import Path
+
+from lxml import etree
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.models.din import DINRequest  # noqa: E402
+from app.services.xml_builder import XMLBuilderService  # noqa: E402
+
+SAMPLE_JSON = ROOT / "examples" / "sample_din_request.json"
+REFERENCE_XML = ROOT / "docs" / "formato_xml_correcto.xml"
+XMLDSIG_NS = "http://www.w3.org/2000/09/xmldsig#"
+
+
+def load_din():
+    with open(SAMPLE_JSON, encoding="utf-8") as f:
+        return DINRequest.model_validate(json.load(f)).din
+
+
+def c14n(elem: etree._Element) -> bytes:
+    return etree.tostring(normalize_blank(elem), method="c14n")
+
+
+def normalize_blank(elem: etree._Element) -> etree._Element:
+    for node in elem.iter():
+        if node.text is not None and not node.text.strip():
+            node.text = None
+    return elem
+
+
+def find_din(tree: etree._Element) -> etree._Element:
+    return tree.find(".//DIN")
+
+
+def compare_engines(apply_validations: bool) -> bool:
+    jinja_tree = XMLBuilderService(apply_validations, engine="jinja").build_xml_for_signing(load_din())
+    lxml_tree = XMLBuilderService(apply_validations, engine="lxml").build_xml_for_signing(load_din())
+    return c14n(jinja_tree) == c14n(lxml_tree)
+
+
+def compare_reference() -> list[str]:
+    parser = etree.XMLParser(remove_blank_text=True)
+    reference = find_din(etree.parse(str(REFERENCE_XML), parser).getroot())
+    built = find_din(XMLBuilderService(apply_validations=False, engine="lxml").build_xml_for_signing(load_din()))
+
+    built_sections = {child.tag: child for child in built}
+    differences = []
+    for section in reference:
+        if section.tag == f"{{{XMLDSIG_NS}}}Signature":
+            continue
+        other = built_sections.get(section.tag)
+        if other is None:
+            differences.append(f"{etree.QName(section).localname}: ausente en salida lxml")
+        elif c14n(section) != c14n(other):
+            differences.append(f"{etree.QName(section).localname}: contenido distinto")
+    return differences
+
+
+def main() -> int:
+    ok = True
+    for apply_validations in (False, True):
+        same = compare_engines(apply_validations)
+        ok &= same
+        print(f"jinja == lxml (apply_validations={apply_validations}): {'OK' if same else 'DIFERENTE'}")
+
+    differences = compare_reference()
+    print(f"lxml vs {REFERENCE_XML.name}: {'OK' if not differences else 'DIFERENTE'}")
+    for diff in differences:
+        print(f"  - {diff}")
+
+    return 0 if ok and not differences else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
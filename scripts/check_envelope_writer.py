@@ -0,0 +1,120 @@
+"""
+Verifica la escritura en streaming del sobre firmado (app.services.envelope_writer).
+
+Para DIN sintéticos (scripts.synthetic_din) de cada tamaño, con un
+certificado de prueba desechable:
+  1. Compara byte a byte build_signed_envelope_streaming contra
+     build_signed_envelope con el motor lxml (árbol completo y signxml,
+     con el opt-in SHA1 de SHA1XMLSigner): mismo documento, mismo
+     DigestValue y mismo SignatureValue.
+  2. Mide latencia (p50) de ambos caminos.
+  3. Mide cuánto sube la memoria residente pico (VmHWM) sobre la residente
+     al empezar una construcción, en un proceso aparte por camino (Linux:
+     el pico se reinicia con /proc/self/clear_refs). A diferencia de
+     tracemalloc, incluye las asignaciones de libxml2.
+
+Uso:
+    python -m scripts.check_envelope_writer [--sizes 1,100,999] [--min-time 1]
+"""
+import argparse
+import gc
+import logging
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.bench_pipeline import configure_environment, make_test_certificate, measure  # noqa: E402
+
+DEFAULT_SIZES = (1, 100, 999)
+MODES = ("tree", "stream")
+
+
+def builders():
+    from app.services.pipeline import build_signed_envelope, build_signed_envelope_streaming
+
+    return {
+        "tree": lambda din: build_signed_envelope(din, "lxml"),
+        "stream": lambda din: build_signed_envelope_streaming(din, "lxml"),
+    }
+
+
+def make_din(items: int):
+    from app.models.din import DINRequest
+    from scripts.synthetic_din import make_din_request
+
+    return DINRequest.model_validate(make_din_request(items, seed=items)).din
+
+
+def memory_status_kib(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"{field} no disponible en /proc/self/status")
+
+
+def peak_rss_child(mode: str, items: int) -> int:
+    """Pico de RSS (KiB) sobre el RSS inicial al construir una vez, tras calentar con un DIN de 1 ítem."""
+    build = builders()[mode]
+    build(make_din(1))
+    din = make_din(items)
+    gc.collect()
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # reinicia VmHWM a la residente actual
+    before = memory_status_kib("VmRSS")
+    result = build(din)
+    if not result.valid:
+        raise RuntimeError(result.message)
+    return memory_status_kib("VmHWM") - before
+
+
+def peak_rss(mode: str, items: int) -> int:
+    output = subprocess.run(
+        [sys.executable, "-m", "scripts.check_envelope_writer", "--peak-rss", mode, str(items)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    return int(output.strip().splitlines()[-1])
+
+
+def check_size(items: int, min_time: float) -> bool:
+    build = builders()
+    din = make_din(items)
+    tree, stream = build["tree"](din), build["stream"](din)
+    same = tree.valid and stream.valid and tree.xml_bytes == stream.xml_bytes
+    print(f"{items:>4} ítems  árbol == streaming: {'OK' if same else 'DIFERENTE'}  ({len(tree.xml_bytes or b'')} bytes)")
+
+    for mode in MODES:
+        stats = measure(lambda: din, build[mode], min_time, 3, 10_000)
+        print(f"{items:>4} ítems  {mode:<7} p50 {stats['p50_ms']:>9.2f} ms  "
+              f"RSS pico +{peak_rss(mode, items):>7} KiB")
+    return same
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Cantidades de ítems separadas por coma")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Segundos medidos por camino y tamaño")
+    parser.add_argument("--peak-rss", nargs=2, metavar=("MODO", "ITEMS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.peak_rss:
+        # Proceso hijo: el entorno (certificado de prueba) viene del padre
+        mode, items = args.peak_rss
+        print(peak_rss_child(mode, int(items)))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(make_test_certificate(Path(tmp)))
+        ok = all([check_size(items, args.min_time) for items in sizes])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Generador de carga para /send y /status de la API.
+
+Lanza tráfico concurrente contra una instancia de la API configurada hacia
+el mock de Aduana (scripts.mock_aduana) y reporta, por endpoint,
+throughput, latencia p50/p95/p99 y tasa de error, para comparar ajustes de
+pool HTTP, concurrencia y límites de tasa de punta a punta.
+
+- Los workers de /send envían DIN sintéticos (scripts.synthetic_din). Cada
+  envío lleva un número de lote distinto en el primer ítem, de modo que el
+  caché de XML firmado no evita la firma.
+- Los workers de /status consultan tickets emitidos durante la corrida.
+
+Ejemplo:
+    python -m scripts.mock_aduana --latency 0.05 --jitter 0.05 &
+    ADUANA_RECIBE_DIN_URL=http://127.0.0.1:8765/recibe \\
+    ADUANA_CONSULTA_DIN_URL=http://127.0.0.1:8765/consulta \\
+        uvicorn app.main:app --port 8000 &
+    python -m scripts.load_driver --base-url http://127.0.0.1:8000 \\
+        --duration 30 --send-concurrency 16 --status-concurrency 32 --items 10
+"""
+import argparse
+import asyncio
+import copy
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.synthetic_din import make_din_request  # noqa: E402
+
+API_PREFIX = "/api/v1/din"
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    outcomes: Counter = field(default_factory=Counter)
+    errors: int = 0
+
+    def record(self, elapsed: float, outcome: str, ok: bool):
+        self.latencies.append(elapsed)
+        self.outcomes[outcome] += 1
+        if not ok:
+            self.errors += 1
+
+    def report(self, duration: float) -> dict:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        def pct(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(count - 1, round(fraction * (count - 1)))] * 1000, 2)
+
+        return {
+            "requests": count,
+            "throughput_rps": round(count / duration, 2) if duration else 0.0,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+            "outcomes": dict(self.outcomes.most_common()),
+        }
+
+
+class LoadDriver:
+    def __init__(
+        self,
+        base_url: str,
+        duration: float,
+        send_concurrency: int,
+        status_concurrency: int,
+        items: int,
+        agent: Optional[str] = None,
+        timeout: float = 60.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.duration = duration
+        self.send_concurrency = send_concurrency
+        self.status_concurrency = status_concurrency
+        self.template = make_din_request(items)
+        self.headers = {"X-Agent": agent} if agent else {}
+        self.timeout = timeout
+        self.tickets: list[str] = []
+        self.stats = {"send": EndpointStats(), "status": EndpointStats()}
+        self._sequence = 0
+        self._deadline = 0.0
+
+    def _next_payload(self) -> bytes:
+        self._sequence += 1
+        payload = copy.deepcopy(self.template)
+        payload["DIN"]["ITEMS"]["ITEM"][0]["DMARCA"] = f"LOTE {self._sequence:08d}"
+        return json.dumps(payload).encode("utf-8")
+
+    async def _timed(self, name: str, request) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            self.stats[name].record(time.perf_counter() - start, type(e).__name__, ok=False)
+            return None
+        elapsed = time.perf_counter() - start
+        outcome = str(response.status_code)
+        if response.status_code >= 400:
+            # El mensaje distingue TIMEOUT, CIRCUIT_OPEN, RATE_LIMITED, Faults, etc.
+            try:
+                message = response.json().get("message") or ""
+            except ValueError:
+                message = ""
+            outcome = f"{outcome} {message[:60]}".strip()
+        self.stats[name].record(elapsed, outcome, ok=response.status_code < 400)
+        return response
+
+    async def _send_worker(self, client: httpx.AsyncClient):
+        while time.monotonic() < self._deadline:
+            response = await self._timed("send", client.post(
+                f"{API_PREFIX}/send",
+                content=self._next_payload(),
+                headers={**self.headers, "Content-Type": "application/json"},
+            ))
+            if response is not None and response.status_code == 200:
+                ticket = response.json().get("ticket")
+                if ticket:
+                    self.tickets.append(ticket)
+
+    async def _status_worker(self, client: httpx.AsyncClient, rng: random.Random):
+        while time.monotonic() < self._deadline:
+            if not self.tickets:
+                await asyncio.sleep(0.05)
+                continue
+            ticket = rng.choice(self.tickets)
+            await self._timed("status", client.get(f"{API_PREFIX}/status/{ticket}", headers=self.headers))
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=self.send_concurrency + self.status_concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            started = time.monotonic()
+            self._deadline = started + self.duration
+            workers = [self._send_worker(client) for _ in range(self.send_concurrency)]
+            workers += [self._status_worker(client, random.Random(n)) for n in range(self.status_concurrency)]
+            await asyncio.gather(*workers)
+            elapsed = time.monotonic() - started
+
+        return {
+            "base_url": self.base_url,
+            "duration": round(elapsed, 2),
+            "send_concurrency": self.send_concurrency,
+            "status_concurrency": self.status_concurrency,
+            "items": len(self.template["DIN"]["ITEMS"]["ITEM"]),
+            "tickets": len(self.tickets),
+            "endpoints": {name: stats.report(elapsed) for name, stats in self.stats.items()},
+        }
+
+
+def print_report(report: dict):
+    print(
+        f"Duración {report['duration']} s, {report['items']} ítems por DIN, "
+        f"{report['tickets']} tickets emitidos",
+        file=sys.stderr,
+    )
+    for name, stats in report["endpoints"].items():
+        if not stats["requests"]:
+            print(f"  {name:<7} sin solicitudes", file=sys.stderr)
+            continue
+        print(
+            f"  {name:<7} {stats['requests']:>7} req  {stats['throughput_rps']:>8.1f} req/s  "
+            f"p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms  "
+            f"p99 {stats['p99_ms']:>8.1f} ms  error {stats['error_rate'] * 100:>5.1f}%",
+            file=sys.stderr,
+        )
+        for outcome, count in stats["outcomes"].items():
+            print(f"           {count:>7}  {outcome}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de carga")
+    parser.add_argument("--send-concurrency", type=int, default=8)
+    parser.add_argument("--status-concurrency", type=int, default=16)
+    parser.add_argument("--items", type=int, default=10, help="Ítems por DIN enviado")
+    parser.add_argument("--agent", default=None, help="Agente (header X-Agent)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=Path, default=None, help="Archivo JSON con el reporte")
+    args = parser.parse_args()
+
+    driver = LoadDriver(
+        base_url=args.base_url,
+        duration=args.duration,
+        send_concurrency=args.send_concurrency,
+        status_concurrency=args.status_concurrency,
+        items=args.items,
+        agent=args.agent,
+        timeout=args.timeout,
+    )
+    report = asyncio.run(driver.run())
+    print_report(report)
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Reporte escrito en {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
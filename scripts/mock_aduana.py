@@ -0,0 +1,251 @@
+"""
+Servidor SOAP simulado de Aduana para pruebas de carga locales.
+
+Implementa RecibeDin (POST /recibe) y servicioConsultaDIN (POST /consulta)
+con el mismo formato de respuesta que el cliente SOAP espera:
+
+- RecibeDin emite un ticket en estado RECIBIDO. Sin header WS-Security
+  (UsernameToken) o sin firma XML responde un SOAP Fault.
+- ConsultaDIN hace progresar el ticket con el tiempo: RECIBIDO, luego
+  EN PROCESO y finalmente ACEPTADO o RECHAZADO (--reject-rate). Un ticket
+  desconocido responde un SOAP Fault.
+- Inyección de latencia (--latency, --jitter) y de errores: respuestas
+  HTTP --error-status (--error-rate) y SOAP Faults (--fault-rate).
+- GET /stats entrega los contadores del mock.
+
+Para apuntar la API al mock:
+    ADUANA_RECIBE_DIN_URL=http://127.0.0.1:8765/recibe
+    ADUANA_CONSULTA_DIN_URL=http://127.0.0.1:8765/consulta
+
+Uso:
+    python -m scripts.mock_aduana [--port 8765] [--latency 0.05] [--jitter 0.02]
+                                  [--error-rate 0.01] [--fault-rate 0.01]
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+from xml.sax.saxutils import escape
+
+import uvicorn
+from litestar import Litestar, Request, Response, get, post
+from lxml import etree
+
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+WSSE_NS = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"
+DS_NS = "http://www.w3.org/2000/09/xmldsig#"
+XML_MEDIA_TYPE = "text/xml"
+
+ESTADO_RECIBIDO = "RECIBIDO"
+ESTADO_EN_PROCESO = "EN PROCESO"
+ESTADO_ACEPTADO = "ACEPTADO"
+ESTADO_RECHAZADO = "RECHAZADO"
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    fault_rate: float = 0.0
+    fault_status: int = 500
+    reject_rate: float = 0.1
+    # Segundos desde la recepción hasta EN PROCESO y hasta el estado final
+    processing_after: float = 1.0
+    decision_after: float = 5.0
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockTicket:
+    ticket: str
+    received_at: float
+    rejected: bool
+    numero_aceptacion: str
+
+    def estado(self, now: float, config: MockConfig) -> str:
+        elapsed = now - self.received_at
+        if elapsed < config.processing_after:
+            return ESTADO_RECIBIDO
+        if elapsed < config.decision_after:
+            return ESTADO_EN_PROCESO
+        return ESTADO_RECHAZADO if self.rejected else ESTADO_ACEPTADO
+
+
+@dataclass
+class MockState:
+    config: MockConfig
+    tickets: dict[str, MockTicket] = field(default_factory=dict)
+    counters: Counter = field(default_factory=Counter)
+
+    def __post_init__(self):
+        self.rng = random.Random(self.config.seed)
+        self._sequence = itertools.count(1)
+
+    def issue_ticket(self) -> MockTicket:
+        number = next(self._sequence)
+        ticket = MockTicket(
+            ticket=f"MOCK{number:012d}",
+            received_at=time.monotonic(),
+            rejected=self.rng.random() < self.config.reject_rate,
+            numero_aceptacion=f"{number:010d}",
+        )
+        self.tickets[ticket.ticket] = ticket
+        return ticket
+
+
+def soap_envelope(body: str) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<soapenv:Envelope xmlns:soapenv="{SOAP_NS}"><soapenv:Body>{body}</soapenv:Body></soapenv:Envelope>'
+    ).encode("utf-8")
+
+
+def soap_fault(code: str, message: str) -> bytes:
+    return soap_envelope(
+        f"<soapenv:Fault><faultcode>{escape(code)}</faultcode>"
+        f"<faultstring>{escape(message)}</faultstring></soapenv:Fault>"
+    )
+
+
+state = MockState(MockConfig())
+
+
+async def _inject(endpoint: str) -> Optional[Response]:
+    """Aplica la latencia configurada y, al azar, un error HTTP o un Fault."""
+    config = state.config
+    state.counters[f"{endpoint}.requests"] += 1
+    delay = config.latency + (state.rng.uniform(0, config.jitter) if config.jitter else 0.0)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    roll = state.rng.random()
+    if roll < config.error_rate:
+        state.counters[f"{endpoint}.http_errors"] += 1
+        return Response(content=b"Service Unavailable", status_code=config.error_status, media_type="text/plain")
+    if roll < config.error_rate + config.fault_rate:
+        return _fault(endpoint, "soapenv:Server", "Error interno simulado")
+    return None
+
+
+def _fault(endpoint: str, code: str, message: str) -> Response:
+    state.counters[f"{endpoint}.faults"] += 1
+    return Response(
+        content=soap_fault(code, message),
+        status_code=state.config.fault_status,
+        media_type=XML_MEDIA_TYPE,
+    )
+
+
+def _parse(body: bytes) -> Optional[etree._Element]:
+    try:
+        return etree.fromstring(body)
+    except etree.XMLSyntaxError:
+        return None
+
+
+@post("/recibe")
+async def recibe_din(request: Request) -> Response:
+    injected = await _inject("recibe")
+    if injected is not None:
+        return injected
+
+    tree = _parse(await request.body())
+    if tree is None:
+        return _fault("recibe", "soapenv:Client", "XML mal formado")
+    if tree.find(f".//{{{WSSE_NS}}}UsernameToken") is None:
+        return _fault("recibe", "wsse:FailedAuthentication", "Header WS-Security ausente")
+    if tree.find(f".//{{{DS_NS}}}Signature") is None:
+        return _fault("recibe", "soapenv:Client", "DIN sin firma digital")
+
+    ticket = state.issue_ticket()
+    state.counters["recibe.tickets"] += 1
+    return Response(
+        content=soap_envelope(
+            "<RecibeDinResponse><RESPUESTA>"
+            f"<TICKET>{ticket.ticket}</TICKET><ESTADO>{ESTADO_RECIBIDO}</ESTADO>"
+            "</RESPUESTA></RecibeDinResponse>"
+        ),
+        status_code=200,
+        media_type=XML_MEDIA_TYPE,
+    )
+
+
+@post("/consulta")
+async def consulta_din(request: Request) -> Response:
+    injected = await _inject("consulta")
+    if injected is not None:
+        return injected
+
+    tree = _parse(await request.body())
+    if tree is None:
+        return _fault("consulta", "soapenv:Client", "XML mal formado")
+    ticket_id = (tree.findtext(".//{*}TICKET") or tree.findtext(".//TICKET") or "").strip()
+    ticket = state.tickets.get(ticket_id)
+    if ticket is None:
+        return _fault("consulta", "soapenv:Client", f"Ticket no encontrado: {ticket_id}")
+
+    estado = ticket.estado(time.monotonic(), state.config)
+    state.counters[f"consulta.{estado}"] += 1
+    detalles = f"<ESTADO>{estado}</ESTADO><NUMEROENCRIPTADO>{ticket.ticket}</NUMEROENCRIPTADO>"
+    if estado == ESTADO_ACEPTADO:
+        detalles += (
+            "<TIPOSELECCION>S</TIPOSELECCION>"
+            f"<FECHACEPTACION>{datetime.now().strftime('%d%m%Y')}</FECHACEPTACION>"
+            f"<NUMEROACEPTACION>{ticket.numero_aceptacion}</NUMEROACEPTACION>"
+        )
+    return Response(
+        content=soap_envelope(f"<ConsultaDINResponse><RESPUESTA>{detalles}</RESPUESTA></ConsultaDINResponse>"),
+        status_code=200,
+        media_type=XML_MEDIA_TYPE,
+    )
+
+
+@get("/stats")
+async def stats() -> dict:
+    return {"tickets": len(state.tickets), "counters": dict(state.counters)}
+
+
+app = Litestar(route_handlers=[recibe_din, consulta_din, stats])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia fija por respuesta (segundos)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latencia adicional uniforme [0, jitter]")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas con error HTTP")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Fracción de respuestas con SOAP Fault")
+    parser.add_argument("--fault-status", type=int, default=500,
+                        help="Status HTTP de los SOAP Fault (SOAP 1.1 usa 500)")
+    parser.add_argument("--reject-rate", type=float, default=0.1, help="Fracción de tickets RECHAZADO")
+    parser.add_argument("--processing-after", type=float, default=1.0)
+    parser.add_argument("--decision-after", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    state.config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        fault_rate=args.fault_rate,
+        fault_status=args.fault_status,
+        reject_rate=args.reject_rate,
+        processing_after=args.processing_after,
+        decision_after=args.decision_after,
+        seed=args.seed,
+    )
+    state.rng = random.Random(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Generador de DIN sintéticos a partir de examples/sample_din_request.json.
+
+Replica el ítem de ejemplo hasta `items` ítems (máximo 999, el límite de
+NUMITEM), variando descripción, cantidades, montos, observaciones, cuentas
+y anexas de forma determinista según `seed`. Los documentos pasan
+la validación de DINValidator y el esquema EnvioDin.
+
+Uso como módulo:
+    from scripts.synthetic_din import make_din_request
+    payload = make_din_request(100)
+
+Uso desde consola (escribe el JSON en stdout):
+    python -m scripts.synthetic_din --items 100 > din_100.json
+"""
+import argparse
+import copy
+import json
+import random
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_PATH = ROOT / "examples" / "sample_din_request.json"
+
+MAX_ITEMS = 999
+
+PRODUCTOS = [
+    ("CANULAS", "PENNINE-F", "DE CAUCHO VULCANIZADO"),
+    ("GUANTES", "NITRILO", "DESECHABLES SIN POLVO"),
+    ("JERINGAS", "TERUMO", "ESTERILES 10 ML"),
+    ("SONDAS", "FOLEY", "DE SILICONA 2 VIAS"),
+    ("MASCARILLAS", "3M", "QUIRURGICAS TRES PLIEGUES"),
+    ("CATETERES", "BD", "INTRAVENOSOS 20G"),
+]
+MARCAS = ["DISPOSITIVO", "USO MEDICO", "HOSPITALARIO", "CLINICO"]
+# Pares (CTA, OTRO) presentes en DIN reales para cuentas de ítem
+CUENTAS_ITEM = [("178", "0019.000000"), ("223", "0006.000000"), ("179", "0000.000000")]
+
+
+@lru_cache
+def _sample() -> dict:
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _monto(value: float, width: int, decimals: int = 2) -> str:
+    return f"{value:.{decimals}f}".zfill(width)
+
+
+def _make_item(template: dict, numitem: int, rng: random.Random) -> dict:
+    item = copy.deepcopy(template)
+    nombre, marca, variedad = rng.choice(PRODUCTOS)
+    cantidad = rng.randint(1, 50_000)
+    precio = round(rng.uniform(0.05, 500.0), 6)
+    cif = round(cantidad * precio, 2)
+
+    item["NUMITEM"] = f"{numitem:03d}"
+    item["DNOMBRE"] = f"SINCODIGO       ; {nombre}; {marca}; {variedad}"
+    item["DMARCA"] = f"{rng.choice(MARCAS)}; LOTE {rng.randint(1000, 9999)}"
+    item["DVARIEDAD"] = variedad[:30]
+    item["CANTMERC"] = _monto(cantidad, 13, 4)
+    item["PREUNIT"] = _monto(precio, 15, 6)
+    item["CIFITEM"] = _monto(cif, 13)
+
+    observaciones = [{"CODOBS": "99", "DESOBS": f"{cantidad:015.6f} UNIDADES"}]
+    for _ in range(rng.randint(0, 2)):
+        observaciones.append({"CODOBS": "99", "DESOBS": f"LOTE {rng.randint(100000, 999999)}"})
+    item["OBSERVACIONESITEM"] = {"OBSERVACIONITEM": observaciones}
+
+    cuentas = []
+    for cta, otro in rng.sample(CUENTAS_ITEM, rng.randint(1, len(CUENTAS_ITEM))):
+        cuentas.append({
+            "OTRO": otro,
+            "CTA": cta,
+            "SIGVAL": "+",
+            "VALOR": _monto(cif * float(otro) / 100, 13),
+        })
+    item["CUENTASITEM"] = {"CUENTAITEM": cuentas}
+
+    # Sin insumos: la plantilla los emite en el namespace
+    # "http://www.aduana.cl/xml/esquemas/INSUMOS" y el XSD de EnvioDin los
+    # declara en "www.aduana.cl/xml/esquemas/INSUMOS", por lo que no validan.
+    item["INSUMOS"] = {}
+
+    anexas = []
+    if rng.random() < 0.1:
+        anexas.append({
+            "NUMSEC": "00001",
+            "NUMDAPEX": f"{rng.randint(1, 99_999_999):010d}",
+            "FECDAPEX": "01072024",
+            "CODADUANA": "39",
+            "NUMITEM": f"{numitem:03d}",
+            "NUMINSUMO": "001",
+            "NOMINSUMO": f"INSUMO {nombre}"[:50],
+            "CODUNMEDI": "10",
+            "NUMITEMDEC": f"{numitem:03d}",
+            "NOMPRODUCTO": nombre,
+            "CANPRODUCTO": _monto(cantidad, 13, 4),
+            "CODUNMEDP": "10",
+            "FACCONSUMO": "0001.000000",
+            "NUMINSUTI": _monto(rng.uniform(1, 100), 13, 4),
+        })
+    item["ANEXAS"] = {"ANEXA": anexas} if anexas else {}
+    return item
+
+
+def make_din_request(items: int, seed: int = 0) -> dict:
+    """DINRequest (dict JSON con clave "DIN") con `items` ítems."""
+    if not 1 <= items <= MAX_ITEMS:
+        raise ValueError(f"La cantidad de ítems debe estar entre 1 y {MAX_ITEMS}")
+
+    rng = random.Random(seed)
+    payload = copy.deepcopy(_sample())
+    din = payload["DIN"]
+    template = din["ITEMS"]["ITEM"][0]
+    din["ITEMS"] = {"ITEM": [_make_item(template, n, rng) for n in range(1, items + 1)]}
+
+    totales = din["CABEZA"].get("TOTALES")
+    if isinstance(totales, dict):
+        totales["TOTITEMS"] = f"{items:03d}"
+    return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    json.dump(make_din_request(args.items, args.seed), sys.stdout, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()